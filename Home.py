@@ -1,9 +1,12 @@
 import streamlit as st
 import pages.backend.InfluxDB as InfluxDB
+import pages.backend.InfluxWriter as InfluxWriter
 import pages.backend.InfluxDBConfig as InfluxDBConfig
 import pages.backend.InitPowerSupplies as Init
 import pages.backend.hv.HVList as HVList
+import pages.backend.hv.Connection as Connection
 import os 
+import time
 
 # -------- Title of the page (displayed as tab name in the browser) --------
 
@@ -68,7 +71,7 @@ if InfluxDBConfig.writeTime >= 0:
 
 
 	# -------- Number input to change the time interval of data submission to InfluxDB --------
-	if len(InfluxDB.lvThreads) > 0 or len(InfluxDB.hvThreads) > 0:
+	if len(InfluxDB.lvTelemetry) > 0 or len(InfluxDB.hvTelemetry) > 0:
 		def changeWriteTime():
 			st.session_state.changeWriteTimeBool = True
 
@@ -76,25 +79,62 @@ if InfluxDBConfig.writeTime >= 0:
 
 		if st.session_state.changeWriteTimeBool:
 			if writeTime != None:
-				for thread in InfluxDB.lvThreads:
-					thread.writeTime = writeTime
-				for thread in InfluxDB.hvThreads:
-					thread.writeTime = writeTime
+				InfluxDB.setWriteTime(writeTime)
 			st.session_state.changeWriteTimeBool = False
 
 	# -------- Display the time interval of data submission to InfluxDB --------
-	if len(InfluxDB.lvThreads) > 0:
-		influxdb_col2.metric("Current value", str(InfluxDB.lvThreads[0].writeTime) + " s")
+	if len(InfluxDB.lvTelemetry) > 0:
+		influxdb_col2.metric("Current value", str(InfluxDB.lvTelemetry[0].writeTime) + " s")
 	else:
-		if len(InfluxDB.hvThreads) > 0:
-			influxdb_col2.metric("Current value", str(InfluxDB.hvThreads[0].writeTime) + " s")
+		if len(InfluxDB.hvTelemetry) > 0:
+			influxdb_col2.metric("Current value", str(InfluxDB.hvTelemetry[0].writeTime) + " s")
 		else:
 			st.warning("No power supplies found. You can define LV and HV supplies in `pages/backend/lv/LVDefinitions.py` and `pages/backend/hv/HVDefinitions.py`, respectively.", icon = "⚠️")
+
+	# -------- Display the time interval currently used for each device and its last readout --------
+	# (HV crates are read faster while they are ramping, see InfluxDBConfig.adaptiveRate)
+	if len(InfluxDB.lvTelemetry) > 0 or len(InfluxDB.hvTelemetry) > 0:
+		rates = []
+		now = time.monotonic_ns()
+		for telemetry in InfluxDB.lvTelemetry + InfluxDB.hvTelemetry + InfluxDB.padiwaTelemetry:
+			rates.append({
+				"Device": telemetry.name,
+				"Time interval (s)": round(telemetry.readoutTask.period, 1),
+				"Reason": telemetry.rate.reason,
+				"Epoch": telemetry.stamp.epoch,
+				"Last readout (s ago)": round((now - telemetry.stamp.monotonic) / 1e9, 1),
+				# time needed to read all channels of an HV crate
+				"Read time (ms)": None if telemetry.readDuration == None else round(1000 * telemetry.readDuration)
+			})
+		st.dataframe(rates, hide_index = True)
+
+	# -------- Display queue depth and flush latency of the shared writer --------
+	if InfluxWriter.writer != None:
+		writer_cols = st.columns(4)
+		writer_cols[0].metric("Queued points", InfluxWriter.writer.queueDepth())
+		writer_cols[1].metric("Last flush latency", str(round(1000 * InfluxWriter.writer.lastFlushLatency)) + " ms")
+		writer_cols[2].metric("Batches sent / failed", str(InfluxWriter.writer.nFlushes) + " / " + str(InfluxWriter.writer.nFailedFlushes))
+		writer_cols[3].metric("Dropped / rejected points", str(InfluxWriter.writer.nDroppedLines) + " / " + str(InfluxWriter.writer.nRejectedLines))
+		# -------- Display the effect of the deadband filters --------
+		if InfluxDBConfig.deadband:
+			nAccepted, nSuppressed = InfluxDB.getDeadbandStatistics()
+			if nAccepted + nSuppressed > 0:
+				st.markdown("Deadband filter: " + str(nSuppressed) + " of " + str(nAccepted + nSuppressed) + " values (" + str(round(100 * nSuppressed / (nAccepted + nSuppressed))) + " %) were not submitted, because they didn't change.")
+		# -------- Display the state of the spool --------
+		spool = InfluxWriter.writer.spool
+		if not InfluxWriter.writer.reachable:
+			st.warning("InfluxDB is not reachable. Data is spooled to `" + spool.directory + "` and will be submitted later.", icon = "⚠️")
+		if not spool.isEmpty():
+			spool_cols = st.columns(3)
+			spool_cols[0].metric("Spooled data", str(round(spool.size() / 1024 / 1024, 1)) + " MB")
+			spool_cols[1].metric("Spool segments", len(spool.segments))
+			spool_cols[2].metric("Evicted segments", spool.nEvictedSegments)
 	
 	# -------- Display a warning message if HV supplies have been defined, but the connection was not set up --------
+	# (The state of the connection is known from the most recent calls; the HV supplies are not asked here.)
 	disconnectedHVNames = ""
 	for i in range(0,len(HVList.hvSupplyList)):
-		if HVList.hvSupplyList[i].checkConnection() == 0 :
+		if HVList.hvSupplyList[i].connection.state() == Connection.LOGGED_OUT:
 			disconnectedHVNames += HVList.hvSupplyList[i].name
 	if len(disconnectedHVNames) > 0:
 		st.warning("The following HV supply/supplies was/were defined, but no connection was set up: " + disconnectedHVNames + ". Did you enter the password?", icon = "⚠️")
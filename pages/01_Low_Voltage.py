@@ -53,9 +53,9 @@ else:
 	if "showReconnectInfo" not in st.session_state:
 		st.session_state.showReconnectInfo = False
 
-	# -------- Pause threads writing to InfluxDB --------
+	# -------- Pause writing to InfluxDB --------
 
-	InfluxDB.pauseLVThread(st.session_state.lvid)
+	InfluxDB.pauseLVTelemetry(st.session_state.lvid)
 
 	# -------- Title --------
 
@@ -211,6 +211,6 @@ else:
 
 	st.markdown("**Last updated:** " + datetime.now().strftime("%H:%M:%S"))
 
-	# -------- Continue threads writing to InfluxDB --------
+	# -------- Continue writing to InfluxDB --------
 
-	InfluxDB.runAllThreads()
\ No newline at end of file
+	InfluxDB.runAllTelemetry()
\ No newline at end of file
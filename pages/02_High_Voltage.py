@@ -8,7 +8,11 @@ import pages.backend.hv.HIMEConstants as HIMEConstants
 import pages.backend.hv.FullDetector as FullDetector
 import pages.backend.hv.Layer as Layer
 import pages.backend.hv.SingleChannel as SingleChannel
+import pages.backend.hv.ChannelGroup as ChannelGroup
 import pages.backend.hv.LoginLoop as LoginLoop
+import pages.backend.hv.Commands as Commands
+import pages.backend.hv.KillSwitch as KillSwitch
+import pages.backend.hv.MapWatcher as MapWatcher
 
 # -------- Title of the page (displayed as tab name in the browser) --------
 
@@ -64,9 +68,9 @@ else:
 	if "session_state.hime_channel" not in st.session_state:
 		st.session_state.hime_channel = None
 
-	# -------- Pause threads writing to InfluxDB --------
+	# -------- Pause writing to InfluxDB --------
 
-	InfluxDB.pauseHVThread(st.session_state.hvid)
+	InfluxDB.pauseHVTelemetry(st.session_state.hvid)
 
 	# -------- Title --------
 
@@ -132,7 +136,11 @@ else:
 		for hv in HVList.hvSupplyList:
 			top_col_1.markdown("🟢  " + hv.name)
 
-		st.button("Switch all channels off", on_click=FullDetector.switchAllChannelsOff)
+		st.button("Switch all channels off", on_click=KillSwitch.switchAllChannelsOff)
+
+		# -------- Result of the most recent command --------
+
+		Commands.showReport()
 		
 		st.divider()
 
@@ -144,9 +152,17 @@ else:
 
 		st.divider()
 
+		# -------- Channel group --------
+
+		st.header("Set Voltage by Channel Group")
+
+		ChannelGroup.show()
+
+		st.divider()
+
 		# -------- Full Detector --------
 
-		st.header("Set Voltages from CSV file")
+		st.header("Set Voltages from a Voltage Set")
 
 		FullDetector.show()
 
@@ -182,7 +198,18 @@ else:
 			st.session_state.hv = HVList.getHV(selected_hv_name)
 			st.rerun()
 
-		st.dataframe(CrateMap.mapToDataframe(st.session_state.hv.getMap()), height = 620)
+		if st.session_state.hv.topology == None:
+			st.info("The boards of this HV supply are not known yet.", icon = "ℹ️")
+		else:
+			st.dataframe(CrateMap.mapToDataframe(st.session_state.hv.topology), height = 620)
+
+		# -------- Channel mapping --------
+
+		st.divider()
+
+		st.header("Channel Mapping")
+
+		MapWatcher.show()
 
 	# -------- Print error, warning and information messages --------
 	for hv in HVList.hvSupplyList:
@@ -198,6 +225,6 @@ else:
 
 	st.markdown("**Last updated:** " + datetime.now().strftime("%H:%M:%S"))
 
-	# -------- Continue threads writing to InfluxDB --------
+	# -------- Continue writing to InfluxDB --------
 
-	InfluxDB.runAllThreads()
+	InfluxDB.runAllTelemetry()
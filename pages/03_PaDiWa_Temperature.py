@@ -17,9 +17,9 @@ st.set_page_config("PaDiWa Temperature", page_icon = "svg/icon.svg")
 Init.init()
 
 
-# -------- Pause threads writing to InfluxDB --------
+# -------- Pause writing to InfluxDB --------
 
-InfluxDB.pausePaDiWaThread()
+InfluxDB.pausePaDiWaTelemetry()
 
 # -------- Beginning of the PaDiWa-temperature page --------
 
@@ -56,6 +56,6 @@ st.divider()
 
 st.markdown("**Last updated:** " + datetime.now().strftime("%H:%M:%S"))
 
-# -------- Continue threads writing to InfluxDB --------
+# -------- Continue writing to InfluxDB --------
 
-InfluxDB.runAllThreads()
\ No newline at end of file
+InfluxDB.runAllTelemetry()
\ No newline at end of file
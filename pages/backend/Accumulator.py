@@ -0,0 +1,54 @@
+import threading
+
+
+
+# Collects samples per series and field in memory,
+# keeping only the minimum, maximum, sum and number of samples.
+# This allows to sample much faster than data is submitted to InfluxDB:
+# per time window, only min/max/mean/count are submitted, so short spikes are not missed.
+class Accumulator:
+	def __init__(self) -> None:
+		# series -> [number of samples, {field: [min, max, sum]}]
+		self.series = {}
+		self.lock = threading.Lock()
+
+
+
+	# Add one sample, given as a dictionary {field: value}
+	def add(self, series: str, fields) -> None:
+		with self.lock:
+			entry = self.series.get(series)
+			if entry == None:
+				entry = [0, {}]
+				self.series[series] = entry
+			entry[0] += 1
+			for field, value in fields.items():
+				stats = entry[1].get(field)
+				if stats == None:
+					entry[1][field] = [value, value, value]
+				else:
+					if value < stats[0]:
+						stats[0] = value
+					if value > stats[1]:
+						stats[1] = value
+					stats[2] += value
+
+
+
+	# Get the aggregated fields of all series and start a new time window.
+	# Returns {series: {field_min, field_max, field_mean, ..., count}}
+	def takeAll(self):
+		with self.lock:
+			series = self.series
+			self.series = {}
+		aggregates = {}
+		for name, entry in series.items():
+			count = entry[0]
+			fields = {}
+			for field, stats in entry[1].items():
+				fields[field + "_min"] = stats[0]
+				fields[field + "_max"] = stats[1]
+				fields[field + "_mean"] = stats[2] / count
+			fields["count"] = count
+			aggregates[name] = fields
+		return aggregates
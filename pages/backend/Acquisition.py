@@ -0,0 +1,29 @@
+import time
+import pages.backend.InfluxDBConfig as InfluxDBConfig
+
+# Length of one telemetry cycle ("epoch") in seconds.
+# This is the base time interval of data submission; it is changed in InfluxDB.setWriteTime().
+epochTime = max(InfluxDBConfig.writeTime, 5)
+
+
+
+# Time of one acquisition, i.e. of reading a set of values from a device.
+#
+# monotonic: time.monotonic_ns() at read time, to measure durations and ages
+# wall:      time.time_ns() at read time, submitted as the timestamp of the points
+# epoch:     number of the telemetry cycle the acquisition belongs to.
+#            Epochs are counted in multiples of epochTime since 1970,
+#            so the readouts of all devices within the same cycle share the same epoch,
+#            and a snapshot of the full detector can be selected by its epoch.
+class Stamp:
+	def __init__(self) -> None:
+		self.monotonic = time.monotonic_ns()
+		self.wall = time.time_ns()
+		self.epoch = self.wall // int(epochTime * 1e9)
+
+
+
+# Seconds until the next epoch starts.
+# Readouts that are started at the beginning of an epoch are aligned across devices.
+def timeToNextEpoch() -> float:
+	return epochTime - (time.time() % epochTime)
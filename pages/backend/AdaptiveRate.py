@@ -0,0 +1,39 @@
+import time
+
+
+
+# Chooses the time interval of data submission for one device.
+#
+# Normally, this is the base time (the write time chosen on the home page).
+# Whenever something interesting happens (a ramp, a trip, a new target voltage, ...), trigger() is invoked,
+# and for holdTime seconds the fast time is used instead.
+# Afterwards, the time interval doubles every holdTime seconds until it reaches the base time again.
+class AdaptiveRate:
+	def __init__(self, baseTime: float, fastTime: float, holdTime: float) -> None:
+		self.baseTime = baseTime
+		self.fastTime = fastTime
+		self.holdTime = holdTime
+		self.lastTriggerTime = None
+		# description of the last trigger, displayed on the home page
+		self.reason = ""
+
+
+
+	def trigger(self, reason: str) -> None:
+		self.lastTriggerTime = time.monotonic()
+		self.reason = reason
+
+
+
+	# current time interval of data submission in seconds
+	def getTime(self) -> float:
+		if self.lastTriggerTime == None or self.fastTime >= self.baseTime:
+			return self.baseTime
+		elapsed = time.monotonic() - self.lastTriggerTime
+		if elapsed < self.holdTime:
+			return self.fastTime
+		decayTime = self.fastTime * 2 ** ((elapsed - self.holdTime) / self.holdTime)
+		if decayTime >= self.baseTime:
+			self.reason = ""
+			return self.baseTime
+		return decayTime
@@ -0,0 +1,44 @@
+import time
+
+
+
+# Deadband filter for telemetry values.
+#
+# A value is only submitted if it differs from the last submitted value of the same series
+# by more than the band of its quantity, or if the last submission of that series
+# is at least heartbeatTime seconds ago.
+#
+# bands has the form {measurement: {field: [absolute, relative]}}.
+# The band is the larger one of the absolute threshold and relative * |last submitted value|,
+# so a relative threshold of 0 gives a purely absolute band and vice versa.
+# Fields without a band are always submitted.
+class Deadband:
+	def __init__(self, bands, heartbeatTime: float) -> None:
+		self.bands = bands
+		self.heartbeatTime = heartbeatTime
+		# series key -> [last submitted value, time of the last submission]
+		self.lastValues = {}
+		# -- statistics --
+		self.nAccepted = 0
+		self.nSuppressed = 0
+
+
+
+	# Decide whether a value needs to be submitted.
+	# key identifies the series, e.g. "hv,name_channel=HIME_HV_01_0001 voltage".
+	def accept(self, key: str, measurement: str, field: str, value: float) -> bool:
+		now = time.monotonic()
+		try:
+			absolute, relative = self.bands[measurement][field]
+		except KeyError:
+			self.nAccepted += 1
+			return True
+		last = self.lastValues.get(key)
+		if last != None:
+			band = max(absolute, relative * abs(last[0]))
+			if abs(value - last[0]) <= band and now - last[1] < self.heartbeatTime:
+				self.nSuppressed += 1
+				return False
+		self.lastValues[key] = [value, now]
+		self.nAccepted += 1
+		return True
@@ -1,6 +1,10 @@
-import threading
-import influxdb_client
-from influxdb_client.client.write_api import SYNCHRONOUS
+import pages.backend.LineProtocol as LineProtocol
+import pages.backend.Acquisition as Acquisition
+import pages.backend.InfluxWriter as InfluxWriter
+import pages.backend.TelemetryScheduler as TelemetryScheduler
+import pages.backend.Deadband as Deadband
+import pages.backend.Accumulator as Accumulator
+import pages.backend.AdaptiveRate as AdaptiveRate
 import pages.backend.lv.LVSupply as LVSupply
 import pages.backend.hv.HVSupply as HVSupply
 import pages.backend.hv.HVList as HVList
@@ -9,81 +13,200 @@ import pages.backend.padiwa.TemperatureReadout as TemperatureReadout
 import pages.backend.InfluxDBConfig as InfluxDBConfig
 from datetime import datetime
 import time
-import os
 
-lvThreads = []
-hvThreads = []
-padiwaThreads = []
+lvTelemetry = []
+hvTelemetry = []
+padiwaTelemetry = []
 
-def pauseLVThread(i: int) -> None:
+def pauseLVTelemetry(i: int) -> None:
 	if InfluxDBConfig.writeTime >= 0:
-		lvThreads[i].pause()
+		lvTelemetry[i].pause()
 
-def pauseHVThread(i: int) -> None:
+def pauseHVTelemetry(i: int) -> None:
 	if InfluxDBConfig.writeTime >= 0:
-		hvThreads[i].pause()
+		hvTelemetry[i].pause()
 
-def pausePaDiWaThread() -> None:
+def pausePaDiWaTelemetry() -> None:
 	if InfluxDBConfig.writeTime >= 0:
-		padiwaThreads[0].pause()
+		padiwaTelemetry[0].pause()
 
-def runAllThreads() -> None:
+def runAllTelemetry() -> None:
 	if InfluxDBConfig.writeTime >= 0:
-		for i in range(0, len(lvThreads)):
-			lvThreads[i].run()
-		for i in range(0, len(hvThreads)):
-			hvThreads[i].run()
-		for i in range(0, len(padiwaThreads)):
-			padiwaThreads[i].run()
+		for telemetry in lvTelemetry + hvTelemetry + padiwaTelemetry:
+			telemetry.run()
 
+# number of points submitted and suppressed by the deadband filters of all devices
+def getDeadbandStatistics():
+	nAccepted = 0
+	nSuppressed = 0
+	for telemetry in lvTelemetry + hvTelemetry + padiwaTelemetry:
+		nAccepted += telemetry.deadband.nAccepted
+		nSuppressed += telemetry.deadband.nSuppressed
+	return [nAccepted, nSuppressed]
 
+def setWriteTime(writeTime: float) -> None:
+	# the length of the telemetry cycles follows the time interval of data submission
+	Acquisition.epochTime = writeTime
+	for telemetry in lvTelemetry + hvTelemetry + padiwaTelemetry:
+		telemetry.setWriteTime(writeTime)
 
-# By creating instances of this class, separate threads are started that allow to periodically write data to InfluxDB.
+# Increase the rate of data submission for an HV crate for a while,
+# e.g. after switching channels on or sending new target voltages.
+# Can be invoked from the web pages.
+def triggerFastRate(hvid: int, reason: str) -> None:
+	if InfluxDBConfig.writeTime >= 0 and hvid >= 0 and hvid < len(hvTelemetry):
+		hvTelemetry[hvid].rate.trigger(reason)
+		hvTelemetry[hvid].updateRate()
+
+
+
+# Each instance of this class periodically writes the data of one device to InfluxDB:
+# an LV supply, an HV crate or -- if neither lv nor hv is given -- all PaDiWa boards.
+# Instead of running a thread of its own, it adds tasks to the shared TelemetryScheduler,
+# so each device is read exactly once per period.
 # In the main thread, streamlit keeps running the web page.
 class InfluxDB:
 	def __init__(self, lv: LVSupply = None, hv: HVSupply = None, hvid: int = -1) -> None:
-		self.pauseThread = False    # Setting this variable to True tells the subthread to stop as soon as possible. It is set by the main thread.
-		self.influxDone = False     # This variable will be set to True after the subthread has stopped. This information is needed by the main thread.
 		self.lv = lv
 		self.hv = hv
 		self.hvid = hvid
+		if lv != None:
+			self.name = lv.name
+		elif hv != None:
+			self.name = hv.name
+		else:
+			self.name = "PaDiWa"
 		self.writeTime = InfluxDBConfig.writeTime
 		if self.writeTime >= 0 and self.writeTime < 5:
 			self.writeTime = 5
-		self.startTime = time.time()
-		self.startTime_hvCheck = time.time()
-		# -- start InfluxDB client --
-		self.bucket = InfluxDBConfig.bucket
-		self.org = InfluxDBConfig.org
-		self.token = os.getenv("INFLUX_TOKEN")
-		self.url = InfluxDBConfig.url
-		self.client = influxdb_client.InfluxDBClient(url=self.url, token=self.token, org=self.org)
-		self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
-		# -- create and start subthread --
-		self.thread = threading.Thread(target = self.influxLoop)
-		self.thread.start()
-		self.reconnectCounter = 0
+		# All points of one readout are collected in self.lines
+		# and handed over to the shared writer at once.
+		self.lines = []
+		# Time of the current readout (see Acquisition.Stamp).
+		# Values carry the time at which they were read, so they keep their time if they have to be spooled and replayed later,
+		# and all values of the same telemetry cycle carry the same epoch.
+		self.stamp = Acquisition.Stamp()
+		# Values that didn't change are only submitted every InfluxDBConfig.heartbeatTime seconds
+		self.deadband = Deadband.Deadband(InfluxDBConfig.deadbands, InfluxDBConfig.heartbeatTime)
+		# HV crates are read faster for a while when something happens, see checkTriggers().
+		# In the fast-sampling mode, this changes the sampling interval; the time windows always last self.writeTime seconds.
+		self.fastSampling = self.hv != None and InfluxDBConfig.fastSampling
+		self.rate = AdaptiveRate.AdaptiveRate(InfluxDBConfig.fastSamplingTime if self.fastSampling else self.writeTime, InfluxDBConfig.adaptiveFastTime, InfluxDBConfig.adaptiveHoldTime)
+		# name_channel -> [voltage, current, target voltage, Pw] of the previous measurement
+		self.previousMeasurements = {}
+		# line-protocol prefixes of the HV channels, see measureHV()
+		self.encoder = None
+		# runs [slot, chStart, chStop] of the acquisition plan, read by measureHV()
+		self.runs = []
+		# time needed to read the HV crate in the last readout, in seconds
+		self.readDuration = None
+		# HV channel parameters read by measureHV()
+		self.parameterNames = ["VMon", "IMon"]
+		if InfluxDBConfig.adaptiveRate:
+			self.parameterNames += ["V0Set", "Pw"]
+		# -- add tasks to the scheduler --
+		# All tasks of this device are paused together and never run at the same time.
+		# Readouts start at the beginning of an epoch, so all devices are read at about the same time.
+		self.group = TelemetryScheduler.TaskGroup()
+		self.readoutTask = TelemetryScheduler.Task(self.name, self.writeTime, self.readout, self.group)
+		TelemetryScheduler.scheduler.add(self.readoutTask, Acquisition.timeToNextEpoch())
+		# In the fast-sampling mode, HV voltages and currents are sampled every InfluxDBConfig.fastSamplingTime seconds,
+		# and only min, max, mean and number of samples are submitted every self.writeTime seconds.
+		self.accumulator = None
+		# task whose period is adapted by self.rate
+		self.rateTask = self.readoutTask
+		if self.fastSampling:
+			self.accumulator = Accumulator.Accumulator()
+			self.samplingTask = TelemetryScheduler.Task(self.name + " sampling", InfluxDBConfig.fastSamplingTime, self.sampleHV, self.group)
+			TelemetryScheduler.scheduler.add(self.samplingTask)
+			self.rateTask = self.samplingTask
+		# Avoid the loss of connection to the HV supply due to timeout.
+		# The crate is only probed if there was no other call recently (see HVSupply.keepAlive()).
+		if self.hv != None:
+			self.keepAliveTask = TelemetryScheduler.Task(self.name + " keep-alive", InfluxDBConfig.hvKeepAliveTime, self.keepAliveHV, self.group)
+			TelemetryScheduler.scheduler.add(self.keepAliveTask, InfluxDBConfig.hvKeepAliveTime)
 
 
 
 	# This can be invoked in the main thread
-	# in order to stop the submission of data to InfluxDB
+	# in order to stop the submission of data to InfluxDB.
+	# Returns as soon as a readout in progress has finished.
 	def pause(self) -> None:
-		self.pauseThread = True
-		while not self.influxDone:
-			time.sleep(0.1)
+		self.group.pause()
 
 
 
 	# This can be invoked in the main thread
 	# in order to restart the submission of data to InfluxDB
 	def run(self) -> None:
-		self.pauseThread = False
+		self.group.run()
+
+
+
+	def setWriteTime(self, writeTime: float) -> None:
+		self.writeTime = writeTime
+		if self.fastSampling:
+			period = writeTime
+		else:
+			self.rate.baseTime = writeTime
+			period = self.rate.getTime()
+		# start the next readout at the beginning of an epoch of the new length
+		TelemetryScheduler.scheduler.setPeriod(self.readoutTask, period, Acquisition.timeToNextEpoch())
+
+
+
+	# Adapt the period of the readout task (or, in the fast-sampling mode, of the sampling task) to the rate chosen by self.rate.
+	# Small changes are ignored, to avoid rescheduling after every readout while the rate decays.
+	def updateRate(self) -> None:
+		period = self.rate.getTime()
+		if abs(period - self.rateTask.period) > 0.1 * self.rateTask.period:
+			TelemetryScheduler.scheduler.setPeriod(self.rateTask, period)
+
+
+
+	# Compare the HV measurements with the previous ones
+	# and trigger the fast rate on ramps, trips and new settings:
+	# target-voltage changes, Pw transitions, VMon far from V0Set for channels that are on,
+	# and current excursions.
+	def checkTriggers(self, snapshot) -> None:
+		voltages = snapshot.flat["VMon"]
+		currents = snapshot.flat["IMon"]
+		targetVoltages = snapshot.flat["V0Set"]
+		pws = snapshot.flat["Pw"]
+		for i in range(0, len(self.encoder.nameChannels)):
+			if not snapshot.valid[i]:
+				continue
+			nameChannel = self.encoder.nameChannels[i]
+			voltage, current, targetVoltage, pw = voltages[i], currents[i], targetVoltages[i], pws[i]
+			previous = self.previousMeasurements.get(nameChannel)
+			self.previousMeasurements[nameChannel] = [voltage, current, targetVoltage, pw]
+			if previous == None:
+				continue
+			if targetVoltage != previous[2]:
+				self.rate.trigger("New target voltage for " + nameChannel)
+			elif pw != previous[3]:
+				self.rate.trigger("Channel " + nameChannel + " switched " + ("on" if pw == 1 else "off"))
+			elif pw == 1 and abs(voltage - targetVoltage) > InfluxDBConfig.adaptiveVoltageTolerance:
+				self.rate.trigger("Voltage of " + nameChannel + " differs from the target")
+			elif abs(current - previous[1]) > InfluxDBConfig.adaptiveCurrentTolerance:
+				self.rate.trigger("Current excursion in " + nameChannel)
+
+
+
+	# Add a point with the fields {field: value}, read at the time given by stamp (Acquisition.Stamp), to the current readout.
+	# Fields suppressed by the deadband filter are left out.
+	def appendPoint(self, measurement: str, tagKey: str, tagValue: str, fields, stamp: Acquisition.Stamp) -> None:
+		linePrefix = LineProtocol.prefix(measurement, tagKey, tagValue)
+		if InfluxDBConfig.deadband:
+			fields = {field: value for field, value in fields.items() if self.deadband.accept(linePrefix + field, measurement, field, value)}
+		line = LineProtocol.line(linePrefix, fields, stamp)
+		if line != None:
+			self.lines.append(line)
 
 
 
 	# Submit data from the TDK Lambda low-voltage supply
-	# Invoked in iterations of influxLoop()
+	# Invoked in readout()
 	def lvToInflux(self) -> None:
 		# check and handle timeout
 		try:
@@ -95,6 +218,7 @@ class InfluxDB:
 			# If re-connecting has not yet finished, measureVoltage and measureCurrent
 			# will result in ValueError exceptions.
 			# If so, wait a short time until the connection is re-established.
+			stamp = Acquisition.Stamp()
 			voltage = self.lv.measureVoltage()
 			current = self.lv.measureCurrent()
 			#print("------------------------------------------")
@@ -103,29 +227,34 @@ class InfluxDB:
 			#print("[InfluxDB.py] Voltage: " + str(voltage) + " V")
 			#print("[InfluxDB.py] Current: " + str(current) + " A")
 			#print("------------------------------------------")
-			point_voltage = influxdb_client.Point("lv").tag("name", self.lv.name).field("voltage", voltage)
-			point_current = influxdb_client.Point("lv").tag("name", self.lv.name).field("current", current)
-			self.write_api.write(self.bucket, self.org, point_voltage)
-			self.write_api.write(self.bucket, self.org, point_current)
-			self.startTime = time.time()
+			self.appendPoint("lv", "name", self.lv.name, {"voltage": voltage, "current": current}, stamp)
 		except ValueError:
 			# Wait a short time until the connection is re-established.
 			time.sleep(0.1)
 
 
 
-	# Submit data from the CAEN high-voltage supply
-	# Invoked in iterations of influxLoop()
-	def hvToInflux(self) -> None:
+	def keepAliveHV(self) -> None:
+		if not HVList.emergency.is_set():
+			self.hv.keepAlive(InfluxDBConfig.hvKeepAliveTime)
+
+
+
+	# Make sure the CAEN high-voltage supply is connected.
+	# Returns False if there is no connection.
+	# During an emergency switch-off (see KillSwitch.py), the crates are left alone and False is returned.
+	def connectHV(self) -> bool:
+		if HVList.emergency.is_set():
+			return False
 		# ---- no connection ----
 		connectionResult = self.hv.checkConnection()
 		if connectionResult == 0:
-			return
+			return False
 		# ---- timeout -> reconnect ----
 		reconnectCounter = 0
 		while connectionResult == 1:
 			if reconnectCounter > 10:
-				return
+				return False
 			# wait a short time
 			time.sleep(0.1)
 			# attempt reconnect
@@ -134,31 +263,77 @@ class InfluxDB:
 			connectionResult = self.hv.checkConnection()
 			# count this attempt
 			reconnectCounter += 1
-
 		# ---- connected ----
-		if connectionResult == 2:
-			self.counter = 0
-			# measure voltages of all channels in all slots of the HV supply
-			for slot in list(range(0,9)) + [10, 12, 14]:
-				voltages = self.hv.measureVoltages(slot, 0, 48)
-				currents = self.hv.measureCurrents(slot, 0, 48)
-				# iterate over all channels of the current slot
-				for iCh in range(0, len(voltages)):
-					# get the HIME channel number (ranges over all channels of HIME, not only the current slot)
-					himeCh = HVList.channelMap.crateSlotCh_to_himeCh(self.hvid, slot, iCh)
-					chStr = self.to4digit(himeCh)
-					if himeCh == -1: 
-						continue
-					# submit to InfluxDB
-					point_voltage = influxdb_client.Point("hv").tag("name_channel", self.hv.name + "_" + chStr).field("voltage", voltages[iCh])
-					point_current = influxdb_client.Point("hv").tag("name_channel", self.hv.name + "_" + chStr).field("current", currents[iCh])
-					self.write_api.write(self.bucket, self.org, point_voltage)
-					self.write_api.write(self.bucket, self.org, point_current)
+		return connectionResult == 2
+
+
+
+	# Measure voltages, currents, target voltages and Pw of all HV channels connected to HIME
+	# with a single call of the HV wrapper.
+	# Returns a CrateSnapshot.CrateSnapshot, whose flat arrays are ordered like self.encoder.nameChannels,
+	# or None if the crate could not be read.
+	# Target voltages and Pw are only read if InfluxDBConfig.adaptiveRate is enabled.
+	def measureHV(self):
+		# The plan is taken from the channel map every time, so it is always up to date.
+		# The encoder only needs to be rebuilt if the plan has changed.
+		plan = HVList.channelMap.crate_to_acquisitionPlan(self.hvid)
+		if self.encoder == None or self.encoder.plan is not plan:
+			self.encoder = LineProtocol.CrateEncoder(self.hv.name, plan)
+			self.runs = [[slot, chStart, chStop] for slot, chStart, chStop, himeChannels in plan]
+		snapshot = self.hv.getSnapshot(self.parameterNames, self.runs)
+		if snapshot != None:
+			self.readDuration = snapshot.duration
+		return snapshot
+
+
+
+	# Submit data from the CAEN high-voltage supply
+	# Invoked in readout()
+	def hvToInflux(self) -> None:
+		# In the fast-sampling mode, the data has already been measured by sampleHV():
+		# submit min, max, mean and number of samples of the time window that ends with this readout.
+		# These are not deadband-filtered, since they are meant to show short excursions.
+		if self.accumulator != None:
+			for nameChannel, fields in self.accumulator.takeAll().items():
+				line = LineProtocol.line(LineProtocol.prefix("hv", "name_channel", nameChannel), fields, self.stamp)
+				if line != None:
+					self.lines.append(line)
+			return
+		if not self.connectHV():
+			return
+		# all channels of the crate are read at the same time
+		stamp = Acquisition.Stamp()
+		snapshot = self.measureHV()
+		if snapshot == None:
+			return
+		# submit to InfluxDB: one point with the fields voltage and current per channel
+		self.lines += self.encoder.encode(snapshot.flat["VMon"], snapshot.flat["IMon"], snapshot.valid, stamp, self.deadband if InfluxDBConfig.deadband else None)
+		if InfluxDBConfig.adaptiveRate:
+			self.checkTriggers(snapshot)
+
+
+
+	# Sample voltages and currents of the CAEN high-voltage supply in the fast-sampling mode
+	# Invoked by the scheduler, every InfluxDBConfig.fastSamplingTime seconds (or faster, see self.rate)
+	def sampleHV(self) -> None:
+		if not self.connectHV():
+			return
+		snapshot = self.measureHV()
+		if snapshot == None:
+			return
+		voltages = snapshot.flat["VMon"]
+		currents = snapshot.flat["IMon"]
+		for i in range(0, len(self.encoder.nameChannels)):
+			if snapshot.valid[i]:
+				self.accumulator.add(self.encoder.nameChannels[i], {"voltage": voltages[i], "current": currents[i]})
+		if InfluxDBConfig.adaptiveRate:
+			self.checkTriggers(snapshot)
+			self.updateRate()
 
 
 
 	# Submit the PaDiWa temperature
-	# Invoked in iterations of influxLoop()
+	# Invoked in readout()
 	def padiwaToInflux(self) -> None:
 		# loop over all FPGAs, where PaDiWa boards are connected to
 		for addrAndChains in PaDiWaList.padiwaList:
@@ -169,38 +344,24 @@ class InfluxDB:
 				# DAC chain of the current PaDiWa
 				chain = str(c)
 				# get temperature value
+				stamp = Acquisition.Stamp()
 				temperature = float(TemperatureReadout.getTemperature(address, chain))
-				point_temperature = influxdb_client.Point("padiwa").tag("FPGA_DACchain", address + "_" + chain).field("temperature", temperature)
-				self.write_api.write(self.bucket, self.org, point_temperature)
+				self.appendPoint("padiwa", "FPGA_DACchain", address + "_" + chain, {"temperature": temperature}, stamp)
 
 
-	# This is invoked in the subthread
-	def influxLoop(self) -> None:
-		while True:
-			if self.pauseThread:
-				self.influxDone = True
+	# This is invoked by the scheduler, every self.writeTime seconds
+	def readout(self) -> None:
+		self.stamp = Acquisition.Stamp()
+		try:
+			if self.lv != None:
+				self.lvToInflux()
+			elif self.hv != None:
+				self.hvToInflux()
 			else:
-				self.influxDone = False
-				# Check if self.writeTime has passed since the last time something was written to InfluxDB
-				if (time.time() - self.startTime) >= self.writeTime:
-					if self.lv != None:
-						self.lvToInflux()
-					if self.hv != None:
-						self.hvToInflux()
-					self.padiwaToInflux()
-					self.startTime = time.time()
-				# Avoid the loss of connection due to timeout 
-				if (time.time() - self.startTime_hvCheck) >= 30.:
-					if self.hv != None:
-						self.hv.checkConnection()
-						self.startTime_hvCheck = time.time()
-			# Wait, but allow interruption
-			time.sleep(0.1)
-
-
-
-	def to4digit(self, i: int) -> str:
-		iStr = str(i)
-		while len(iStr) < 4:
-			iStr = "0" + iStr
-		return iStr
\ No newline at end of file
+				self.padiwaToInflux()
+		finally:
+			# submit everything measured in this readout as one batch
+			InfluxWriter.writer.write(self.lines)
+			self.lines = []
+			if self.hv != None and InfluxDBConfig.adaptiveRate and not self.fastSampling:
+				self.updateRate()
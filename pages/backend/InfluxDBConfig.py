@@ -12,3 +12,75 @@ bucket = "HIME"
 # Enter a negative number to disable data submission completely.
 # Non-negative numbers smaller than 5 will be set to 5 automatically.
 writeTime = 60
+
+# Fast-sampling mode for the HV supplies:
+# Voltages and currents are sampled every fastSamplingTime seconds,
+# and for each time interval of writeTime seconds, only their minimum, maximum and mean value
+# as well as the number of samples are submitted (fields voltage_min, voltage_max, voltage_mean, ..., count).
+fastSampling = False
+fastSamplingTime = 1.
+
+# Adaptive rate for the HV supplies:
+# While an HV crate is ramping, after channels were switched on or off, after new target voltages were sent
+# and after current excursions, data is submitted every adaptiveFastTime seconds for at least adaptiveHoldTime seconds.
+# Afterwards, the time interval doubles every adaptiveHoldTime seconds until writeTime is reached again.
+# In the fast-sampling mode, the time windows always last writeTime seconds;
+# the adaptive rate then shortens the sampling interval from fastSamplingTime to adaptiveFastTime instead
+# (nothing changes if adaptiveFastTime is not smaller than fastSamplingTime).
+# A ramp is detected if VMon differs from V0Set by more than adaptiveVoltageTolerance (in V),
+# a current excursion if IMon changed by more than adaptiveCurrentTolerance (in uA) since the previous measurement.
+adaptiveRate = True
+adaptiveFastTime = 1.
+adaptiveHoldTime = 60.
+adaptiveVoltageTolerance = 5.
+adaptiveCurrentTolerance = 1.
+
+# All devices are read by a small pool of worker threads with this many workers.
+nTelemetryWorkers = 4
+
+# Time interval in seconds in which the connection to the HV supplies is checked,
+# to avoid the timeout of the connection after 1 minute.
+hvKeepAliveTime = 30.
+
+
+# Deadband filtering: a value is only submitted if it differs from the last submitted value
+# of the same channel by more than [absolute, relative] thresholds, i.e. by more than
+# max(absolute, relative * |last submitted value|),
+# or if the last submission of that channel is at least heartbeatTime seconds ago.
+# Units: LV in V and A, HV in V and uA, PaDiWa in degree Celsius.
+# Set deadband to False to submit every value.
+deadband = True
+deadbands = {
+	"lv": {"voltage": [0.01, 0.], "current": [0.001, 0.]},
+	"hv": {"voltage": [0.5, 0.], "current": [0.05, 0.02]},
+	"padiwa": {"temperature": [0.2, 0.]}
+}
+heartbeatTime = 600.
+
+# Data is collected in memory and submitted to InfluxDB in batches.
+# A batch is sent as soon as it contains batchSize lines (points),
+# or when the oldest point in it has waited for flushTime seconds.
+batchSize = 5000
+flushTime = 1.
+
+# Maximum number of points kept in memory while waiting for submission.
+# If InfluxDB cannot keep up, the oldest points are dropped.
+maxQueueSize = 200000
+
+# Compress the data submitted to InfluxDB with gzip.
+gzip = True
+
+# If InfluxDB is not reachable, data is spooled to files in this directory
+# (relative to the directory Power-Supply Control is started from).
+# The files are rotated after spoolSegmentSize bytes.
+# If the spool exceeds spoolMaxSize bytes, the oldest file is deleted.
+spoolDirectory = "influxSpool"
+spoolSegmentSize = 4 * 1024 * 1024
+spoolMaxSize = 512 * 1024 * 1024
+
+# While InfluxDB is not reachable, a new submission is attempted every retryTime seconds.
+# Afterwards, the spool is replayed in batches of replayBatchSize lines,
+# with at most replayRate lines per second.
+retryTime = 10.
+replayBatchSize = 5000
+replayRate = 20000.
@@ -0,0 +1,146 @@
+import os
+import threading
+
+
+
+# Write-ahead spool for data that could not be submitted to InfluxDB.
+#
+# Lines in InfluxDB line protocol are appended to files in a directory on the local disk.
+# The files ("segments") are rotated as soon as they exceed segmentSize bytes
+# and are named by a running number, so the oldest segment always comes first.
+# If the total size exceeds maxSize bytes, the oldest segment is deleted.
+#
+# Replaying always starts with the oldest segment and proceeds line by line (peek() and consume()).
+# The position inside the segment that is currently replayed is only kept in memory,
+# so after a restart that segment is replayed from its beginning again.
+# This does no harm, because all lines carry timestamps and InfluxDB simply overwrites identical points.
+class InfluxSpool:
+	def __init__(self, directory: str, segmentSize: int, maxSize: int) -> None:
+		self.directory = directory
+		self.segmentSize = segmentSize
+		self.maxSize = maxSize
+		self.lock = threading.Lock()
+		os.makedirs(self.directory, exist_ok = True)
+		# numbers of all segments on disk, oldest first
+		self.segments = []
+		for fileName in os.listdir(self.directory):
+			if fileName.startswith("segment_") and fileName.endswith(".lp"):
+				try:
+					self.segments.append(int(fileName[8:-3]))
+				except ValueError:
+					continue
+		self.segments.sort()
+		self.sizes = {}
+		for number in self.segments:
+			self.sizes[number] = os.path.getsize(self.segmentPath(number))
+		# the newest segment is only appended to if it is not full yet
+		self.currentSegment = None
+		if len(self.segments) > 0 and self.sizes[self.segments[-1]] < self.segmentSize:
+			self.currentSegment = self.segments[-1]
+		# lines of the oldest segment and the number of lines already replayed
+		self.replaySegment = None
+		self.replayLines = []
+		self.replayIndex = 0
+		# -- statistics --
+		self.nEvictedSegments = 0
+
+
+
+	def segmentPath(self, number: int) -> str:
+		return os.path.join(self.directory, "segment_" + str(number).zfill(12) + ".lp")
+
+
+
+	# total size of all segments in bytes
+	def size(self) -> int:
+		return sum(self.sizes.values())
+
+
+
+	def isEmpty(self) -> bool:
+		return len(self.segments) == 0
+
+
+
+	# Start a new segment for appending
+	def rotate(self) -> None:
+		if len(self.segments) == 0:
+			number = 0
+		else:
+			number = self.segments[-1] + 1
+		self.segments.append(number)
+		self.sizes[number] = 0
+		self.currentSegment = number
+
+
+
+	def removeSegment(self, number: int) -> None:
+		try:
+			os.remove(self.segmentPath(number))
+		except FileNotFoundError:
+			pass
+		self.segments.remove(number)
+		del self.sizes[number]
+		if self.currentSegment == number:
+			self.currentSegment = None
+		if self.replaySegment == number:
+			self.replaySegment = None
+			self.replayLines = []
+			self.replayIndex = 0
+
+
+
+	# Append lines to the newest segment.
+	# If the size limit is exceeded, the oldest segments are evicted.
+	def append(self, lines) -> None:
+		if len(lines) == 0:
+			return
+		data = ("\n".join(lines) + "\n").encode("utf-8")
+		with self.lock:
+			if self.currentSegment == None or self.sizes[self.currentSegment] >= self.segmentSize:
+				self.rotate()
+			with open(self.segmentPath(self.currentSegment), "ab") as f:
+				f.write(data)
+				f.close()
+			self.sizes[self.currentSegment] += len(data)
+			# keep at least the segment that has just been written
+			while self.size() > self.maxSize and len(self.segments) > 1:
+				self.removeSegment(self.segments[0])
+				self.nEvictedSegments += 1
+
+
+
+	# Get (at most) the next nLines lines to be replayed, without removing them from the spool.
+	# All returned lines belong to the oldest segment.
+	def peek(self, nLines: int):
+		with self.lock:
+			if len(self.segments) == 0:
+				return []
+			oldest = self.segments[0]
+			if self.replaySegment != oldest:
+				# never read a segment that is still being appended to
+				if oldest == self.currentSegment:
+					self.currentSegment = None
+				try:
+					with open(self.segmentPath(oldest), "rb") as f:
+						self.replayLines = f.read().decode("utf-8").splitlines()
+						f.close()
+				except FileNotFoundError:
+					self.replayLines = []
+				self.replaySegment = oldest
+				self.replayIndex = 0
+				if len(self.replayLines) == 0:
+					self.removeSegment(oldest)
+			return self.replayLines[self.replayIndex : self.replayIndex + nLines]
+
+
+
+	# Mark the nLines lines returned by the last invocation of peek() as submitted.
+	# The oldest segment is deleted once all of its lines have been submitted.
+	def consume(self, nLines: int) -> None:
+		with self.lock:
+			if self.replaySegment == None:
+				return
+			self.replayIndex += nLines
+			if self.replayIndex >= len(self.replayLines):
+				self.removeSegment(self.replaySegment)
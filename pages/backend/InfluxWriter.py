@@ -0,0 +1,192 @@
+import threading
+import time
+import os
+import influxdb_client
+from influxdb_client.client.write_api import SYNCHRONOUS
+from influxdb_client.rest import ApiException
+import pages.backend.InfluxDBConfig as InfluxDBConfig
+import pages.backend.InfluxSpool as InfluxSpool
+
+# The one writer shared by all telemetry threads (LV, HV and PaDiWa).
+# It is created in InitPowerSupplies.init().
+writer = None
+
+# -------- Results of InfluxWriter.flush() --------
+FLUSH_OK = 0
+# InfluxDB could not be reached or was overloaded (connection error, timeout, HTTP 5xx, 408, 429): try again later
+FLUSH_RETRY = 1
+# InfluxDB rejected the batch for good (other HTTP 4xx, e.g. invalid line protocol or a field-type conflict):
+# sending it again would fail again
+FLUSH_REJECTED = 2
+
+
+
+# Collects data in InfluxDB line protocol and submits it in batches.
+# Producers only append lines to a list in memory, which is cheap and never blocks on the network.
+# A separate worker thread sends everything collected so far in one (gzip-compressed) request,
+# either as soon as InfluxDBConfig.batchSize lines are waiting,
+# or when InfluxDBConfig.flushTime seconds have passed since the oldest waiting line was added.
+# Only one instance is needed for the whole program: 
+# all devices share its InfluxDB client and thereby the same HTTP connection.
+#
+# If a submission fails, the batch is written to a spool on the local disk (see InfluxSpool.py),
+# and so is all new data, until InfluxDB is reachable again.
+# Every InfluxDBConfig.retryTime seconds, the worker tries to replay the oldest spooled lines.
+# As soon as that works, the spool is replayed in order, in batches of InfluxDBConfig.replayBatchSize lines
+# and limited to InfluxDBConfig.replayRate lines per second, while new data is submitted directly again.
+#
+# A batch that InfluxDB rejects for good (see FLUSH_REJECTED) is neither spooled nor retried,
+# because it would block the spool forever; it is dropped and counted in nRejectedLines.
+# With a partial write (HTTP 400), InfluxDB has stored the valid points of the batch anyway.
+class InfluxWriter:
+	def __init__(self) -> None:
+		self.bucket = InfluxDBConfig.bucket
+		self.org = InfluxDBConfig.org
+		self.token = os.getenv("INFLUX_TOKEN")
+		self.url = InfluxDBConfig.url
+		self.batchSize = InfluxDBConfig.batchSize
+		self.flushTime = InfluxDBConfig.flushTime
+		self.maxQueueSize = InfluxDBConfig.maxQueueSize
+		self.spool = InfluxSpool.InfluxSpool(InfluxDBConfig.spoolDirectory, InfluxDBConfig.spoolSegmentSize, InfluxDBConfig.spoolMaxSize)
+		self.reachable = True
+		self.nextReplayTime = time.monotonic()
+		# Only the worker thread sends requests, so a single pooled connection is enough.
+		self.client = influxdb_client.InfluxDBClient(url=self.url, token=self.token, org=self.org, enable_gzip=InfluxDBConfig.gzip, connection_pool_maxsize=1)
+		self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
+		# lines waiting for submission and the time the oldest one was added
+		self.lines = []
+		self.oldestLineTime = None
+		self.condition = threading.Condition()
+		# -- statistics, displayed on the home page --
+		self.nFlushes = 0
+		self.nFailedFlushes = 0
+		self.nDroppedLines = 0
+		self.nRejectedLines = 0
+		self.lastFlushSize = 0
+		self.lastFlushLatency = 0.
+		self.lastError = ""
+		# -- create and start the worker thread --
+		self.thread = threading.Thread(target = self.flushLoop, daemon = True)
+		self.thread.start()
+
+
+
+	# Add a list of lines in InfluxDB line protocol.
+	# This can be invoked from any thread and returns immediately.
+	# The queue is bounded by self.maxQueueSize lines: 
+	# if InfluxDB cannot keep up, the oldest lines are dropped.
+	def write(self, lines) -> None:
+		if len(lines) == 0:
+			return
+		with self.condition:
+			if len(self.lines) == 0:
+				self.oldestLineTime = time.monotonic()
+			self.lines += lines
+			nOverflow = len(self.lines) - self.maxQueueSize
+			if nOverflow > 0:
+				del self.lines[:nOverflow]
+				self.nDroppedLines += nOverflow
+			self.condition.notify()
+
+
+
+	# number of lines waiting for submission
+	def queueDepth(self) -> int:
+		return len(self.lines)
+
+
+
+	# Take at most self.batchSize lines out of the waiting list.
+	# Needs to be invoked while holding self.condition.
+	def takeBatch(self):
+		batch = self.lines[:self.batchSize]
+		del self.lines[:self.batchSize]
+		if len(self.lines) == 0:
+			self.oldestLineTime = None
+		else:
+			self.oldestLineTime = time.monotonic()
+		return batch
+
+
+
+	# Send one batch as a single request.
+	# Returns FLUSH_OK, FLUSH_RETRY or FLUSH_REJECTED; a rejected batch is counted and dropped.
+	def flush(self, batch) -> int:
+		startTime = time.monotonic()
+		try:
+			self.write_api.write(self.bucket, self.org, "\n".join(batch))
+		except Exception as e:
+			self.nFailedFlushes += 1
+			self.lastError = str(e)
+			if isinstance(e, ApiException) and e.status != None and 400 <= e.status < 500 and e.status not in (408, 429):
+				self.nRejectedLines += len(batch)
+				print("[InfluxWriter.py] InfluxDB rejected " + str(len(batch)) + " lines, which are dropped: " + self.lastError)
+				return FLUSH_REJECTED
+			print("[InfluxWriter.py] Submission of " + str(len(batch)) + " lines failed: " + self.lastError)
+			return FLUSH_RETRY
+		self.lastFlushLatency = time.monotonic() - startTime
+		self.lastFlushSize = len(batch)
+		self.nFlushes += 1
+		return FLUSH_OK
+
+
+
+	# Submit the oldest lines of the spool, if the rate limit allows it.
+	# A successful replay shows that InfluxDB is reachable again; so does a rejection,
+	# after which the rejected lines are removed from the spool.
+	def replay(self) -> None:
+		if self.spool.isEmpty() or time.monotonic() < self.nextReplayTime:
+			return
+		batch = self.spool.peek(InfluxDBConfig.replayBatchSize)
+		if len(batch) == 0:
+			return
+		if self.flush(batch) != FLUSH_RETRY:
+			self.spool.consume(len(batch))
+			self.reachable = True
+			self.nextReplayTime = time.monotonic() + len(batch) / InfluxDBConfig.replayRate
+		else:
+			self.reachable = False
+			self.nextReplayTime = time.monotonic() + InfluxDBConfig.retryTime
+
+
+
+	# This is invoked in the worker thread
+	def flushLoop(self) -> None:
+		while True:
+			with self.condition:
+				# wait until the batch is full, the oldest line is old enough
+				# or the spool can be replayed
+				while True:
+					if len(self.lines) >= self.batchSize:
+						break
+					now = time.monotonic()
+					timeLeft = None
+					if self.oldestLineTime != None:
+						timeLeft = self.oldestLineTime + self.flushTime - now
+					if not self.spool.isEmpty():
+						replayTimeLeft = self.nextReplayTime - now
+						if timeLeft == None or replayTimeLeft < timeLeft:
+							timeLeft = replayTimeLeft
+					if timeLeft != None and timeLeft <= 0:
+						break
+					self.condition.wait(timeLeft)
+				batch = []
+				if self.oldestLineTime != None and (len(self.lines) >= self.batchSize or time.monotonic() >= self.oldestLineTime + self.flushTime):
+					batch = self.takeBatch()
+			# send without holding the lock, so producers are never blocked by the network
+			if len(batch) > 0:
+				if not self.reachable:
+					self.spool.append(batch)
+				elif self.flush(batch) == FLUSH_RETRY:
+					self.spool.append(batch)
+					self.reachable = False
+					self.nextReplayTime = time.monotonic() + InfluxDBConfig.retryTime
+			self.replay()
+
+
+
+# Create the shared writer; invoked once when the server is started
+def start() -> None:
+	global writer
+	if writer == None:
+		writer = InfluxWriter()
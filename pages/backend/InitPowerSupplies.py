@@ -5,10 +5,12 @@ import pages.backend.lv.LVDefinitions as LVDef
 import pages.backend.hv.HVDefinitions as HVDef
 import pages.backend.padiwa.PaDiWaDefinitions as PaDiWaDef
 import pages.backend.InfluxDB as InfluxDB
+import pages.backend.InfluxWriter as InfluxWriter
+import pages.backend.TelemetryScheduler as TelemetryScheduler
 import pages.backend.InfluxDBConfig as InfluxDBConfig
 import pages.backend.lv.LVList as LVList
 import pages.backend.hv.HVList as HVList
-import pages.backend.hv.ChannelMap as ChannelMap
+import pages.backend.hv.MapWatcher as MapWatcher
 
 # Adding an entry to sys.argv is a hack to avoid that the TCP socket for the LV control
 # and the C wrapper for the HV control are re-instanciated
@@ -33,12 +35,14 @@ def init():
 	LVDef.init()
 	HVDef.init()
 	PaDiWaDef.init()
-	# Create channel map
-	HVList.channelMap = ChannelMap.ChannelMap("pages/backend/hv/channelMapping/2024-09-06_de.csv")
-	# Start threads for writing data to InfluxDB
+	# Create channel map and reload it whenever the file changes
+	MapWatcher.start(HVDef.CHANNEL_MAP_FILE)
+	# Start writing data to InfluxDB periodically
 	if InfluxDBConfig.writeTime >= 0:
+		InfluxWriter.start()
+		TelemetryScheduler.start()
 		for i in range(0, len(LVList.lvSupplyList)):
-			InfluxDB.lvThreads.append(InfluxDB.InfluxDB(lv = LVList.lvSupplyList[i]))
+			InfluxDB.lvTelemetry.append(InfluxDB.InfluxDB(lv = LVList.lvSupplyList[i]))
 		for i in range(0, len(HVList.hvSupplyList)):
-			InfluxDB.hvThreads.append(InfluxDB.InfluxDB(hv = HVList.hvSupplyList[i], hvid = i))
-		InfluxDB.padiwaThreads.append(InfluxDB.InfluxDB())
+			InfluxDB.hvTelemetry.append(InfluxDB.InfluxDB(hv = HVList.hvSupplyList[i], hvid = i))
+		InfluxDB.padiwaTelemetry.append(InfluxDB.InfluxDB())
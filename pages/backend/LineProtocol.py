@@ -0,0 +1,104 @@
+import math
+import numbers
+
+# Helper functions to write InfluxDB line protocol directly,
+# without creating influxdb_client.Point objects first.
+# The format is the same as the one produced by influxdb_client.Point.to_line_protocol().
+
+
+
+# Escape commas, spaces and equal signs in measurement names, tag keys, tag values and field keys
+def escape(s: str) -> str:
+	return s.replace("\\", "\\\\").replace(",", "\\,").replace(" ", "\\ ").replace("=", "\\=")
+
+
+
+# "measurement,tagKey=tagValue " -> the part of a line that is identical for all points of a series
+def prefix(measurement: str, tagKey: str, tagValue: str) -> str:
+	return escape(measurement) + "," + escape(tagKey) + "=" + escape(tagValue) + " "
+
+
+
+# Format a field value; returns None for values that cannot be submitted (None, NaN, inf).
+# Integers get the suffix "i", floats are written without a trailing ".0", booleans as true/false.
+# NumPy values (e.g. float32 values read by the HV wrapper) are accepted as well;
+# str() gives the shortest representation of their own precision.
+def formatValue(value) -> str:
+	if value is None:
+		return None
+	if isinstance(value, bool):
+		return "true" if value else "false"
+	if isinstance(value, numbers.Integral):
+		return str(int(value)) + "i"
+	if not math.isfinite(value):
+		return None
+	s = str(value)
+	if s.endswith(".0"):
+		s = s[:-2]
+	return s
+
+
+
+# The end of all lines of an acquisition (see Acquisition.Stamp):
+# the field "epoch" and the timestamp (ns) of the acquisition
+def suffix(stamp) -> str:
+	return ",epoch=" + str(stamp.epoch) + "i " + str(stamp.wall)
+
+
+
+# Build a complete line from a prefix, a dictionary {field: value} and an Acquisition.Stamp.
+# Returns None if none of the fields can be submitted.
+def line(linePrefix: str, fields, stamp) -> str:
+	formattedFields = []
+	for field, value in fields.items():
+		formattedValue = formatValue(value)
+		if formattedValue != None:
+			formattedFields.append(escape(field) + "=" + formattedValue)
+	if len(formattedFields) == 0:
+		return None
+	return linePrefix + ",".join(formattedFields) + suffix(stamp)
+
+
+
+# Precomputed line-protocol encoder for the HV channels of one crate read by the telemetry.
+#
+# The tag sets are static once the channel map is loaded, so the prefixes
+#   hv,name_channel=[name of the HV supply]_[4-digit HIME channel]
+# are created only once, in the order of the acquisition plan (see ChannelMap.createAcquisitionPlans()).
+# Voltage and current of a channel are submitted as a single point with two fields.
+class CrateEncoder:
+	def __init__(self, hvName: str, plan) -> None:
+		# the acquisition plan this encoder was built for
+		self.plan = plan
+		nameChannels = []
+		for slot, chStart, chStop, himeChannels in plan:
+			for himeCh in himeChannels:
+				nameChannels.append(hvName + "_" + str(himeCh).zfill(4))
+		self.nameChannels = tuple(nameChannels)
+		self.prefixes = tuple([prefix("hv", "name_channel", nameChannel) for nameChannel in nameChannels])
+		# deadband keys, see Deadband.accept()
+		self.voltageKeys = tuple([p + "voltage" for p in self.prefixes])
+		self.currentKeys = tuple([p + "current" for p in self.prefixes])
+
+
+
+	# Encode one readout of the crate.
+	# voltages, currents and valid (False for values that could not be read) are ordered like self.prefixes;
+	# all values carry the time given by stamp (Acquisition.Stamp).
+	# If deadband is given, fields that didn't change enough are left out.
+	def encode(self, voltages, currents, valid, stamp, deadband = None):
+		lineSuffix = suffix(stamp)
+		lines = []
+		for i in range(0, len(self.prefixes)):
+			if not valid[i]:
+				continue
+			fields = []
+			voltage = formatValue(voltages[i])
+			if voltage != None and (deadband == None or deadband.accept(self.voltageKeys[i], "hv", "voltage", voltages[i])):
+				fields.append("voltage=" + voltage)
+			current = formatValue(currents[i])
+			if current != None and (deadband == None or deadband.accept(self.currentKeys[i], "hv", "current", currents[i])):
+				fields.append("current=" + current)
+			if len(fields) > 0:
+				lines.append(self.prefixes[i] + ",".join(fields) + lineSuffix)
+		return lines
@@ -0,0 +1,168 @@
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pages.backend.InfluxDBConfig as InfluxDBConfig
+
+# The one scheduler shared by all devices.
+# It is created in InitPowerSupplies.init().
+scheduler = None
+
+
+
+# Tasks of the same device belong to the same group.
+# They never run at the same time, because they talk to the same device,
+# and they are paused together, e.g. while a web page is talking to the device.
+class TaskGroup:
+	def __init__(self) -> None:
+		self.paused = False
+		self.running = False
+		self.condition = threading.Condition()
+
+
+
+	# This can be invoked in the main thread.
+	# Returns as soon as no task of this group is running anymore.
+	def pause(self) -> None:
+		with self.condition:
+			self.paused = True
+			while self.running:
+				self.condition.wait()
+
+
+
+	def run(self) -> None:
+		with self.condition:
+			self.paused = False
+
+
+
+	# Execute function, unless the group is paused or another task of this group is running.
+	# Doesn't wait, so a slow device can't occupy more than one worker;
+	# a skipped task runs again at its next deadline.
+	# Returns True if function was executed.
+	def execute(self, function) -> bool:
+		with self.condition:
+			if self.running or self.paused:
+				return False
+			self.running = True
+		try:
+			function()
+		finally:
+			with self.condition:
+				self.running = False
+				self.condition.notify_all()
+		return True
+
+
+
+# A function that is executed periodically, every `period` seconds
+class Task:
+	def __init__(self, name: str, period: float, function, group: TaskGroup) -> None:
+		self.name = name
+		self.period = period
+		self.function = function
+		self.group = group
+		# deadline of the next execution (time.monotonic())
+		self.deadline = None
+		# Changing the period reschedules the task;
+		# heap entries with an older generation are ignored.
+		self.generation = 0
+		# True while the task is waiting for or occupying a worker
+		self.busy = False
+		self.lastDuration = 0.
+
+
+
+# Keeps a heap of tasks ordered by their deadlines.
+# A single thread sleeps until the earliest deadline and hands the due task over to a small pool of workers.
+# If a task is still busy when it's due again, or another task of its group is running, that execution is skipped.
+class TelemetryScheduler:
+	def __init__(self, nWorkers: int) -> None:
+		self.heap = []
+		# tie-breaker for tasks with identical deadlines
+		self.counter = 0
+		self.condition = threading.Condition()
+		self.executor = ThreadPoolExecutor(max_workers = nWorkers, thread_name_prefix = "telemetry")
+		self.thread = threading.Thread(target = self.schedulerLoop, daemon = True)
+		self.thread.start()
+
+
+
+	# Needs to be invoked while holding self.condition
+	def push(self, task: Task) -> None:
+		heapq.heappush(self.heap, (task.deadline, self.counter, task.generation, task))
+		self.counter += 1
+		self.condition.notify()
+
+
+
+	# Add a task; its first execution is due after `delay` seconds
+	def add(self, task: Task, delay: float = 0.) -> None:
+		with self.condition:
+			task.deadline = time.monotonic() + delay
+			self.push(task)
+
+
+
+	# Change the period of a task.
+	# The next execution is due one new period after the previous one,
+	# or after `delay` seconds if a delay is given.
+	def setPeriod(self, task: Task, period: float, delay: float = None) -> None:
+		with self.condition:
+			task.period = period
+			task.generation += 1
+			if delay == None:
+				task.deadline = min(task.deadline, time.monotonic() + period)
+			else:
+				task.deadline = time.monotonic() + delay
+			self.push(task)
+
+
+
+	# This is invoked in the worker threads
+	def execute(self, task: Task) -> None:
+		startTime = time.monotonic()
+		try:
+			if task.group.execute(task.function):
+				task.lastDuration = time.monotonic() - startTime
+		except Exception as e:
+			print("[TelemetryScheduler.py] Task \"" + task.name + "\" failed: " + str(e))
+			task.lastDuration = time.monotonic() - startTime
+		task.busy = False
+
+
+
+	# This is invoked in the scheduler thread
+	def schedulerLoop(self) -> None:
+		while True:
+			with self.condition:
+				# sleep until the earliest deadline
+				while True:
+					if len(self.heap) == 0:
+						self.condition.wait()
+						continue
+					timeLeft = self.heap[0][0] - time.monotonic()
+					if timeLeft <= 0:
+						break
+					self.condition.wait(timeLeft)
+				deadline, counter, generation, task = heapq.heappop(self.heap)
+				if generation != task.generation:
+					continue
+				# schedule the next execution; don't try to catch up on missed ones
+				task.deadline = deadline + task.period
+				if task.deadline < time.monotonic():
+					task.deadline = time.monotonic() + task.period
+				self.push(task)
+			if task.busy:
+				continue
+			task.busy = True
+			self.executor.submit(self.execute, task)
+
+
+
+# Create the shared scheduler; invoked once when the server is started
+def start() -> None:
+	global scheduler
+	if scheduler == None:
+		scheduler = TelemetryScheduler(InfluxDBConfig.nTelemetryWorkers)
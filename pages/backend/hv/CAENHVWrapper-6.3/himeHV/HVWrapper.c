@@ -10,194 +10,132 @@
 #include <string.h>
 #include <stdlib.h>
 #include <stdio.h>
+#include <stdint.h>
 #include <ctype.h>
 #include "HVWrapper.h"
 #include "../include/CAENHVWrapper.h"
 
 //#define HIMEDEBUG
 
-HV System[MAX_HVPS];
+// Every function takes the handle of the HV system (crate) it talks to,
+// which is obtained from HVSystemLogin().
+// There is no global state, so one loaded library can serve any number of crates,
+// and different crates can be accessed from different threads at the same time.
+// Calls for the same crate need to be serialized by the caller.
 
-static int isInitialized = 0;
-
-
-void freeMe(char* ptr){
-	if(ptr != NULL){
-		free(ptr);
-	}
-}
-
-int noHVPS(void){	
-	int i = 0;
-
-	while( i != (MAX_HVPS - 1)){
-		if(System[i].ID != -1) break;
-		i++;
-	}
-	return ( ( i == MAX_HVPS - 1 ) ? 1 : 0 );
-}
-
-static int OneHVPS(void){	
-	int i, j, k;
-
-	for( i = 0, k = 0 ; i < (MAX_HVPS - 1) ; i++ )
-		if( System[i].ID != -1 )
-		{
-			j = i;
-			k++;
-		}
-
-	return ( ( k != 1 ) ? -1 : j );
-}
 
 
+// Log in to the HV system at the given IP address.
+// On success, the handle of the system is written to *handle.
+// Returns CAENHV_OK or an error code (see HVWrapper.h and CAENHVWrapper.h)
+int HVSystemLogin(char* user, char* passwd, char* ip, int* handle){
 
-void initSystem(int force){
-	if(force == 0) if(isInitialized == 1) return;
+	int sysHndl = -1;
+	CAENHVRESULT ret = CAENHV_InitSystem((CAENHV_SYSTEM_TYPE_t)2, LINKTYPE_TCPIP, ip, user, passwd, &sysHndl);
+	// -- debug --
 	#ifdef HIMEDEBUG
-	printf("[C] Initialize system.\n"); fflush(stdout);
+	printf("[C] HVSystemLogin:    ip = %s    handle = %d    return = %d\n", ip, sysHndl, ret);
 	#endif
-	for(int i = 0; i < MAX_HVPS ; i++ ){
-		System[i].ID = -1;
-	}
-	isInitialized = 1;
+	// -----------
+
+	*handle = ( ret == CAENHV_OK ) ? sysHndl : -1;
+	return ret;
 }
 
 
 
-const char* HVSystemLogin(char* user, char* passwd, char* ip){
+// Returns CAENHV_OK or an error code
+int HVSystemLogout(int handle){
 
-	int i = 0;
-	while( System[i].ID != -1 && i != (MAX_HVPS - 1)) i++;
-	if( i == MAX_HVPS - 1 )
-	{
-		printf("\n");
-		char* reply = "!!Too many connections";
-		char* buf = strdup(reply);
-		return buf;
+	if( handle < 0 ){
+		return HIME_ERR_NO_HVPS;
 	}
-	
-	int sysHndl = -1;
-	CAENHVRESULT ret = CAENHV_InitSystem((CAENHV_SYSTEM_TYPE_t)2, LINKTYPE_TCPIP, ip, user, passwd, &sysHndl);
+
+	CAENHVRESULT ret = CAENHV_DeinitSystem(handle);
 	// -- debug --
 	#ifdef HIMEDEBUG
-	printf("[C] HVSystemLogin:    i = %d    handle = %d    return = %d\n", i, sysHndl, ret);
+	printf("[C] HVSystemLogout:    handle = %d    return = %d\n", handle, ret);
 	#endif
 	// -----------
 
-	char reply[300] = "";
-
-	if( ret == CAENHV_OK ){
-		while( System[i].ID != -1 ) i++;
-		System[i].ID = ret;
-		System[i].Handle = sysHndl;
-		sprintf(reply, "%d", ret);
-	}
-	else{
-		sprintf(reply, "!!%d", ret);
-	}
-
-	char *buf = strdup(reply);
-	return buf;
+	return ret;
 }
 
 
 
-const char* HVSystemLogout(){
-
-	if( noHVPS() ){
-		const char* reply = "!!There is no connection set up that could be closed now.";
-		char* buf = strdup(reply);
-		return buf;
-	}
+// Cheap check whether the HV system still answers: read the system property "ModelName",
+// which is a single short reply, instead of the full crate map.
+// Returns CAENHV_OK or an error code; CAENHV_DOWN or 0x1002 mean the connection was lost.
+int HVProbe(int handle){
 
-	int handle = -1;
-	int i;
-	if( ( i = OneHVPS() ) >= 0 ){
-		handle = System[i].Handle;
+	if( handle < 0 ){
+		return HIME_ERR_NO_HVPS;
 	}
 
-	CAENHVRESULT ret = CAENHV_DeinitSystem(handle);
+	// string properties are up to 1024 bytes long (see the CAEN HV wrapper demo)
+	char reply[4096];
+	CAENHVRESULT ret = CAENHV_GetSysProp(handle, "ModelName", reply);
 	// -- debug --
 	#ifdef HIMEDEBUG
-	printf("[C] HVSystemLogout:    i = %d    handle = %d    return = %d\n", i, handle, ret);
+	printf("[C] HVProbe:    handle = %d    return = %d\n", handle, ret);
 	#endif
 	// -----------
 
-	char reply[300] = "";
-	if( ret != CAENHV_OK ){
-		sprintf(reply, "!!%d", ret);
-	}
-	
-	if( ret == CAENHV_OK ){
-		i = 0;
-		while( System[i].Handle,handle ) i++;
-		for( ; System[i].ID != -1; i++ ){
-			System[i].ID = System[i+1].ID;
-			System[i].Handle = System[i+1].Handle;
-		}
-	}
-
-	char *buf = strdup(reply);
-    return buf;
+	return ret;
 }
 
 
 
-const char* HVGetCrateMap(){
+// Write the crate map to reply, a buffer of replySize bytes provided by the caller:
+// one line per slot with board type, description, number of channels, serial number and firmware release.
+// Returns CAENHV_OK or an error code.
+int HVGetCrateMap(int handle, char* reply, int replySize){
 	unsigned short	NrOfSl, *SerNumList, *NrOfCh;
 	char			*ModelList, *DescriptionList;
 	unsigned char	*FmwRelMinList, *FmwRelMaxList;
 	CAENHVRESULT	ret;
-	int				handle = -1;
-	int				i;
 
 	ModelList = NULL;
 	DescriptionList = NULL;
 
-	if( noHVPS() ){
-		char* reply = "!!noHVPS";
-		char* buf = strdup(reply);
-		return buf;
+	if( replySize < 1 ){
+		return HIME_ERR_BUFFER_TOO_SMALL;
 	}
+	reply[0] = '\0';
 
-	if( ( i = OneHVPS() ) >= 0 )
-		handle = System[i].Handle;
-
-	char reply[10000] = "";
+	if( handle < 0 ){
+		return HIME_ERR_NO_HVPS;
+	}
 
 	ret = CAENHV_GetCrateMap(handle, &NrOfSl, &NrOfCh, &ModelList, &DescriptionList, &SerNumList, &FmwRelMinList, &FmwRelMaxList );
 	// -- debug --
 	#ifdef HIMEDEBUG
-	printf("[C] HVGetCrateMap:    i = %d    handle = %d    return = %d\n", i, handle, ret);
+	printf("[C] HVGetCrateMap:    handle = %d    return = %d\n", handle, ret);
 	#endif
 	// -----------
 
 	if( ret != CAENHV_OK ){
-		sprintf(reply, "!!%d", ret);
-		char* buf = strdup(reply);
-		return buf;
+		return ret;
 	}
 
 	if(!DescriptionList || !ModelList){
-		char* reply = "!!DescriptionList or ModelList is NULL";
-		char* buf = strdup(reply);
-		return buf;
+		return HIME_ERR_NULL_LIST;
 	}
 
 	char *m = ModelList;
 	char *d = DescriptionList;
+	int length = 0;
 
 	for(int i = 0; i < NrOfSl; i++ , m += strlen(m) + 1, d += strlen(d) + 1 ){
 		if( *m == '\0' ){
-			char tmp[50];
-			sprintf(tmp, "----,,,,\n");
-			strcat(reply, tmp);
+			length += snprintf(reply + length, replySize - length, "----,,,,\n");
 		}
 		else{
-			char tmp[100];      
-			sprintf(tmp, "%s,%s,%d,%d,%d.%d\n", m, d, NrOfCh[i], SerNumList[i], FmwRelMaxList[i], FmwRelMinList[i]);
-			strcat(reply, tmp);
+			length += snprintf(reply + length, replySize - length, "%s,%s,%d,%d,%d.%d\n", m, d, NrOfCh[i], SerNumList[i], FmwRelMaxList[i], FmwRelMinList[i]);
+		}
+		if( length >= replySize ){
+			ret = HIME_ERR_BUFFER_TOO_SMALL;
+			break;
 		}
 	}
 
@@ -208,175 +146,210 @@ const char* HVGetCrateMap(){
 	CAENHV_Free(FmwRelMaxList);
 	CAENHV_Free(NrOfCh);
 	
-	char *buf = strdup(reply);
-    return buf;
+	return ret;
 }
 
 
 
-void freeLists(unsigned long type, float fParValList[], unsigned long lParValList[]){
-	if( type == PARAM_TYPE_NUMERIC ){
-		if( fParValList != NULL ){
-			free(fParValList); 
-		}
-	}
-	else{
-		if( lParValList != NULL ){
-			free(lParValList);
-		}
-	}
-}
+// Get several parameters of the same range of channels with one call from Python,
+// e.g. VMon, IMon, V0Set, RUp, RDWn, Pw and Status.
+// ParNames holds nPar parameter names, ParTypes their types (0: float, 1: integer).
+// The types are given by the caller (see ParameterProperties.py),
+// so no CAENHV_GetChParamProp round trip is needed for each read.
+// The values are written to buffers provided by the caller, with nPar rows of (chStop - chStart) values each:
+// row iPar of fValues is filled for float parameters, row iPar of lValues for integer parameters.
+// Returns CAENHV_OK or the error code of the first parameter that could not be read.
+int HVGetChParams(int handle, unsigned short Slot, unsigned short chStart, unsigned short chStop, char** ParNames, int* ParTypes, int nPar, float* fValues, uint32_t* lValues){
 
+	if( handle < 0 ){
+		return HIME_ERR_NO_HVPS;
+	}
 
+	if( chStop <= chStart || nPar <= 0 ){
+		return CAENHV_OK;
+	}
+	unsigned short ChNum = chStop - chStart;
 
-const char* throwError(int ret){
-	char reply[100];
-	sprintf(reply, "!!%d", ret);
-	return strdup(reply);
-}
+	unsigned short* ChList = malloc(ChNum * sizeof(unsigned short));
+	for(int ch = chStart; ch < chStop; ch++){
+		ChList[ch - chStart] = ch;
+	}
 
+	// CAENHV_GetChParam writes unsigned longs for integer parameters
+	unsigned long* lParValList = malloc(ChNum * sizeof(unsigned long));
 
+	CAENHVRESULT ret = CAENHV_OK;
+	for(int iPar = 0; iPar < nPar; iPar++){
+		if( ParTypes[iPar] == PARAM_TYPE_NUMERIC ){
+			ret = CAENHV_GetChParam(handle, Slot, ParNames[iPar], ChNum, ChList, fValues + iPar * ChNum);
+		}
+		else{
+			ret = CAENHV_GetChParam(handle, Slot, ParNames[iPar], ChNum, ChList, lParValList);
+			for(int iCh = 0; iCh < ChNum; iCh++){
+				lValues[iPar * ChNum + iCh] = (uint32_t)lParValList[iCh];
+			}
+		}
+		#ifdef HIMEDEBUG
+		printf("[C] HVGetChParams:    handle = %d    parameter = %s    return = %d\n", handle, ParNames[iPar], ret);
+		#endif
+		if( ret != CAENHV_OK ){
+			break;
+		}
+	}
 
-const char* freeListsAndThrowError(int ret, unsigned long type, float fParValList[], unsigned long lParValList[]){
-	freeLists(type, fParValList, lParValList);
-	return throwError(ret);
+	free(ChList);
+	free(lParValList);
+	return ret;
 }
 
 
 
-const char* HVGetChParam(unsigned short Slot, unsigned short chStart, unsigned short chStop, char* ParName, int iType){
-
-	char reply[800] = "";
+// Get several parameters of several ranges of channels ("runs") of the crate with one call from Python,
+// e.g. a snapshot of the whole crate with one run per populated slot.
+// Run iRun covers the channels chStarts[iRun] ... chStops[iRun] - 1 of slot Slots[iRun].
+// The values are written to buffers provided by the caller, with nPar rows of nValues values each,
+// where nValues is the total number of channels of all runs, and the runs are stored one after another.
+// As in HVGetChParams, row iPar of fValues is filled for float parameters and row iPar of lValues for integer parameters.
+// RunResults receives the return code of each run; the values of runs that failed are left untouched.
+// If *Abort becomes non-zero while the snapshot is read (set from another thread, e.g. for an emergency switch-off),
+// no further CAEN calls are made and the remaining runs get HIME_ERR_ABORTED.
+// Returns CAENHV_OK or the first error code of any run.
+int HVGetCrateSnapshot(int handle, unsigned short nRuns, unsigned short* Slots, unsigned short* chStarts, unsigned short* chStops, char** ParNames, int* ParTypes, int nPar, float* fValues, uint32_t* lValues, int* RunResults, volatile int* Abort){
 
-	if( noHVPS() ){
-		strcpy(reply, "!!noHVPS");
-		char* buf = strdup(reply);
-		return buf;
+	if( handle < 0 ){
+		return HIME_ERR_NO_HVPS;
 	}
 
-	int i = -1, handle = -1;
-	if( ( i = OneHVPS() ) >= 0 ){
-		handle = System[i].Handle;
-	}
-
-	if(chStop == -1){
-		chStop = chStart + 1;
+	int nValues = 0;
+	unsigned short maxChNum = 0;
+	for(int iRun = 0; iRun < nRuns; iRun++){
+		if( chStops[iRun] > chStarts[iRun] ){
+			unsigned short ChNum = chStops[iRun] - chStarts[iRun];
+			nValues += ChNum;
+			if( ChNum > maxChNum ) maxChNum = ChNum;
+		}
 	}
-
-	unsigned short ChNum = chStop - chStart;
-	unsigned short* ChList;
-	ChList = malloc(ChNum * sizeof(unsigned short));
-	
-	for(int ch = chStart; ch < chStop; ch++){
-		ChList[ch - chStart] = ch;
+	if( nValues == 0 || nPar <= 0 ){
+		return CAENHV_OK;
 	}
 
-	// Get fParValList or lParValList
-	float			*fParValList = NULL;
-	unsigned long	type, *lParValList = NULL;
+	unsigned short* ChList = malloc(maxChNum * sizeof(unsigned short));
+	// CAENHV_GetChParam writes unsigned longs for integer parameters
+	unsigned long* lParValList = malloc(maxChNum * sizeof(unsigned long));
 
-	CAENHVRESULT ret = CAENHV_GetChParamProp(handle, Slot, ChList[0], ParName, "Type", &type);
-	if( ret != CAENHV_OK ){
-		if(ChList != NULL) free(ChList);
-		return freeListsAndThrowError(ret, type, fParValList, lParValList);
+	CAENHVRESULT firstError = CAENHV_OK;
+	int offset = 0;
+	for(int iRun = 0; iRun < nRuns; iRun++){
+		RunResults[iRun] = CAENHV_OK;
+		if( chStops[iRun] <= chStarts[iRun] ){
+			continue;
+		}
+		unsigned short ChNum = chStops[iRun] - chStarts[iRun];
+		for(int iCh = 0; iCh < ChNum; iCh++){
+			ChList[iCh] = chStarts[iRun] + iCh;
+		}
+		for(int iPar = 0; iPar < nPar; iPar++){
+			CAENHVRESULT ret;
+			if( Abort && *Abort ){
+				ret = HIME_ERR_ABORTED;
+			}
+			else if( ParTypes[iPar] == PARAM_TYPE_NUMERIC ){
+				ret = CAENHV_GetChParam(handle, Slots[iRun], ParNames[iPar], ChNum, ChList, fValues + iPar * nValues + offset);
+			}
+			else{
+				ret = CAENHV_GetChParam(handle, Slots[iRun], ParNames[iPar], ChNum, ChList, lParValList);
+				if( ret == CAENHV_OK ){
+					for(int iCh = 0; iCh < ChNum; iCh++){
+						lValues[iPar * nValues + offset + iCh] = (uint32_t)lParValList[iCh];
+					}
+				}
+			}
+			#ifdef HIMEDEBUG
+			printf("[C] HVGetCrateSnapshot:    handle = %d    slot = %d    parameter = %s    return = %d\n", handle, Slots[iRun], ParNames[iPar], ret);
+			#endif
+			if( ret != CAENHV_OK ){
+				RunResults[iRun] = ret;
+				if( firstError == CAENHV_OK ) firstError = ret;
+				break;
+			}
+		}
+		offset += ChNum;
 	}
 
-	/*
-		TODO:
+	free(ChList);
+	free(lParValList);
+	return firstError;
+}
 
-		The variable "type" is not set correctly set by CAENHV_GetChParamProp...
-		It looks like empty memory is read...
 
-		This function can access HV paramters of type float or long,
-		and you have to make sure to use fParValList in the former case
-		and lParValList in the latter.
-	*/
-	if(iType == 0){
-		type = PARAM_TYPE_NUMERIC;
-	}
-	else{
-		type = PARAM_TYPE_ONOFF;
-	}
-	
-	if( type == PARAM_TYPE_NUMERIC ){
-		fParValList = malloc(ChNum*sizeof(float));
-		ret = CAENHV_GetChParam(handle, Slot, ParName, ChNum, ChList, fParValList);
-	}
-	else{
-	//	if( type == PARAM_TYPE_ONOFF ){
-	//		lParValList = malloc(ChNum*sizeof(uint));
-	//		ret = CAENHV_GetChParam(handle, Slot, ParName, ChNum, ChList, lParValList);
-	//	}
-	//	else{
-			lParValList = malloc(ChNum*sizeof(long));
-			ret = CAENHV_GetChParam(handle, Slot, ParName, ChNum, ChList, lParValList);
-	//	}
-	}
 
-	// check & debug
-	//printf("ChNum = %d\n", ChNum);
-	//printf("handle = %d\n", handle);
-	//printf("slot = %d\n", Slot);
-	//printf("ParName = %s\n", ParName);
-	//for(int i = 0; i < chStop - chStart; i++){
-	//	printf("chlist[i] = %d\n", ChList[i]);
-	//}
-	//printf("type = %ld\n", type);
-
-	// Use the above lists to get channel parameters
-	if( ret != CAENHV_OK ){
-		if(ChList != NULL) free(ChList);
-		return freeListsAndThrowError(ret, type, fParValList, lParValList);
+// Get the properties of several parameters of one channel with one call from Python.
+// The properties are the same for all channels of a board, so they are read once per board model
+// and cached in Python (see ParameterProperties.py).
+// For each parameter iPar, Types[iPar] and Modes[iPar] are always read;
+// MinVals, MaxVals, Units, Exps and Decimals only for numeric parameters (PARAM_TYPE_NUMERIC).
+// Decimals[iPar] (the number of decimal places, i.e. the resolution) is not provided by all boards;
+// it is left at -1 if it can't be read.
+// ParResults receives the return code of each parameter.
+// Returns CAENHV_OK or the first error code of any parameter.
+int HVGetChParamProps(int handle, unsigned short Slot, unsigned short Ch, char** ParNames, int nPar, unsigned long* Types, unsigned long* Modes, float* MinVals, float* MaxVals, unsigned short* Units, short* Exps, short* Decimals, int* ParResults){
+
+	if( handle < 0 ){
+		return HIME_ERR_NO_HVPS;
 	}
 
-	//puts("*** CH PARAM ***");
-	//if( type != PARAM_TYPE_NUMERIC){
-	//	for( i = 0; i < chStop - chStart; i++ ){
-	//		printf("\nSlot: %2d  Ch: %3d  %s: %lx ", Slot, ChList[i], ParName, lParValList[i]); 
-	//	}
-	//}
-
-	for(int iCh = 0; iCh < chStop - chStart; iCh++){
-		char tmp[16] = "";
-		if( type == PARAM_TYPE_NUMERIC ){
-			sprintf(tmp, "%f", fParValList[iCh]);
+	CAENHVRESULT firstError = CAENHV_OK;
+	for(int iPar = 0; iPar < nPar; iPar++){
+		Decimals[iPar] = -1;
+		CAENHVRESULT ret = CAENHV_GetChParamProp(handle, Slot, Ch, ParNames[iPar], "Type", &Types[iPar]);
+		if( ret == CAENHV_OK ){
+			ret = CAENHV_GetChParamProp(handle, Slot, Ch, ParNames[iPar], "Mode", &Modes[iPar]);
 		}
-		else{
-			sprintf(tmp, "%ld", lParValList[iCh]);
+		if( ret == CAENHV_OK && Types[iPar] == PARAM_TYPE_NUMERIC ){
+			ret = CAENHV_GetChParamProp(handle, Slot, Ch, ParNames[iPar], "Minval", &MinVals[iPar]);
+			if( ret == CAENHV_OK ){
+				ret = CAENHV_GetChParamProp(handle, Slot, Ch, ParNames[iPar], "Maxval", &MaxVals[iPar]);
+			}
+			if( ret == CAENHV_OK ){
+				ret = CAENHV_GetChParamProp(handle, Slot, Ch, ParNames[iPar], "Unit", &Units[iPar]);
+			}
+			if( ret == CAENHV_OK ){
+				ret = CAENHV_GetChParamProp(handle, Slot, Ch, ParNames[iPar], "Exp", &Exps[iPar]);
+			}
+			if( ret == CAENHV_OK ){
+				unsigned short decimal;
+				if( CAENHV_GetChParamProp(handle, Slot, Ch, ParNames[iPar], "Decimal", &decimal) == CAENHV_OK ){
+					Decimals[iPar] = (short)decimal;
+				}
+			}
 		}
-		if( iCh < chStop - chStart - 1 ){
-			strcat(tmp, ",");
+		#ifdef HIMEDEBUG
+		printf("[C] HVGetChParamProps:    handle = %d    slot = %d    parameter = %s    return = %d\n", handle, Slot, ParNames[iPar], ret);
+		#endif
+		ParResults[iPar] = ret;
+		if( ret != CAENHV_OK && firstError == CAENHV_OK ){
+			firstError = ret;
 		}
-		strcat(reply, tmp);
 	}
-	//puts("*** CH PARAM ***");
-	//puts(reply);
-	//puts("*** CH PARAM END ***");
-
-
-	if(ChList != NULL) free(ChList);
-	freeLists(type, fParValList, lParValList);
-	char* buf = strdup(reply);
-	return buf;
+	return firstError;
 }
 
 
 
-const char* HVSetChParam(unsigned short Slot, unsigned short chStart, unsigned short chStop, char* ParName, float value_float, int value_int, unsigned long type_par){
+// Set a parameter for the channels chStart ... chStop - 1 of a slot.
+// type_par is 0 for numeric parameters (value_float is sent) and 1 otherwise (value_int is sent).
+// The type is taken from the parameter properties cached in Python,
+// so no CAENHV_GetChParamProp round trip is needed here.
+// Returns CAENHV_OK or an error code
+int HVSetChParam(int handle, unsigned short Slot, unsigned short chStart, unsigned short chStop, char* ParName, float value_float, int value_int, unsigned long type_par){
 
-	char reply[20] = "";
-
-	if( noHVPS() ){
-		strcpy(reply, "!!noHVPS");
-		char* buf = strdup(reply);
-		return buf;
+	if( handle < 0 ){
+		return HIME_ERR_NO_HVPS;
 	}
 
-	int i;
-	int handle = -1;
-	if( ( i = OneHVPS() ) >= 0 )
-		handle = System[i].Handle;
-
+	if( chStop <= chStart ){
+		return CAENHV_OK;
+	}
 	unsigned short ChNum = chStop - chStart;
 
 	unsigned short* ChList = malloc(ChNum * sizeof(unsigned short));
@@ -385,32 +358,15 @@ const char* HVSetChParam(unsigned short Slot, unsigned short chStart, unsigned s
 		ChList[i] = (unsigned short)i + chStart;
 	}	 
 
-	unsigned long type;
-
-	CAENHVRESULT ret = CAENHV_GetChParamProp(handle, Slot, ChList[0], ParName, "Type", &type);
-	
-	if( ret != CAENHV_OK ){
-		if(ChList != NULL) free(ChList);
-		return throwError(ret);
-	}
-	
-	/*
-		See TODO in HVGetChParam
-	*/
-	//if( type == PARAM_TYPE_NUMERIC ){
-	if( type_par == 0){
+	CAENHVRESULT ret;
+	if( type_par == PARAM_TYPE_NUMERIC ){
 		ret = CAENHV_SetChParam(handle, Slot, ParName, ChNum, ChList, &value_float);
 	}
 	else{
 		ret = CAENHV_SetChParam(handle, Slot, ParName, ChNum, ChList, &value_int);
 	}
 
-	if(ChList != NULL) free(ChList);
-
-	if( ret != CAENHV_OK ){
-		return throwError(ret);
-	}
+	free(ChList);
 
-	char* buf = strdup(reply);
-	return buf;
-}
\ No newline at end of file
+	return ret;
+}
@@ -1,8 +1,7 @@
-#define MAX_HVPS (5)
-
-typedef struct sys{
-	int Handle;
-	int ID;
-} HV;
-
-extern HV System[];
+// Error codes of the HV wrapper itself.
+// They are negative, so they can't be confused with the error codes of the CAEN library.
+#define HIME_ERR_NO_HVPS				(-1)
+#define HIME_ERR_NULL_LIST				(-2)
+#define HIME_ERR_BUFFER_TOO_SMALL		(-3)
+// -4 is used in Python for values that are rejected before calling the wrapper
+#define HIME_ERR_ABORTED				(-5)
@@ -0,0 +1,190 @@
+import os
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+
+# Vectorized, cached reading of the CSV files of the HV control
+# (channel mapping, see ChannelMap.py, and voltages, see Voltages.py).
+#
+# A file is described by a list of Columns. All rows are converted and validated at once with pandas/NumPy;
+# rows with an invalid entry are left out, with a warning naming the line of the file.
+# Empty lines and lines starting with "#" are ignored; entries after the last column are ignored.
+#
+# Parsed tables are cached
+#  - in memory, by path, modification time and size of the file, so a rerun of a page doesn't even read the file,
+#  - on disk in CACHE_DIRECTORY (one .npz file per CSV file and list of columns), together with the SHA-256 of the file,
+#    so after a restart or after the modification time changed, the file is only read and hashed, but not parsed again.
+
+CACHE_DIRECTORY = "csvCache"
+# increase if the layout of the cache files changes
+CACHE_FORMAT = 1
+
+
+
+class Column:
+	# kind: int or float
+	# minVal <= value < maxVal; None for no limit
+	def __init__(self, name: str, description: str, kind, minVal = None, maxVal = None) -> None:
+		self.name = name
+		self.description = description
+		self.kind = kind
+		self.minVal = minVal
+		self.maxVal = maxVal
+
+	def __repr__(self) -> str:
+		return self.name + ":" + self.kind.__name__ + ":" + str(self.minVal) + ":" + str(self.maxVal)
+
+	# allowed values, for warnings
+	def rangeString(self) -> str:
+		if self.minVal == None and self.maxVal == None:
+			return ""
+		if self.kind == int and self.minVal != None and self.maxVal != None:
+			return " (allowed: " + str(self.minVal) + " - " + str(self.maxVal - 1) + ")"
+		if self.maxVal == None:
+			return " (allowed: >= " + str(self.minVal) + ")"
+		if self.minVal == None:
+			return " (allowed: < " + str(self.maxVal) + ")"
+		return " (allowed: " + str(self.minVal) + " - " + str(self.maxVal) + ")"
+
+
+
+class CSVTable:
+	def __init__(self, columns) -> None:
+		# column name -> NumPy array with the values of all valid rows
+		self.values = {column.name: np.zeros(0, dtype = column.kind) for column in columns}
+		# line number (starting at 1) of each valid row
+		self.lines = np.zeros(0, dtype = int)
+		# SHA-256 of the file
+		self.digest = ""
+		# e.g. "Line 7: invalid slot number \"x\" (allowed: 0 - 15)! Line is ignored."
+		self.warnings = []
+		# e.g. the file doesn't exist; then the table is empty
+		self.errors = []
+
+	def __len__(self) -> int:
+		return len(self.lines)
+
+	def __getitem__(self, name: str):
+		return self.values[name]
+
+
+
+# (path, columns) -> [modification time, size, CSVTable]
+memoryCache = {}
+memoryCacheLock = threading.Lock()
+
+
+
+# Read the CSV file at path with the given columns.
+# The returned table is shared between all callers; don't modify it.
+def load(path: str, columns) -> CSVTable:
+	key = (os.path.abspath(path), repr(columns))
+	try:
+		status = os.stat(path)
+		with memoryCacheLock:
+			cached = memoryCache.get(key)
+		if cached != None and cached[0] == status.st_mtime_ns and cached[1] == status.st_size:
+			return cached[2]
+		with open(path, "rb") as csvFile:
+			content = csvFile.read()
+	except OSError:
+		table = CSVTable(columns)
+		table.errors.append("File \"" + path + "\" not found!")
+		return table
+
+	digest = hashlib.sha256(content).hexdigest()
+	cachePath = os.path.join(CACHE_DIRECTORY, hashlib.sha1("|".join(key).encode()).hexdigest()[:24] + ".npz")
+	table = readCache(cachePath, digest, columns)
+	if table == None:
+		table = parse(content.decode("utf-8", errors = "replace"), columns)
+		table.digest = digest
+		writeCache(cachePath, table, columns)
+	with memoryCacheLock:
+		memoryCache[key] = [status.st_mtime_ns, status.st_size, table]
+	return table
+
+
+
+# Parse the content of a CSV file
+def parse(text: str, columns) -> CSVTable:
+	table = CSVTable(columns)
+	lines = pd.Series(text.splitlines(), dtype = object)
+	stripped = lines.str.strip()
+	rows = stripped[(stripped.str.len() > 0) & ~stripped.str.startswith("#")]
+	lineNumbers = rows.index.to_numpy() + 1
+	nRows = len(rows)
+
+	fields = rows.str.split(",", expand = True) if nRows > 0 else pd.DataFrame(index = rows.index)
+	fields = fields.reindex(columns = range(0, len(columns)))
+	# bad[i, k]: entry k of row i is missing, can't be converted or is out of range
+	bad = np.zeros((nRows, len(columns)), dtype = bool)
+	for k, column in enumerate(columns):
+		entries = fields[k].fillna("").astype(str).str.strip()
+		if column.kind == int:
+			ok = entries.str.fullmatch(r"[+-]?\d+").to_numpy(dtype = bool, copy = True)
+			values = pd.to_numeric(entries.where(ok, "0")).to_numpy(dtype = int)
+		else:
+			values = pd.to_numeric(entries, errors = "coerce").to_numpy(dtype = float)
+			ok = np.isfinite(values)
+		if column.minVal != None:
+			ok &= values >= column.minVal
+		if column.maxVal != None:
+			ok &= values < column.maxVal
+		bad[:, k] = ~ok
+		table.values[column.name] = values
+
+	noComma = ~rows.str.contains(",", regex = False).to_numpy(dtype = bool)
+	invalid = noComma | bad.any(axis = 1)
+	firstBad = bad.argmax(axis = 1)
+	for i in np.flatnonzero(invalid):
+		if noComma[i]:
+			table.warnings.append("Line " + str(lineNumbers[i]) + ": comma not found in \"" + rows.iloc[i] + "\"! Line is ignored.")
+			continue
+		column = columns[firstBad[i]]
+		entry = fields.iloc[i, firstBad[i]]
+		table.warnings.append("Line " + str(lineNumbers[i]) + ": invalid " + column.description + " \"" + ("" if entry is None or entry != entry else str(entry).strip()) + "\"" + column.rangeString() + "! Line is ignored.")
+
+	valid = ~invalid
+	table.values = {name: values[valid] for name, values in table.values.items()}
+	table.lines = lineNumbers[valid]
+	return table
+
+
+
+# Returns the cached table, or None if there is no cache file for this content
+def readCache(cachePath: str, digest: str, columns):
+	try:
+		with np.load(cachePath, allow_pickle = False) as cache:
+			if int(cache["format"]) != CACHE_FORMAT or str(cache["digest"]) != digest:
+				return None
+			table = CSVTable(columns)
+			table.digest = digest
+			table.lines = cache["lines"]
+			table.warnings = cache["warnings"].tolist()
+			table.values = {column.name: cache["column_" + column.name] for column in columns}
+			return table
+	except (OSError, KeyError, ValueError):
+		return None
+
+
+
+# The cache is only an optimization: if it can't be written, the file is parsed again next time.
+def writeCache(cachePath: str, table: CSVTable, columns) -> None:
+	arrays = {"column_" + column.name: table.values[column.name] for column in columns}
+	temporaryPath = cachePath[:-4] + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp.npz"
+	try:
+		os.makedirs(CACHE_DIRECTORY, exist_ok = True)
+		np.savez(temporaryPath,
+			format = np.array(CACHE_FORMAT),
+			digest = np.array(table.digest),
+			lines = table.lines,
+			warnings = np.array(table.warnings, dtype = str),
+			**arrays
+		)
+		os.replace(temporaryPath, cachePath)
+	except OSError:
+		try:
+			os.remove(temporaryPath)
+		except OSError:
+			pass
@@ -1,154 +1,254 @@
 import ctypes as ct
-
+import threading
+import numpy as np
+import pages.backend.hv.Connection as Connection
+
+# Error codes of HVWrapper.c itself (see HVWrapper.h).
+# All other non-zero return codes are error codes of the CAEN library.
+ERROR_NO_HVPS = -1
+ERROR_NULL_LIST = -2
+ERROR_BUFFER_TOO_SMALL = -3
+# Error code for values rejected before calling the HV wrapper (see HVSupply.setChParameter())
+ERROR_INVALID_VALUE = -4
+ERROR_ABORTED = -5
+
+# size of the buffer for the crate map, in bytes
+CRATE_MAP_SIZE = 10000
+
+# The HV wrapper library is loaded only once and shared by all crates;
+# each crate is addressed by its own handle.
+libHVWrapper = None
+
+def loadLibrary():
+	global libHVWrapper
+	if libHVWrapper == None:
+		libHVWrapper = ct.CDLL("pages/backend/hv/CAENHVWrapper-6.3/himeHV/libHVWrapper.so")
+	return libHVWrapper
+
+
+
+# Access to one HV crate.
+#
+# ctypes releases the GIL while a function of the HV wrapper is running,
+# so different crates can be accessed from different threads at the same time.
+# Calls for the same crate are serialized by self.lock.
 class CWrapper:
-	def __init__(self, ip: str) -> None:
-		ct.cdll.LoadLibrary("libHVWrapper.so")
-		self.libHVWrapper = ct.CDLL("pages/backend/hv/CAENHVWrapper-6.3/himeHV/libHVWrapper.so" + ip)
-
-		self.libHVWrapper.initSystem.argtypes = [ct.c_int]
-		self.libHVWrapper.initSystem.restype = ct.c_void_p 
-		self.libHVWrapper.initSystem(0)
-
-		# ---- Concerning the c_void return type ----
-		# c_char_p would lead to automatic conversion to python byte_string,
-		# which we don't want, so we can still apply free() on the pointer.
-		# Therefore, choose restype = c_void when a char[] is returned by 
-		# the HV wrapper
+	def __init__(self) -> None:
+		self.libHVWrapper = loadLibrary()
+		# handle of the crate, obtained at login; -1 if not logged in
+		self.handle = -1
+		self.lock = threading.RLock()
+		# the return code of every call is recorded here, see Connection.py
+		self.connection = Connection.Connection()
+		# Set to 1 to make a snapshot that is being read stop early (see abort() and HVGetCrateSnapshot)
+		self.abortFlag = ct.c_int(0)
+
+		# ---- Concerning the return types ----
+		# All functions of the HV wrapper return 0 (CAENHV_OK) or an error code.
+		# Data is written to buffers provided by Python, so nothing needs to be freed afterwards.
+		# All functions but the login take the handle of the crate as first argument.
 
 		# set up loginFunction
 		self.loginFunction = self.libHVWrapper.HVSystemLogin
-		self.loginFunction.argtypes = [ct.c_char_p, ct.c_char_p, ct.c_char_p]
-		self.loginFunction.restype = ct.c_void_p 
-
-		# set up freeMeFunction
-		self.freeMeFunction = self.libHVWrapper.freeMe
-		self.freeMeFunction.argtypes = [ct.c_void_p]
-		self.freeMeFunction.restype = None
+		self.loginFunction.argtypes = [ct.c_char_p, ct.c_char_p, ct.c_char_p, ct.POINTER(ct.c_int)]
+		self.loginFunction.restype = ct.c_int
 
 		# set up logoutFunction
 		self.logoutFunction = self.libHVWrapper.HVSystemLogout
-		self.logoutFunction.argtypes = []
+		self.logoutFunction.argtypes = [ct.c_int]
+		self.logoutFunction.restype = ct.c_int
 
-		self.logoutFunction.restype = ct.c_void_p 
+		# set up probeFunction
+		self.probeFunction = self.libHVWrapper.HVProbe
+		self.probeFunction.argtypes = [ct.c_int]
+		self.probeFunction.restype = ct.c_int
 
 		# set up getCrateMapFunction
 		self.getCrateMapFunction = self.libHVWrapper.HVGetCrateMap
-		self.getCrateMapFunction.argtypes = []
-		self.getCrateMapFunction.restype = ct.c_void_p
-
-		# set up getChParamFunction
-		self.getChParamFunction = self.libHVWrapper.HVGetChParam
-		self.getChParamFunction.argtypes = [ct.c_ushort, ct.c_ushort, ct.c_ushort, ct.c_char_p, ct.c_ushort]
-		self.getChParamFunction.restype = ct.c_void_p 
-
-		# set up setChParamFunction
-		self.setChParamFunction = self.libHVWrapper.HVSetChParam
-		self.setChParamFunction.argtypes = [ct.c_ushort, ct.c_ushort, ct.c_ushort, ct.c_char_p, ct.c_float, ct.c_int, ct.c_ulong]
-		self.setChParamFunction.restype = ct.c_void_p 
-
-
-
-	def forceInitSystem(self) -> None:
-		self.libHVWrapper.initSystem(1)
-
-
+		self.getCrateMapFunction.argtypes = [ct.c_int, ct.c_char_p, ct.c_int]
+		self.getCrateMapFunction.restype = ct.c_int
 
-	# convert a single line of comma-separated values to an array of float or string values
-	def csvLineToArr(self, csvstr: str, asStr: bool = False):
-		# remove all whitespaces: newline, space, tab, ...
-		csvstr = "".join(csvstr.split())
+		# set up getChParamsFunction
+		self.getChParamsFunction = self.libHVWrapper.HVGetChParams
+		self.getChParamsFunction.argtypes = [ct.c_int, ct.c_ushort, ct.c_ushort, ct.c_ushort, ct.POINTER(ct.c_char_p), ct.POINTER(ct.c_int), ct.c_int, ct.POINTER(ct.c_float), ct.POINTER(ct.c_uint32)]
+		self.getChParamsFunction.restype = ct.c_int
 
-		positions = [-1]
-		for i in range(0, len(csvstr)):
-			if csvstr[i] == ",":
-				positions.append(i)
-		positions.append(len(csvstr))
+		# set up getCrateSnapshotFunction
+		self.getCrateSnapshotFunction = self.libHVWrapper.HVGetCrateSnapshot
+		self.getCrateSnapshotFunction.argtypes = [ct.c_int, ct.c_ushort, ct.POINTER(ct.c_ushort), ct.POINTER(ct.c_ushort), ct.POINTER(ct.c_ushort), ct.POINTER(ct.c_char_p), ct.POINTER(ct.c_int), ct.c_int, ct.POINTER(ct.c_float), ct.POINTER(ct.c_uint32), ct.POINTER(ct.c_int), ct.POINTER(ct.c_int)]
+		self.getCrateSnapshotFunction.restype = ct.c_int
 
-		data = []
-		for i in range(0, len(positions) - 1):
-			pos0 = positions[i] + 1
-			pos1 = positions[i+1]
-			if pos1 - pos0 < 1:
-				entry = None
-			else:
-				if asStr:
-					entry = csvstr[pos0:pos1]
-				else:
-					try:
-						entry = float(csvstr[pos0:pos1])
-					# A value error will be raised when HVWrapper.c sends an error message,
-					# for instance due to timeout.
-					except ValueError:
-						entry = csvstr[pos0:pos1]
-			data.append(entry)
+		# set up getChParamPropsFunction
+		self.getChParamPropsFunction = self.libHVWrapper.HVGetChParamProps
+		self.getChParamPropsFunction.argtypes = [ct.c_int, ct.c_ushort, ct.c_ushort, ct.POINTER(ct.c_char_p), ct.c_int, ct.POINTER(ct.c_ulong), ct.POINTER(ct.c_ulong), ct.POINTER(ct.c_float), ct.POINTER(ct.c_float), ct.POINTER(ct.c_ushort), ct.POINTER(ct.c_short), ct.POINTER(ct.c_short), ct.POINTER(ct.c_int)]
+		self.getChParamPropsFunction.restype = ct.c_int
 
-		return data
+		# set up setChParamFunction
+		self.setChParamFunction = self.libHVWrapper.HVSetChParam
+		self.setChParamFunction.argtypes = [ct.c_int, ct.c_ushort, ct.c_ushort, ct.c_ushort, ct.c_char_p, ct.c_float, ct.c_int, ct.c_ulong]
+		self.setChParamFunction.restype = ct.c_int
 
 
 
-	# The parameter type tells the HV wrapper which type of return value it should expect from the HV.
-	# See HVWrapper.c.
-	def getChParamBase(self, parameterName: str, slot: int, channelStart: int, channelStop: int  = -1, type: int = 0) -> str:
+	# Get several parameters for a range of channels with a single call of the HV wrapper.
+	# types: 0 for float parameters, 1 for integer parameters (see ParameterProperties.py)
+	# The HV wrapper writes the values directly into NumPy arrays.
+	# Returns [return code, {parameter name: NumPy array of values}];
+	# the dictionary is empty unless the return code is 0.
+	def getChParams(self, parameterNames, types, slot: int, channelStart: int, channelStop: int = -1):
 		if channelStop == -1:
 			channelStop = channelStart + 1
-		ptr = self.getChParamFunction(slot, channelStart, channelStop, parameterName.encode("utf-8"), type)
-		bytes = ct.cast(ptr, ct.c_char_p).value
-		self.freeMeFunction(ptr)
-		reply = bytes.decode("utf-8")
-		return reply
-
-
+		nPar = len(parameterNames)
+		nCh = channelStop - channelStart
+		names = (ct.c_char_p * nPar)(*[name.encode("utf-8") for name in parameterNames])
+		typeArray = (ct.c_int * nPar)(*types)
+		# one row per parameter; only the row of the matching type is filled
+		fValues = np.empty((nPar, nCh), dtype = np.float32)
+		lValues = np.empty((nPar, nCh), dtype = np.uint32)
+		with self.lock:
+			ret = self.getChParamsFunction(self.handle, slot, channelStart, channelStop, names, typeArray, nPar,
+				fValues.ctypes.data_as(ct.POINTER(ct.c_float)), lValues.ctypes.data_as(ct.POINTER(ct.c_uint32)))
+		self.connection.record(ret)
+		if ret != 0:
+			return [ret, {}]
+		data = {}
+		for i in range(0, nPar):
+			data[parameterNames[i]] = fValues[i] if types[i] == 0 else lValues[i]
+		return [ret, data]
+
+
+
+	# Get several parameters for several ranges of channels ("runs") with a single call of the HV wrapper.
+	# runs: list of [slot, chStart, chStop]
+	# Returns [return code, {parameter name: NumPy array of values}, NumPy array with the return code of each run].
+	# Runs that were not read because of abort() have the return code ERROR_ABORTED.
+	# The values of all runs are stored one after another;
+	# float values of runs that failed are NaN, integer values 0.
+	def getCrateSnapshot(self, parameterNames, types, runs):
+		nPar = len(parameterNames)
+		nRuns = len(runs)
+		nValues = 0
+		for slot, chStart, chStop in runs:
+			nValues += max(chStop - chStart, 0)
+		names = (ct.c_char_p * nPar)(*[name.encode("utf-8") for name in parameterNames])
+		typeArray = (ct.c_int * nPar)(*types)
+		slots = (ct.c_ushort * nRuns)(*[run[0] for run in runs])
+		chStarts = (ct.c_ushort * nRuns)(*[run[1] for run in runs])
+		chStops = (ct.c_ushort * nRuns)(*[run[2] for run in runs])
+		fValues = np.full((nPar, nValues), np.nan, dtype = np.float32)
+		lValues = np.zeros((nPar, nValues), dtype = np.uint32)
+		runResults = np.zeros(nRuns, dtype = np.intc)
+		with self.lock:
+			ret = self.getCrateSnapshotFunction(self.handle, nRuns, slots, chStarts, chStops, names, typeArray, nPar,
+				fValues.ctypes.data_as(ct.POINTER(ct.c_float)), lValues.ctypes.data_as(ct.POINTER(ct.c_uint32)), runResults.ctypes.data_as(ct.POINTER(ct.c_int)), ct.byref(self.abortFlag))
+		# if any run could be read, the crate has replied
+		self.connection.record(0 if np.any(runResults == 0) else ret)
+		data = {}
+		for i in range(0, nPar):
+			data[parameterNames[i]] = fValues[i] if types[i] == 0 else lValues[i]
+		return [ret, data, runResults]
+
+
+
+	# Get the properties of several parameters of one channel with a single call of the HV wrapper.
+	# Returns [return code, {parameter name: [return code, type, mode, min, max, unit, exp, decimals]}];
+	# parameters that could not be read have a non-zero return code.
+	def getChParamProps(self, parameterNames, slot: int, channel: int = 0):
+		nPar = len(parameterNames)
+		names = (ct.c_char_p * nPar)(*[name.encode("utf-8") for name in parameterNames])
+		types = (ct.c_ulong * nPar)()
+		modes = (ct.c_ulong * nPar)()
+		minVals = (ct.c_float * nPar)()
+		maxVals = (ct.c_float * nPar)()
+		units = (ct.c_ushort * nPar)()
+		exps = (ct.c_short * nPar)()
+		decimals = (ct.c_short * nPar)()
+		parResults = (ct.c_int * nPar)()
+		with self.lock:
+			ret = self.getChParamPropsFunction(self.handle, slot, channel, names, nPar, types, modes, minVals, maxVals, units, exps, decimals, parResults)
+		self.connection.record(ret)
+		data = {}
+		for i in range(0, nPar):
+			data[parameterNames[i]] = [parResults[i], types[i], modes[i], minVals[i], maxVals[i], units[i], exps[i], decimals[i]]
+		return [ret, data]
+
+
+
+	# get an array of values of one parameter for a range of channels
+	def getChParam(self, parameterName: str, slot: int, channelStart: int, channelStop: int  = -1, type: int = 0):
+		ret, data = self.getChParams([parameterName,], [type,], slot, channelStart, channelStop)
+		return [ret, data.get(parameterName)]
 
-	# get an array of voltages or currents for a range of channels
-	def getChParam(self, parameterName: str, slot: int, channelStart: int, channelStop: int  = -1):
-		reply = self.getChParamBase(parameterName, slot, channelStart, channelStop)
-		return self.csvLineToArr(reply)
-	
 
 
 	# set voltage or current for an individual channel
-	def setChParam_single(self, parameterName: str, slot: int, channel: int, value_float: float, value_int: int, useInt: bool) -> str:
+	def setChParam_single(self, parameterName: str, slot: int, channel: int, value_float: float, value_int: int, useInt: bool) -> int:
 		return self.setChParam_multiple(parameterName, slot, channel, channel+1, value_float, value_int, useInt)
 
 
 
 	# set voltage or current for multiple channels of the same slot
-	def setChParam_multiple(self, parameterName: str, slot: int, chStart: int, chStop: int, value_float: float, value_int: int, useInt: bool) -> str:
+	def setChParam_multiple(self, parameterName: str, slot: int, chStart: int, chStop: int, value_float: float, value_int: int, useInt: bool) -> int:
 		if chStop == -1:
 			chStop = chStart + 1
-		ptr = self.setChParamFunction (slot, chStart, chStop, parameterName.encode("utf-8"), value_float, value_int, useInt)
-		bytes = ct.cast(ptr, ct.c_char_p).value
-		self.freeMeFunction(ptr)
-		return bytes.decode("utf-8")
-	
+		with self.lock:
+			ret = self.setChParamFunction(self.handle, slot, chStart, chStop, parameterName.encode("utf-8"), value_float, value_int, useInt)
+		self.connection.record(ret)
+		return ret
 
 
-	# HV supply login
-	def login(self, user, pw, ip) -> str:
-		ptr = self.loginFunction(user, pw, ip)
-		bytes = ct.cast(ptr, ct.c_char_p).value
-		self.freeMeFunction(ptr)
-		reply = bytes.decode("utf-8")
-		reply = reply.replace("\n", "")
-		return reply
-	
+
+	# HV supply login; on success, the handle of the crate is stored in self.handle
+	def login(self, user, pw, ip) -> int:
+		handle = ct.c_int(-1)
+		with self.lock:
+			ret = self.loginFunction(user, pw, ip, ct.byref(handle))
+			if ret == 0:
+				self.handle = handle.value
+			self.connection.recordLogin(ret)
+		return ret
+
 
 
 	# HV supply logout
-	def logout(self) -> str:
-		ptr = self.logoutFunction()
-		bytes = ct.cast(ptr, ct.c_char_p).value
-		self.freeMeFunction(ptr)
-		reply = bytes.decode("utf-8")
-		reply = reply.replace("\n", "")
-		return reply
+	def logout(self) -> int:
+		with self.lock:
+			ret = self.logoutFunction(self.handle)
+			self.handle = -1
+			self.connection.recordLogout()
+		return ret
 
 
 
 	# get a list of all HV modules and their number of channels
-	def getCrateMap(self) -> str:
-		ptr = self.getCrateMapFunction()
-		bytes = ct.cast(ptr, ct.c_char_p).value
-		self.freeMeFunction(ptr)
-		reply = bytes.decode("utf-8")
-		return reply
+	# Returns [return code, crate map]
+	def getCrateMap(self):
+		buffer = ct.create_string_buffer(CRATE_MAP_SIZE)
+		with self.lock:
+			ret = self.getCrateMapFunction(self.handle, buffer, CRATE_MAP_SIZE)
+		self.connection.record(ret)
+		return [ret, buffer.value.decode("utf-8")]
+
+
+
+	# Cheap check whether the crate still answers.
+	# Returns 0 if it does, otherwise the error code (see Connection.TIMEOUT_CODES).
+	# Any other reply (e.g. if a crate doesn't know the probed property) shows the crate is there.
+	def probe(self) -> int:
+		with self.lock:
+			ret = self.probeFunction(self.handle)
+		if ret != ERROR_NO_HVPS and ret not in Connection.TIMEOUT_CODES:
+			ret = 0
+		self.connection.record(ret)
+		return ret
+
+
+
+	# Take over the crate as fast as possible, e.g. for an emergency switch-off:
+	# a snapshot that is being read stops before its next call of the CAEN library and releases self.lock.
+	# Snapshots started before resume() are skipped as well.
+	def abort(self) -> None:
+		self.abortFlag.value = 1
+
+	def resume(self) -> None:
+		self.abortFlag.value = 0
@@ -0,0 +1,65 @@
+import streamlit as st
+import pages.backend.hv.HVList as HVList
+import pages.backend.hv.Commands as Commands
+import pages.backend.hv.Selection as Selection
+
+# Switch on/off or set the voltage of any group of HIME channels,
+# given as a selection expression (see Selection.parse()).
+
+# Returns the selection of the expression in st.session_state.group_expression, or None
+def currentSelection():
+	try:
+		return Selection.parse(st.session_state.group_expression)
+	except ValueError as error:
+		st.error("Invalid selection: " + str(error), icon = "❗")
+		return None
+
+def pwOn(selection) -> None:
+	Commands.sendToSelection(
+		"Switch on " + str(selection),
+		selection,
+		lambda hv, slot, chStart, chStop, argument: hv.pwOn_slotAndChannels(slot, chStart, chStop),
+		reason = "Channel group switched on"
+	)
+
+def pwOff(selection) -> None:
+	Commands.sendToSelection(
+		"Switch off " + str(selection),
+		selection,
+		lambda hv, slot, chStart, chStop, argument: hv.pwOff_slotAndChannels(slot, chStart, chStop),
+		reason = "Channel group switched off"
+	)
+
+def setVoltage(selection, voltage) -> None:
+	if voltage != None:
+		Commands.sendToSelection(
+			"Set " + str(voltage) + " V for " + str(selection),
+			selection,
+			lambda hv, slot, chStart, chStop, voltage: hv.setVoltage_slotAndChannels(slot, chStart, chStop, voltage),
+			voltage,
+			reason = "New target voltage for a channel group"
+		)
+
+def show() -> None:
+	st.markdown("Select channels by `layer`, `module`, `fpga`, `dac`, `position` (left/right/top/bottom) or `channel`, \
+		separated by semicolons, e.g. `layer 0; module 3-5; position left` or `channels 0-15, 32`.")
+
+	group_col1, group_col2 = st.columns(2)
+
+	group_col1.text_input("Channel group :dart:", key = "group_expression", placeholder = "fpga 1; dac 0")
+	if st.session_state.group_expression == "":
+		return
+	selection = currentSelection()
+	if selection == None:
+		return
+
+	channelMap = HVList.channelMap
+	nChannels = channelMap.count(selection)
+	nRuns = len(channelMap.plan(selection))
+	group_col1.markdown(str(nChannels) + " mapped channel(s) (" + str(selection) + "), sent as " + str(nRuns) + " command(s).")
+
+	group_col1.button("Switch group on :rocket:", on_click = pwOn, args = (selection,), disabled = (nRuns == 0))
+	group_col1.button("Switch group off :zzz:", on_click = pwOff, args = (selection,), disabled = (nRuns == 0))
+
+	voltage = group_col2.number_input("Set target voltage for this group (V) :level_slider:", value = None, placeholder = "Voltage (V)", min_value = 0, max_value = 1550)
+	group_col2.button("Send target voltage to group :satellite_antenna:", on_click = setVoltage, args = (selection, voltage,), disabled = (voltage == None or nRuns == 0))
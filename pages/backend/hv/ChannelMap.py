@@ -1,8 +1,32 @@
-import pages.backend.hv.CSVHelper as csvh
 import pages.backend.hv.HVList as HVList
 import pages.backend.Messages as Messages
 import numpy as np
 import pages.backend.hv.HIMEConstants as HIMEConstants
+import pages.backend.hv.HVConstants as HVConstants
+import pages.backend.hv.Selection as Selection
+import pages.backend.hv.CSVTable as CSVTable
+import itertools
+
+# Every channel map gets a new version number, so plans compiled from it (see ChannelMap.plan())
+# are never mixed up with plans of a channel map that was read before.
+versionCounter = itertools.count(1)
+# maximum number of compiled plans kept per channel map
+MAX_PLANS = 256
+
+# Columns of the CSV file defining the channel mapping (see CSVTable.py)
+def mappingColumns():
+	return [
+		CSVTable.Column("crate", "crate number", int, 0, len(HVList.hvSupplyList)),
+		CSVTable.Column("slot", "slot number", int, 0, HVConstants.MAX_SLOTS),
+		CSVTable.Column("channel", "channel number", int, 0, HVConstants.MAX_CHANNELS_PER_SLOT),
+		CSVTable.Column("fpga", "FPGA number", int, 0, HIMEConstants.N_FPGAS),
+		CSVTable.Column("dacChain", "DAC-chain number", int, 0, HIMEConstants.N_DACCHAINS),
+		CSVTable.Column("padiwaChannel", "PaDiWa channel", int, 0, HIMEConstants.N_PADIWA_CHANNELS),
+		CSVTable.Column("layer", "HIME layer", int, 0, HIMEConstants.N_LAYERS),
+		CSVTable.Column("module", "HIME-module number", int, 0, HIMEConstants.N_MODULES_PER_LAYER),
+		# 0 -> right/down or 1 -> left/up
+		CSVTable.Column("position", "position", int, 0, 2)
+	]
 
 #TODO
 # warning messages when -1 is returned
@@ -16,163 +40,136 @@ class ChannelMap:
 	# and the number of a channel of that module.
 	def __init__(self, path: str):
 		self.messages = Messages.Messages()
+		self.version = next(versionCounter)
+		# (version, Selection.key()) -> runs, see plan()
+		self.plans = {}
+		# crate -> [version of the crate topology, acquisition plan restricted to the channels of the crate]
+		# see crate_to_acquisitionPlan()
+		self.checkedPlans = {}
 
-		# map the HIME-channel number on an array of the form
-		# [HV crate, HV slot, HV channel]
-		HVList.hvCratesSlotsChannels = [[-1, -1, -1] for i in range(0, HIMEConstants.N_HIME_CHANNELS)]
-		# map a combination of HV crate, HV slot, HV channel
-		# on HIME channel
-		HVList.himeChannels = [
-			[
-				[ 
-					-1 for i in range(0, HVList.hvSupplyList[k].N_CHANNELS_PER_SLOT) 
-				] 
-				for j in range(0, HVList.hvSupplyList[k].N_SLOTS)
-			] 
-			for k in range(0, len(HVList.hvSupplyList)) 
-		]
-		# map HIME layers on a list of
-		# [HV crate, HV Slot, HV chStart, HV chStop] arrays
-		HVList.himeLayers = [[] for k in range(0, HIMEConstants.N_LAYERS)]
-		# hime channel -> FPGA, DAC chain, PaDiWa channel, Layer, module number of that layer 
+		# ---- HIME channel -> properties ----
+		# One NumPy array per property, indexed by the HIME channel; -1 for channels that are not mapped.
+		# HV crate, HV slot, HV channel
+		self.crates = np.full(HIMEConstants.N_HIME_CHANNELS, -1, dtype = int)
+		self.slots = np.full(HIMEConstants.N_HIME_CHANNELS, -1, dtype = int)
+		self.channels = np.full(HIMEConstants.N_HIME_CHANNELS, -1, dtype = int)
+		# FPGA, DAC chain, PaDiWa channel, layer, module number of that layer, position
 		# *** module ID != module number ***
 		# The module ID runs over all modules of HIME and is different
 		# from the module number of a specific layer!
-		HVList.channelDetails = [None for i in range(0, HIMEConstants.N_HIME_CHANNELS)]
-		
-		try:
-			csvFile = open(path, "r")
-		except:
-			self.errors.append("CSV file for channel mapping not found!")
-			return
+		self.fpgas = np.full(HIMEConstants.N_HIME_CHANNELS, -1, dtype = int)
+		self.dacChains = np.full(HIMEConstants.N_HIME_CHANNELS, -1, dtype = int)
+		self.padiwaChannels = np.full(HIMEConstants.N_HIME_CHANNELS, -1, dtype = int)
+		self.layers = np.full(HIMEConstants.N_HIME_CHANNELS, -1, dtype = int)
+		self.modules = np.full(HIMEConstants.N_HIME_CHANNELS, -1, dtype = int)
+		self.positions = np.full(HIMEConstants.N_HIME_CHANNELS, -1, dtype = int)
+		# ---- HV crate, HV slot, HV channel -> HIME channel ----
+		# -1 for HV channels that are not connected to HIME
+		self.himeTable = np.full((len(HVList.hvSupplyList), HVConstants.MAX_SLOTS, HVConstants.MAX_CHANNELS_PER_SLOT), -1, dtype = int)
+		# HIME layer -> list of [HV crate, HV slot, HV chStart, HV chStop], see createMapping_layerToHVChannels()
+		self.layerRuns = [[] for k in range(0, HIMEConstants.N_LAYERS)]
+		# HV crate -> list of [HV slot, chStart, chStop, [HIME channels]], see createAcquisitionPlans()
+		self.acquisitionPlans = [[] for k in range(0, len(HVList.hvSupplyList))]
 		
-		csvList = csvFile.readlines()
-		csvFile.close()
-
-		for line in csvList:
-			if csvh.isComment(line):
-				continue
-			commaPositions = csvh.findPosOfCharInString(",", line)
-			if commaPositions == None:
-				self.messages.newWarning("[ChannelMap] Comma not found in line \"" + line + "\"! Line is ignored.")
-				continue
-			entryCounter = 0
-			# -------- HV crate --------
-			try:
-				crate = int(csvh.getEntry(line, commaPositions, entryCounter))
-			except:
-				self.messages.newWarning("[ChannelMap] Conversion to integer value failed for the crate number in line \"" + str(line) + "\"! Line is ignored.")
-				continue
-			if crate < 0 or crate >= len(HVList.hvSupplyList):
-				self.messages.newWarning("[ChannelMap] Invalid crate number in line \"" + str(line) + "\"! Line is ignored.")
-				continue
-			entryCounter += 1
-			# -------- HV slot --------
-			try:
-				slot = int(csvh.getEntry(line, commaPositions, entryCounter))
-			except:
-				self.messages.newWarning("[ChannelMap] Conversion to integer value failed for the slot number in line \"" + str(line) + "\"! Line is ignored.")
-				continue
-			if slot < 0 or slot >= HVList.hvSupplyList[crate].N_SLOTS:
-				self.messages.newWarning("[ChannelMap] Invalid slot number in line \"" + str(line) + "\"! Line is ignored.")
-				continue
-			entryCounter += 1
-			# -------- HV channel --------
-			try:
-				channel = int(csvh.getEntry(line, commaPositions, entryCounter))
-			except:
-				self.messages.newWarning("[ChannelMap] Conversion to integer value failed for the channel number in line \"" + str(line) + "\"! Line is ignored.")
-				continue
-			if channel < 0 or channel >= HVList.hvSupplyList[crate].N_CHANNELS_PER_SLOT:
-				self.messages.newWarning("[ChannelMap] Invalid channel number in line \"" + str(line) + "\"! Line is ignored.")
-				continue
-			entryCounter += 1
-			# -------- FPGA --------
-			try:
-				fpga = int(csvh.getEntry(line, commaPositions, entryCounter))
-			except:
-				self.messages.newWarning("[ChannelMap] Conversion to int value failed for the FPGA number in line \"" + str(line) + "\"! Line is ignored.")
-				continue
-			if fpga < 0 or fpga >= HIMEConstants.N_FPGAS:
-				self.messages.newWarning("[ChannelMap] Invalid FPGA number in line \"" + str(line) + "\"! Line is ignored.")
-				continue
-			entryCounter += 1
-			# -------- DAC chain --------
-			try:
-				dacChain = int(csvh.getEntry(line, commaPositions, entryCounter))
-			except:
-				self.messages.newWarning("[ChannelMap] Conversion to int value failed for the DAC-chain number in line \"" + str(line) + "\"! Line is ignored.")
-				continue
-			if dacChain < 0 or dacChain >= HIMEConstants.N_DACCHAINS:
-				self.messages.newWarning("[ChannelMap] Invalid DAC-chain number in line \"" + str(line) + "\"! Line is ignored.")
-				continue
-			entryCounter += 1
-			# -------- PaDiWa channel (0 - 16) --------
-			try:
-				padiwaChannel = int(csvh.getEntry(line, commaPositions, entryCounter))
-			except:
-				self.messages.newWarning("[ChannelMap] Conversion to int value failed for the HIME channel in line \"" + str(line) + "\"! Line is ignored.")
-				continue
-			if padiwaChannel < 0 or padiwaChannel >= HIMEConstants.N_PADIWA_CHANNELS:
-				self.messages.newWarning("[ChannelMap] Invalid HIME channel in line \"" + str(line) + "\"! Line is ignored.")
-				continue
-			entryCounter += 1
-			# -------- HIME layer --------
-			try:
-				himeLayer = int(csvh.getEntry(line, commaPositions, entryCounter))
-			except:
-				self.messages.newWarning("[ChannelMap] Conversion to int value failed for the HIME layer in line \"" + str(line) + "\"! Line is ignored.")
-				continue
-			if himeLayer < 0 or himeLayer >= HIMEConstants.N_LAYERS:
-				self.messages.newWarning("[ChannelMap] Invalid HIME layer in line \"" + str(line) + "\"! Line is ignored.")
-				continue
-			entryCounter += 1
-			# -------- HIME module number in this layer --------
-			try:
-				moduleNumber = int(csvh.getEntry(line, commaPositions, entryCounter))
-			except:
-				self.messages.newWarning("[ChannelMap] Conversion to int value failed for the HIME-module number in line \"" + str(line) + "\"! Line is ignored.")
-				continue
-			if moduleNumber < 0 or moduleNumber >= HIMEConstants.N_MODULES_PER_LAYER:
-				self.messages.newWarning("[ChannelMap] Invalid HIME-module number in line \"" + str(line) + "\"! Line is ignored.")
-				continue
-			entryCounter += 1
-			# -------- Position: 0 -> right/down or 1 -> left/up --------
-			try:
-				position = int(csvh.getEntry(line, commaPositions, entryCounter))
-			except:
-				self.messages.newWarning("[ChannelMap] Conversion to int value failed for the HIME-module number in line \"" + str(line) + "\"! Line is ignored.")
-				continue
-			
-			himeCh = fpga * 48 + dacChain * 16 + padiwaChannel
-
-			HVList.channelDetails[himeCh] = [fpga, dacChain, padiwaChannel, himeLayer, moduleNumber, position]
+		table = CSVTable.load(path, mappingColumns())
+		# errors of the file as a whole (e.g. not found), independent of the number of messages shown;
+		# see MapWatcher.reload()
+		self.fileErrors = table.errors
+		for error in table.errors:
+			self.messages.newError("[ChannelMap] CSV file for channel mapping: " + error)
+		for warning in table.warnings:
+			self.messages.newWarning("[ChannelMap] " + warning)
 
-			if HVList.himeChannels[crate][slot][channel] != -1:
-				self.messages.newWarning("[ChannelMap] Line \"" + line + "\" is ignored because this channel has been initialized before!")
-				continue
+		crates, slots, channels = table["crate"], table["slot"], table["channel"]
+		himeChs = table["fpga"] * 48 + table["dacChain"] * 16 + table["padiwaChannel"]
+		# Each HV channel and each HIME channel may only be mapped once; later lines are ignored.
+		hvIndices = np.ravel_multi_index((crates, slots, channels), self.himeTable.shape)
+		first = np.zeros(len(table), dtype = bool)
+		first[np.unique(hvIndices, return_index = True)[1]] = True
+		for i in np.flatnonzero(~first):
+			self.messages.newWarning("[ChannelMap] Line " + str(table.lines[i]) + " is ignored because this HV channel has been mapped before!")
+		firstHime = np.zeros(np.count_nonzero(first), dtype = bool)
+		firstHime[np.unique(himeChs[first], return_index = True)[1]] = True
+		for i in np.flatnonzero(first)[~firstHime]:
+			self.messages.newWarning("[ChannelMap] Line " + str(table.lines[i]) + " is ignored because this HIME channel has been mapped before!")
+		keep = np.flatnonzero(first)[firstHime]
+		himeChs = himeChs[keep]
 
-			HVList.hvCratesSlotsChannels[himeCh] = [crate, slot, channel]
-			HVList.himeChannels[crate][slot][channel] = himeCh
+		self.crates[himeChs] = crates[keep]
+		self.slots[himeChs] = slots[keep]
+		self.channels[himeChs] = channels[keep]
+		self.fpgas[himeChs] = table["fpga"][keep]
+		self.dacChains[himeChs] = table["dacChain"][keep]
+		self.padiwaChannels[himeChs] = table["padiwaChannel"][keep]
+		self.layers[himeChs] = table["layer"][keep]
+		self.modules[himeChs] = table["module"][keep]
+		self.positions[himeChs] = table["position"][keep]
+		self.himeTable[crates[keep], slots[keep], channels[keep]] = himeChs
 
 		for layer in range(0, HIMEConstants.N_LAYERS):
 			self.createMapping_layerToHVChannels(layer)
 
-		# print channel mapping
+		self.createAcquisitionPlans()
 
-#		for i in range(0, len(HVList.hvCratesSlotsChannels)):
-#			entry = HVList.hvCratesSlotsChannels[i]
-#			print(str(i)+ ": ----> crate " + str(entry[0]) + "    slot " + str(entry[1]) + "    HV channel " + str(entry[2]))
+	# 
+	# HV channels ---> runs of consecutive HV channels
+	#
+	# Combine HV channels (given as arrays of crates, slots and channels) to a list of
+	#   [HV crate,   HV slot,   chStart,   chStop]
+	# sorted by crate, slot and channel, where each entry covers neighbouring channels of the same slot,
+	# so they can be read or set with a single call of the HV wrapper.
+	# If an array of values (one per channel) is given, runs only contain channels with the same value,
+	# and the value is appended to each entry:
+	#   [HV crate,   HV slot,   chStart,   chStop,   value]
+	# Unmapped channels (crate -1) are left out.
+	@staticmethod
+	def toRuns(crates, slots, channels, values = None):
+		mapped = crates != -1
+		crates, slots, channels = crates[mapped], slots[mapped], channels[mapped]
+		if len(crates) == 0:
+			return []
+		order = np.lexsort((channels, slots, crates))
+		crates, slots, channels = crates[order], slots[order], channels[order]
+		# a new run starts wherever crate or slot change or the channels are not consecutive
+		newRun = (np.diff(crates) != 0) | (np.diff(slots) != 0) | (np.diff(channels) != 1)
+		if values is not None:
+			values = values[mapped][order]
+			newRun |= np.diff(values) != 0
+		breaks = np.flatnonzero(newRun) + 1
+		starts = np.concatenate(([0], breaks))
+		stops = np.concatenate((breaks, [len(crates)]))
+		runs = [[int(crates[start]), int(slots[start]), int(channels[start]), int(channels[stop - 1]) + 1] for start, stop in zip(starts, stops)]
+		if values is not None:
+			for i in range(0, len(runs)):
+				runs[i].append(values[starts[i]].item())
+		return runs
 
-#		for crate in range(0, len(HVList.himeChannels)):
-#			for slot in range(0, len(HVList.himeChannels[crate])):
-#				for channel in range(0, len(HVList.himeChannels[crate][slot])):
-#					print("crate " + str(crate) + "    slot " + str(slot) + "    HV channel " + str(channel) + ": ---->   himeChannel " + str(HVList.himeChannels[crate][slot][channel]))
 
-#		for layer in range(0, HIMEConstants.N_LAYERS):
-#			print("*** Layer " + str(layer) + " ***")
-#			for entry in HVList.himeLayers[layer]:
-#				print(entry)				
+
+	#
+	# Selection of HIME channels ---> runs of consecutive HV channels
+	#
+	# Compile a Selection (see Selection.py) into the shortest list of
+	#   [HV crate,   HV slot,   chStart,   chStop]
+	# sorted by crate, slot and channel (see toRuns()).
+	# Channels that are not mapped are left out, so the list is empty if nothing is selected.
+	# The result is kept for this version of the channel map, so it is compiled only once per selection.
+	# Don't modify the returned list.
+	def plan(self, selection):
+		key = (self.version, selection.key())
+		runs = self.plans.get(key)
+		if runs != None:
+			return runs
+		mask = selection.mask(self)
+		runs = self.toRuns(self.crates[mask], self.slots[mask], self.channels[mask])
+		if len(self.plans) >= MAX_PLANS:
+			self.plans.clear()
+		self.plans[key] = runs
+		return runs
+
+	# number of mapped HIME channels in the selection
+	def count(self, selection) -> int:
+		return int(np.count_nonzero(selection.mask(self)))
 
 
 
@@ -182,69 +179,57 @@ class ChannelMap:
 	#
 	# This allows to manipulate multiple channels (all channels from chStart to chStop - 1)
 	# of the same slot at the same time efficiently
-	# using the functions "const char* HVGetChParam(...)" and "const char* HVSetChParam(...)"
+	# using HVSetChParam and HVGetCrateSnapshot
 	# defined in the C file "pages/backend/hv/CAENHVWrapper-6.3/himeHV/HVWrapper.c".
-	#
-	# For each slot, this function needs to find **HV channel numbers with a difference of 1**
-	# that are connected to the same layer; that's why it's a little complicated...
 	def createMapping_layerToHVChannels(self, layer: int):
-		# create a temporary empty array
-		# -> first index is for the number of the HV crate
-		# -> second index is for the slot 
-		# For each slot, the HV channels are listed that are connected to the same hime layer,
-		# but not yet in the right order.
-		unsortedChannels = [
-			[
-				[] for j in range(0, HVList.hvSupplyList[i].N_SLOTS)
-			] for i in range(0, len(HVList.hvSupplyList))
-		]
-		
-		
-		himeChannelsOfCurrentLayer = range(layer * 48, (layer + 1) * 48)
+		self.layerRuns[layer] = self.plan(Selection.Selection(layers = layer))
 
-		for himeCh in himeChannelsOfCurrentLayer:
-			iHV = HVList.hvCratesSlotsChannels[himeCh][0]
-			slot = HVList.hvCratesSlotsChannels[himeCh][1]
-			ch = HVList.hvCratesSlotsChannels[himeCh][2]
-			if iHV == -1 or slot == -1 or ch == -1:
-				continue
-			unsortedChannels[iHV][slot].append(ch)
-		
-		for iHV in range(0, len(unsortedChannels)):
 
-			for slot in range(0, len(unsortedChannels[iHV])):
-			
-				if len(unsortedChannels[iHV][slot]) == 0:
-					continue
+	# This function creates for each HV crate the list of HV channels read by the telemetry
+	# (see InfluxDB.hvToInflux()). It is a list of arrays with the following structure:
+	# [HV slot,    chStart,    chStop,    [HIME channels connected to chStart ... chStop - 1]]
+	#
+	# Only HV channels that are connected to HIME are included.
+	# Consecutive channels of the same slot are combined, 
+	# so they can be read in a single run of HVGetCrateSnapshot.
+	def createAcquisitionPlans(self) -> None:
+		self.acquisitionPlans = [[] for k in range(0, len(HVList.hvSupplyList))]
+		for crate, slot, chStart, chStop in self.plan(Selection.Selection()):
+			self.acquisitionPlans[crate].append([slot, chStart, chStop, self.himeTable[crate, slot, chStart:chStop].tolist()])
 
-				sortedChannels = np.sort(np.array(unsortedChannels[iHV][slot]))
-				
-				# after sorting, find sequences of HV channels in a specific HV slot,
-				# which are connected to the same HIME layer
-				chStart = sortedChannels[0]
-				chStop = chStart + 1
-				# all channels from chStart (inclusively) to chStop (exclusively)
-				# are connected to the current HIME layer
-				HVList.himeLayers[layer].append([iHV, slot, chStart, chStop])
 
-				for i in range(1, len(sortedChannels)):
+	# clear warning and error messages
+	def clearMessages(self) -> None:
+		self.messages.warnings.clear()
+		self.messages.errors.clear()
 
-					chCurrent = sortedChannels[i]
-				
-					# check if the difference of two HV-channel numbers is 1;
-					# i.e. if chCurrent is equal to chStop
-					if chCurrent == HVList.himeLayers[layer][-1][-1]:
-						# update chStop of the current slot
-						HVList.himeLayers[layer][-1][-1] += 1
-					else:
-						# start filling a new slot
-						HVList.himeLayers[layer].append([iHV, slot, chCurrent, chCurrent + 1])
+	#
+	# HIME channels ---> HV crates, HV slots, HV channels (vectorized)
+	#
+	# Pass an array of HIME channels -> get three arrays [crates, slots, channels];
+	# -1 for HIME channels that are not mapped or don't exist.
+	def to_hv(self, himeChs):
+		himeChs = np.asarray(himeChs, dtype = int)
+		valid = (himeChs >= 0) & (himeChs < HIMEConstants.N_HIME_CHANNELS)
+		indices = np.where(valid, himeChs, 0)
+		return [np.where(valid, array[indices], -1) for array in [self.crates, self.slots, self.channels]]
 
+	#
+	# HV crates, HV slots, HV channels ---> HIME channels (vectorized)
+	#
+	# Pass arrays of crates, slots and channels -> get an array of HIME channels;
+	# -1 for HV channels that are not connected to HIME or don't exist.
+	def to_hime(self, crates, slots, channels):
+		crates = np.asarray(crates, dtype = int)
+		slots = np.asarray(slots, dtype = int)
+		channels = np.asarray(channels, dtype = int)
+		nCrates, nSlots, nChannels = self.himeTable.shape
+		valid = (crates >= 0) & (crates < nCrates) & (slots >= 0) & (slots < nSlots) & (channels >= 0) & (channels < nChannels)
+		return np.where(valid, self.himeTable[np.where(valid, crates, 0), np.where(valid, slots, 0), np.where(valid, channels, 0)], -1)
 
-	# clear warning and error messages
-	def clearMessages(self) -> None:
-		self.warnings.clear()
-		self.errors.clear()
+	# is the HIME channel connected to an HV channel?
+	def isMapped(self, himeCh: int) -> bool:
+		return himeCh >= 0 and himeCh < HIMEConstants.N_HIME_CHANNELS and self.crates[himeCh] != -1
 
 	#
 	# HV crate, HV slot, HV channel ---> HIME channel
@@ -252,11 +237,10 @@ class ChannelMap:
 	# Map the combination of HV crate, slot and channel number
 	# on a global channel number running over all channels of HIME
 	def crateSlotCh_to_himeCh(self, crate: int, slot: int, ch: int) -> int:
-		try:
-			return HVList.himeChannels[crate][slot][ch]
-		except:
+		himeCh = int(self.to_hime(crate, slot, ch))
+		if himeCh == -1:
 			self.messages.newWarning("[ChannelMap] No HIME channel found for crate " + str(crate) + ", slot " + str(slot) + " and channel " + str(ch) + "!")
-		return -1
+		return himeCh
 
 	#
 	# HIME layer ---> HV crate, HV slot, HV channel
@@ -268,18 +252,12 @@ class ChannelMap:
 	# This allows to manipulate all channels from chStart to chStop - 1
 	# (for each HV crate and HV slot the layer is connected to)
 	def layer_to_cratesSlotsChannels(self, layer: int):
-		try:
-			# this can cause an IndexError
-			hvChannels = HVList.himeLayers[layer]
-			# even if there's no index error, there might be layers which have no HV channels assigned
-			# (depends on the content of the CSV file)
-			# -> raise an exception
-			if hvChannels[0][0] == -1:
-				raise Exception()
-			return hvChannels
-		except:
+		# there might be layers which have no HV channels assigned
+		# (depends on the content of the CSV file)
+		if layer < 0 or layer >= len(self.layerRuns) or len(self.layerRuns[layer]) == 0:
 			self.messages.newWarning("[ChannelMap] No HV channels found for layer " + str(layer) + "!")
-		return [[-1, -1, -1, -1]]
+			return [[-1, -1, -1, -1]]
+		return self.layerRuns[layer]
 
 	# 
 	# HIME channel ---> HV crate, HV slot, HV channel
@@ -287,16 +265,68 @@ class ChannelMap:
 	# Pass a HIME channel as parameter, which is given by
 	#   (FPGA number) * 48 + (dac chain number) * 16 + (PaDiWa channel)
 	# -> get an array of the following form:
-	#   [HV crate,   HV slot,   chStart,   chStop]
-	#
-	# This allows to manipulate all channels from chStart to chStop - 1
-	# (for each HV crate and HV slot the layer is connected to)
+	#   [HV crate,   HV slot,   HV channel]
+	# ([-1, -1, -1] if the HIME channel is not mapped)
 	def himeCh_to_crateSlotAndChannel(self, himeCh: int):
-		return HVList.hvCratesSlotsChannels[himeCh]
+		return [int(array) for array in self.to_hv(himeCh)]
 	
+	#
+	# HIME channels and values ---> runs of HV channels with the same value
+	#
+	# Translate a list of HIME channels and one value per channel (e.g. target voltages)
+	# into a list of arrays of the following form:
+	#   [HV crate,   HV slot,   chStart,   chStop,   value]
+	# sorted by crate, slot and channel. Neighbouring HV channels of the same slot with the same value
+	# are merged, so they can be set with a single call of HVSetChParam.
+	# If a HIME channel is listed more than once, the last value counts.
+	# Returns [runs, number of HIME channels that are not connected to any HV channel].
+	def himeChannels_to_valueRuns(self, himeChannels, values):
+		himeChannels = np.asarray(himeChannels, dtype = int)
+		values = np.asarray(values, dtype = float)
+		# keep the last occurrence of each HIME channel
+		lastIndices = np.unique(himeChannels[::-1], return_index = True)[1]
+		indices = len(himeChannels) - 1 - lastIndices
+		crates, slots, channels = self.to_hv(himeChannels[indices])
+		nUnmapped = int(np.count_nonzero(crates == -1))
+		return [self.toRuns(crates, slots, channels, values[indices]), nUnmapped]
+
+	# HIME channel -> [FPGA, DAC chain, PaDiWa channel, layer, module number of that layer, position];
+	# None if the HIME channel is not mapped
 	def getChannelDetails(self, himeCh: int):
-		return HVList.channelDetails[himeCh]
+		if himeCh < 0 or himeCh >= HIMEConstants.N_HIME_CHANNELS or self.fpgas[himeCh] == -1:
+			return None
+		return [int(array[himeCh]) for array in [self.fpgas, self.dacChains, self.padiwaChannels, self.layers, self.modules, self.positions]]
 	
 	def crateSlotAndChannel_to_himeCh(self, crate: int, slot: int, channel: int) -> int:
-		return HVList.himeChannels[crate][slot][channel]
+		return int(self.to_hime(crate, slot, channel))
+
+	#
+	# HV crate ---> HV channels read by the telemetry
+	#
+	# Get a list of arrays of the following form:
+	#   [HV slot,   chStart,   chStop,   [HIME channels]]
+	# See createAcquisitionPlans().
+	#
+	# The channel map is read before the boards of the crates are known.
+	# Once the topology of the crate is known (see CrateTopology.py), channels that don't exist in the crate are left out,
+	# and a warning is shown. The result is kept until the topology changes.
+	def crate_to_acquisitionPlan(self, crate: int):
+		if crate < 0 or crate >= len(self.acquisitionPlans):
+			return []
+		plan = self.acquisitionPlans[crate]
+		topology = HVList.hvSupplyList[crate].topology
+		if topology == None:
+			return plan
+		checkedPlan = self.checkedPlans.get(crate)
+		if checkedPlan != None and checkedPlan[0] == topology.version:
+			return checkedPlan[1]
+		checkedPlan = []
+		for slot, chStart, chStop, himeChannels in plan:
+			n = max(min(chStop, topology.nChannels(slot)) - chStart, 0)
+			if n < chStop - chStart:
+				self.messages.newWarning("[ChannelMap] The HV channels " + str(chStart + n) + " to " + str(chStop - 1) + " of slot " + str(slot) + " of " + HVList.hvSupplyNameList[crate] + " are mapped to HIME channels, but don't exist in the crate. They are not read.")
+			if n > 0:
+				checkedPlan.append([slot, chStart, chStart + n, himeChannels[:n]])
+		self.checkedPlans[crate] = [topology.version, checkedPlan]
+		return checkedPlan
 	#TODO fill himeChannelsOfCurrentLayer automatically
\ No newline at end of file
@@ -1,6 +1,7 @@
 import pages.backend.hv.HVList as HVList
 import pages.backend.hv.HIMEConstants as HIMEConstants
 import pandas as pd
+import numpy as np
 
 #TODO add the following information in channelMapping CSV: 
 # - is the PMT left/bottom or right/top?
@@ -15,7 +16,9 @@ def appendCircle(status: str) -> str:
 
 def channelParametersToDataframe(layer: int):
 
-	cratesSlotsAndChannels = HVList.channelMap.layer_to_cratesSlotsChannels(layer)
+	# the channel map might be replaced meanwhile (see MapWatcher.py)
+	channelMap = HVList.channelMap
+	cratesSlotsAndChannels = channelMap.layer_to_cratesSlotsChannels(layer)
 
 	# get voltages and currents from the HV supply
 	voltages = []
@@ -28,28 +31,38 @@ def channelParametersToDataframe(layer: int):
 	positions = []
 	himeChannels = []
 
+	# read all channels of this layer with one snapshot per HV crate, all crates at the same time
+	runsPerCrate = {}
+	for entry in cratesSlotsAndChannels:
+		if entry[1] == -1:
+			continue
+		runsPerCrate.setdefault(entry[0], []).append([entry[1], entry[2], entry[3]])
+	snapshots = HVList.forEachCrate(lambda crate: HVList.hvSupplyList[crate].getSnapshot(["VMon", "V0Set", "IMon", "RUp", "RDWn"], runsPerCrate[crate]), runsPerCrate.keys())
+
 	for entry in cratesSlotsAndChannels:
 
 		slot = entry[1]
 		if slot == -1:
 			continue
 		crate = entry[0]
-		hv = HVList.hvSupplyList[crate]
 		chStart = entry[2]
 		chStop = entry[3]
-		voltages += hv.measureVoltages(slot, chStart, chStop)
-		targetVoltages += hv.getTargetVoltages(slot, chStart, chStop)
-		currents += hv.measureCurrents(slot, chStart, chStop)
-		rampUp += hv.getRampSpeedUp(slot, chStart, chStop)
-		rampDown += hv.getRampSpeedDown(slot, chStart, chStop)
+		snapshot = snapshots[crate]
+		if snapshot == None:
+			parameters = {name: [None for ch in range(chStart, chStop)] for name in ["VMon", "V0Set", "IMon", "RUp", "RDWn"]}
+		else:
+			# channels that could not be read are NaN
+			parameters = {name: values[slot, chStart:chStop] for name, values in snapshot.values.items()}
+		voltages.extend(parameters["VMon"])
+		targetVoltages.extend(parameters["V0Set"])
+		currents.extend(parameters["IMon"])
+		rampUp.extend(parameters["RUp"])
+		rampDown.extend(parameters["RDWn"])
 		#statusList += hv.getStatus_slotAndChannels(slot, chStart, chStop)
-		for channel in range(chStart, chStop):
-			himeCh = HVList.channelMap.crateSlotAndChannel_to_himeCh(crate, slot, channel)
-			himeChannels.append(himeCh)
-			chDetails = HVList.channelMap.getChannelDetails(himeCh)
-			layer = chDetails[3]
-			moduleIDs.append(chDetails[4] + layer * HIMEConstants.N_MODULES_PER_LAYER)
-			positions.append(chDetails[5])
+		himeChs = channelMap.to_hime(crate, slot, np.arange(chStart, chStop))
+		himeChannels.extend(himeChs.tolist())
+		moduleIDs.extend((channelMap.modules[himeChs] + channelMap.layers[himeChs] * HIMEConstants.N_MODULES_PER_LAYER).tolist())
+		positions.extend(channelMap.positions[himeChs].tolist())
 
 	#print("voltages: " + str(len(voltages)))
 	#print("targetVoltages: " + str(len(targetVoltages)))
@@ -0,0 +1,120 @@
+import time
+import pandas as pd
+import streamlit as st
+import pages.backend.hv.HVList as HVList
+import pages.backend.InfluxDB as InfluxDB
+
+# Fan-out of commands to several HV crates.
+#
+# A command (e.g. "switch layer 2 on") consists of runs [crate, slot, chStart, chStop, argument].
+# The runs are grouped by crate, and the runs of each crate are sent by a worker of its own
+# (see HVList.forEachCrate()), so a command for the full detector takes about as long
+# as the runs of the crate with the most runs.
+# The return codes of all runs are collected in a Report, which is shown on the HV page.
+
+
+
+# Result of one command
+class Report:
+	def __init__(self, description: str) -> None:
+		self.description = description
+		# [crate, slot, chStart, chStop, return code] for each run
+		self.results = []
+		# crate -> time needed to send all runs of this crate, in seconds
+		self.crateDurations = {}
+		# time needed for the whole command, in seconds
+		self.duration = 0
+		# runs that could not be assigned to an HV crate (e.g. unmapped channels)
+		self.nSkipped = 0
+
+	def nErrors(self) -> int:
+		return len([result for result in self.results if result[4] != 0])
+
+	# failed runs as a DataFrame, for the web page
+	def errorsToDataframe(self):
+		rows = []
+		for crate, slot, chStart, chStop, code in self.results:
+			if code != 0:
+				rows.append([HVList.hvSupplyNameList[crate], slot, chStart, chStop - 1, code])
+		return pd.DataFrame(rows, columns = ["HV supply", "Slot", "First channel", "Last channel", "Error code"])
+
+	def show(self, container = st) -> None:
+		text = self.description + ": " + str(len(self.results)) + " command(s) sent to " + str(len(self.crateDurations)) + " HV crate(s) in " + str(round(self.duration * 1000)) + " ms"
+		if self.nSkipped > 0:
+			text += ", " + str(self.nSkipped) + " skipped"
+		if self.nErrors() == 0:
+			container.success(text + ".", icon = "✅")
+		else:
+			container.error(text + ", " + str(self.nErrors()) + " failed.", icon = "❗")
+			container.dataframe(self.errorsToDataframe(), hide_index = True)
+
+
+
+# Send a command to the HV crates.
+#   description: shown in the report, e.g. "Layer 0 switched on"
+#   runs:        list of [crate, slot, chStart, chStop, argument]; runs with crate -1 are skipped
+#   function:    function(hv, slot, chStart, chStop, argument) -> return code, e.g.
+#                lambda hv, slot, chStart, chStop, voltage: hv.setVoltage_slotAndChannels(slot, chStart, chStop, voltage)
+#   reason:      if given, the telemetry of each crate is switched to the fast rate with this reason
+# The report is stored in st.session_state.commandReport and returned.
+def send(description: str, runs, function, reason: str = None) -> Report:
+	report = Report(description)
+	runsPerCrate = {}
+	for run in runs:
+		crate = run[0]
+		if crate < 0 or crate >= len(HVList.hvSupplyList):
+			report.nSkipped += 1
+			continue
+		runsPerCrate.setdefault(crate, []).append(run)
+
+	def sendToCrate(crate: int):
+		startTime = time.monotonic()
+		hv = HVList.hvSupplyList[crate]
+		# only the crates concerned by the command are checked, each one in its own worker
+		if hv.checkConnection() != 2:
+			hv.reconnect()
+		results = []
+		for run in runsPerCrate[crate]:
+			slot, chStart, chStop, argument = run[1], run[2], run[3], run[4]
+			results.append([crate, slot, chStart, chStop, function(hv, slot, chStart, chStop, argument)])
+		if reason != None:
+			InfluxDB.triggerFastRate(crate, reason)
+		return [results, time.monotonic() - startTime]
+
+	startTime = time.monotonic()
+	for crate, [results, duration] in HVList.forEachCrate(sendToCrate, runsPerCrate.keys()).items():
+		report.results += results
+		report.crateDurations[crate] = duration
+	report.duration = time.monotonic() - startTime
+	st.session_state.commandReport = report
+	return report
+
+
+
+# Send the same command to all HV channels of a selection of HIME channels (see Selection.py).
+# The selection is compiled to runs by ChannelMap.plan(); argument is passed to function for each run.
+def sendToSelection(description: str, selection, function, argument = None, reason: str = None) -> Report:
+	return send(description, [run + [argument] for run in HVList.channelMap.plan(selection)], function, reason)
+
+
+
+# Set target voltages of HIME channels: values[i] is sent to himeChannels[i].
+# Neighbouring HV channels with the same voltage are set with a single command
+# (see ChannelMap.himeChannels_to_valueRuns()), and all crates are set at the same time.
+def setVoltages(himeChannels, values, description: str, reason: str = None) -> Report:
+	runs, nUnmapped = HVList.channelMap.himeChannels_to_valueRuns(himeChannels, values)
+	report = send(
+		description,
+		runs,
+		lambda hv, slot, chStart, chStop, voltage: hv.setVoltage_slotAndChannels(slot, chStart, chStop, voltage),
+		reason
+	)
+	report.nSkipped += nUnmapped
+	return report
+
+
+
+# Show the report of the most recent command, if any
+def showReport(container = st) -> None:
+	if "commandReport" in st.session_state and st.session_state.commandReport != None:
+		st.session_state.commandReport.show(container)
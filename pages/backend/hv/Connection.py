@@ -0,0 +1,81 @@
+import time
+
+# State of the connection to one HV crate.
+#
+# Every call of the HV wrapper reports its return code to record(),
+# so the time of the last successful call is known without asking the crate.
+# The crate closes the connection after CAEN_TIMEOUT seconds without any call;
+# only if the link has been idle for a while, a cheap probe is needed (see HVSupply.checkConnection()).
+# state() never talks to the crate, so it can be invoked on every page render.
+
+# The connection is closed by the crate after this time (seconds) without any call
+CAEN_TIMEOUT = 60.
+# After this idle time (seconds), the state is IDLE and the crate is probed before it is used
+PROBE_TIME = 45.
+
+# -------- States --------
+# not logged in (no handle)
+LOGGED_OUT = "Logged out"
+# recent successful call
+CONNECTED = "Connected"
+# no call for PROBE_TIME seconds; the connection might be about to time out
+IDLE = "Idle"
+# the crate reported a lost connection, or there was no call for CAEN_TIMEOUT seconds
+TIMED_OUT = "Timed out"
+
+# return codes of the CAEN library meaning the connection was lost (CAENHV_DOWN, device not connected)
+TIMEOUT_CODES = (5, 4098)
+# return code of the CAEN library meaning the device is already open, which means it answers
+DEVICE_ALREADY_OPEN = 24
+
+
+
+class Connection:
+	def __init__(self) -> None:
+		self.loggedIn = False
+		self.timedOut = False
+		# time.monotonic() of the last successful call
+		self.lastSuccess = None
+		# return code of the most recent call
+		self.lastReply = None
+
+	# Invoked with the return code of every call of the HV wrapper.
+	# Codes other than the ones listed in TIMEOUT_CODES (e.g. an unknown parameter of a board)
+	# don't change the state, since the crate might have replied anyway.
+	def record(self, code: int) -> None:
+		self.lastReply = code
+		if code == 0 or code == DEVICE_ALREADY_OPEN:
+			self.lastSuccess = time.monotonic()
+			self.timedOut = False
+		elif code in TIMEOUT_CODES:
+			self.timedOut = True
+
+	def recordLogin(self, code: int) -> None:
+		self.loggedIn = (code == 0)
+		self.record(code)
+
+	def recordLogout(self) -> None:
+		self.loggedIn = False
+		self.timedOut = False
+
+	# seconds since the last successful call; None if there was none
+	def idleTime(self):
+		if self.lastSuccess == None:
+			return None
+		return time.monotonic() - self.lastSuccess
+
+	# Current state, without any call of the HV wrapper
+	def state(self) -> str:
+		if not self.loggedIn:
+			return LOGGED_OUT
+		idleTime = self.idleTime()
+		if self.timedOut or idleTime == None or idleTime > CAEN_TIMEOUT:
+			return TIMED_OUT
+		if idleTime > PROBE_TIME:
+			return IDLE
+		return CONNECTED
+
+	# Will the connection time out before the next keep-alive in period seconds?
+	def needsKeepAlive(self, period: float) -> bool:
+		idleTime = self.idleTime()
+		return idleTime == None or idleTime + period > PROBE_TIME
@@ -1,16 +1,15 @@
-from io import StringIO
 import pandas as pd
 
-def mapToDataframe(map: str):
-	map = "Board type,Description,Number of channels,Serial number,Rel. (whatever that is)\n" + map
-	with StringIO(map) as f:
-		df = pd.read_csv(f, sep = ",")
-		f.close()
-	df = df.style.format({
-		"Number of channels": lambda x : '{:.0f}'.format(x),
-		"Serial number": lambda x : '{:.0f}'.format(x),
-		"Rel. (whatever that is)": lambda x : '{:.2f}'.format(x)
-	})
+# System Map: the boards of an HV crate (see CrateTopology.py) as a DataFrame
+def mapToDataframe(topology):
+	rows = []
+	for board in topology.boards:
+		if board == None:
+			rows.append(["----", "", None, None, ""])
+		else:
+			rows.append([board.model, board.description, board.nChannels, board.serialNumber, board.firmware])
+	df = pd.DataFrame(rows, columns = ["Board type", "Description", "Number of channels", "Serial number", "Firmware release"])
+	df = df.astype({"Number of channels": "Int64", "Serial number": "Int64"})
 	df.index.names = ["Slot"]
 
 	return df
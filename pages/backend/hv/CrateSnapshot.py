@@ -0,0 +1,46 @@
+import numpy as np
+
+
+
+# Values of several parameters of an HV crate, read with a single call of the HV wrapper
+# (see HVSupply.getSnapshot()).
+#
+# The channels are read in runs [slot, chStart, chStop].
+# For a snapshot of the whole crate, there is one run per populated slot.
+#
+# flat:   {parameter name: NumPy array}, the values of all runs one after another
+# valid:  NumPy array of bools, one per entry of the flat arrays; False if the run could not be read
+# values: {parameter name: NumPy array indexed [slot, channel]}
+#         Channels that were not read or could not be read are NaN (float parameters) or 0 (integer parameters).
+# mask:   NumPy array of bools indexed [slot, channel]; True for the channels that were read successfully
+class CrateSnapshot:
+	def __init__(self, runs, flat, runResults, nSlots: int, nChannels: int, duration: float) -> None:
+		self.runs = runs
+		self.flat = flat
+		self.runResults = runResults
+		# time needed to read the crate, in seconds
+		self.duration = duration
+		self.valid = np.repeat(runResults == 0, [max(chStop - chStart, 0) for slot, chStart, chStop in runs])
+		# -- [slot, channel] --
+		self.mask = np.zeros((nSlots, nChannels), dtype = bool)
+		self.values = {}
+		for name, array in flat.items():
+			if array.dtype == np.float32:
+				self.values[name] = np.full((nSlots, nChannels), np.nan, dtype = np.float32)
+			else:
+				self.values[name] = np.zeros((nSlots, nChannels), dtype = array.dtype)
+		offset = 0
+		for iRun in range(0, len(runs)):
+			slot, chStart, chStop = runs[iRun]
+			n = max(chStop - chStart, 0)
+			if runResults[iRun] == 0:
+				self.mask[slot, chStart:chStop] = True
+				for name, array in flat.items():
+					self.values[name][slot, chStart:chStop] = array[offset:offset + n]
+			offset += n
+
+
+
+	# number of runs that could not be read
+	def nErrors(self) -> int:
+		return int(np.count_nonzero(self.runResults))
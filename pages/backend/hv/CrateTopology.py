@@ -0,0 +1,81 @@
+import itertools
+
+# Boards installed in an HV crate, parsed once from the crate map
+# (see HVSupply.updateTopology(), which is invoked after each login or reconnect).
+# All code that needs to know the slots and channels of a crate
+# (channel map, telemetry, kill switch, System Map) uses this instead of asking the crate again.
+
+# Every topology gets a new version number, so cached results derived from it
+# (e.g. the acquisition plans, see ChannelMap.crate_to_acquisitionPlan()) can tell when it changed.
+versionCounter = itertools.count(1)
+
+
+
+class Board:
+	def __init__(self, slot: int, model: str, description: str, nChannels: int, serialNumber: int, firmware: str) -> None:
+		self.slot = slot
+		self.model = model
+		self.description = description
+		self.nChannels = nChannels
+		self.serialNumber = serialNumber
+		self.firmware = firmware
+
+
+
+class CrateTopology:
+	# boards: list indexed by slot; None for empty slots
+	def __init__(self, boards) -> None:
+		self.boards = boards
+		self.version = next(versionCounter)
+		# [[slot, 0, number of channels], ...] for all populated slots, see slotRuns()
+		self.runs = [[board.slot, 0, board.nChannels] for board in boards if board != None and board.nChannels > 0]
+
+	def nSlots(self) -> int:
+		return len(self.boards)
+
+	# number of channels of the board in slot; 0 for empty or non-existing slots
+	def nChannels(self, slot: int) -> int:
+		if slot < 0 or slot >= len(self.boards) or self.boards[slot] == None:
+			return 0
+		return self.boards[slot].nChannels
+
+	# largest number of channels of any board
+	def maxChannels(self) -> int:
+		return max([0] + [board.nChannels for board in self.boards if board != None])
+
+	# board model of slot; None for empty or non-existing slots
+	def model(self, slot: int):
+		if slot < 0 or slot >= len(self.boards) or self.boards[slot] == None:
+			return None
+		return self.boards[slot].model
+
+	def populatedSlots(self):
+		return [board.slot for board in self.boards if board != None and board.nChannels > 0]
+
+	# does the crate have this channel?
+	def contains(self, slot: int, channel: int) -> bool:
+		return channel >= 0 and channel < self.nChannels(slot)
+
+	# [[slot, 0, number of channels], ...] for all populated slots, e.g. to read or switch off the whole crate.
+	# This is computed once with the topology, so the emergency switch-off doesn't need to compute anything (see KillSwitch.py).
+	def slotRuns(self):
+		return self.runs
+
+
+
+# Parse the crate map returned by HVGetCrateMap (see HVWrapper.c):
+# one line per slot, "model,description,number of channels,serial number,firmware release",
+# or "----,,,," for empty slots.
+def fromCrateMap(map: str) -> CrateTopology:
+	boards = []
+	for line in map.splitlines():
+		entries = line.split(",")
+		if line[0:1] == "-" or len(entries) < 5:
+			boards.append(None)
+			continue
+		try:
+			# the description is the only entry that might contain a comma
+			boards.append(Board(len(boards), entries[0], ",".join(entries[1:-3]), int(entries[-3]), int(entries[-2]), entries[-1]))
+		except ValueError:
+			boards.append(None)
+	return CrateTopology(boards)
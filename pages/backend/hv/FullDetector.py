@@ -1,70 +1,86 @@
+import time
 import streamlit as st
 import pages.backend.hv.HVList as HVList
 import pages.backend.hv.Voltages as Voltages
-import pages.backend.hv.CSVHelper as csvh
-
-def setVoltagesFromCSV() -> None:
-	voltagesFromCSV = Voltages.readVoltagesFromCSV()
-	for i in range(0, len(voltagesFromCSV)):
-			voltage = voltagesFromCSV[i][1]
-			himeChannel = voltagesFromCSV[i][0]
-			cratesSlotsAndChannels = HVList.hvCratesSlotsChannels[himeChannel]
-			if voltage != None and cratesSlotsAndChannels[0] != -1:
-				crate = cratesSlotsAndChannels[0]
-				slot = cratesSlotsAndChannels[1]
-				hvChannel = cratesSlotsAndChannels[2]
-				HVList.hvSupplyList[crate].setVoltage_channel(slot, hvChannel, voltage)
+import pages.backend.hv.Commands as Commands
+
+# Send all voltages of a voltage set, including channels that already have this target voltage
+def setVoltagesFromCSV(voltageSet: str = Voltages.DEFAULT_VOLTAGE_SET) -> None:
+	voltagesFromCSV = Voltages.readVoltagesFromCSV(voltageSet)
+	Commands.setVoltages(
+		[entry[0] for entry in voltagesFromCSV],
+		[entry[1] for entry in voltagesFromCSV],
+		"Send all voltages of " + voltageSet,
+		"New target voltages from " + voltageSet
+	)
+	forgetVoltageDiff(voltageSet)
+
+# Send only the voltages of a voltage set that differ from the target voltages in the crates.
+# The target voltages are read again at the click, so the comparison shown on the page can't be outdated.
+def setChangedVoltages(voltageSet: str) -> None:
+	voltageDiff = Voltages.VoltageDiff(voltageSet)
+	Commands.setVoltages(
+		voltageDiff.himeChannels[voltageDiff.changed],
+		voltageDiff.voltages[voltageDiff.changed],
+		"Send " + str(voltageDiff.nChanged()) + " changed voltage(s) of " + voltageSet,
+		"New target voltages from " + voltageSet
+	)
+	forgetVoltageDiff(voltageSet)
+
+# The comparisons shown on the page are kept in st.session_state.voltageDiffs (voltage set -> Voltages.VoltageDiff),
+# so the target voltages are only read from the crates when a set is shown for the first time,
+# when its file has changed, after voltages were sent, or with the button "Compare with packages".
+def compareVoltages(voltageSet: str) -> None:
+	st.session_state.voltageDiffs[voltageSet] = Voltages.VoltageDiff(voltageSet)
+
+def forgetVoltageDiff(voltageSet: str) -> None:
+	if "voltageDiffs" in st.session_state:
+		st.session_state.voltageDiffs.pop(voltageSet, None)
 
 def show() -> None:
 	st.markdown(
-		"On the left side, you can see the voltage values you defined in the csv file \
-		`pages/backend/hv/voltages.csv`. \
-		On the right side, you can send these voltages by clicking the corresponding button."
+		"Choose one of the voltage sets in the directory `" + Voltages.VOLTAGE_DIRECTORY + "`. \
+		On the left side, you can see its voltages compared with the target voltages of the HV crates. \
+		On the right side, you can send the voltages that differ, or all of them."
 	)
 
+	voltageSets = Voltages.listVoltageSets()
+	if len(voltageSets) == 0:
+		st.error("No voltage set found in `" + Voltages.VOLTAGE_DIRECTORY + "`.", icon = "❗")
+		return
+	if "voltageSet" not in st.session_state or st.session_state.voltageSet not in voltageSets:
+		st.session_state.voltageSet = Voltages.DEFAULT_VOLTAGE_SET if Voltages.DEFAULT_VOLTAGE_SET in voltageSets else voltageSets[0]
+
 	col_setVoltage_1, col_setVoltage_2 = st.columns(2)
 
-	col_setVoltage_1.subheader("Imported from CSV file :clipboard:")
+	col_setVoltage_1.subheader("Voltage set :clipboard:")
+
+	voltageSet = col_setVoltage_1.selectbox("Choose a voltage set", voltageSets, key = "voltageSet")
 
-	col_setVoltage_1.dataframe(Voltages.getVoltageDataframe(), hide_index = True)
+	if "voltageDiffs" not in st.session_state:
+		st.session_state.voltageDiffs = {}
+	voltageDiff = st.session_state.voltageDiffs.get(voltageSet)
+	if voltageDiff == None or voltageDiff.digest != Voltages.readVoltageTable(voltageSet).digest:
+		compareVoltages(voltageSet)
+		voltageDiff = st.session_state.voltageDiffs[voltageSet]
+	col_setVoltage_1.dataframe(voltageDiff.toDataframe(), hide_index = True)
 
-	for errorMessage in Voltages.readVoltagesFromCSV_errors:
+	for errorMessage in voltageDiff.errors:
 		col_setVoltage_1.error(errorMessage, icon = "❗")
-	
-	for warningMessage in Voltages.readVoltagesFromCSV_warnings:
+
+	for warningMessage in voltageDiff.warnings:
 		col_setVoltage_1.warning(warningMessage, icon = "⚠️")
 
 	col_setVoltage_2.subheader("Send voltages :satellite_antenna:")
-#TODO specify filename of the CSV file on the webpage
-
-	col_setVoltage_2.button("Send voltages now", on_click = setVoltagesFromCSV)
-
-
-
-def switchAllChannelsOff() -> None:
-
-	for hv in HVList.hvSupplyList:
-		map = hv.getMap()
-
-		# lines of the channel map
-		lines = []
-		# positions of the new-line character \n
-		newLinePositions = csvh.findPosOfCharInString("\n", map)
-
-		# Read the crate map as a list of lines, 
-		# each one representing an HV slot.
-		# Each line contains information on the board type, the serial number, etc.
-		# and in particular -- what we need here -- the number of channels
-		for i in range(0, len(newLinePositions)):
-			lines.append(csvh.getEntry(map, newLinePositions, i))
-		# Extract the number of channels for each slot.
-		# The channel map is oredered,
-		# so the slot number is equal to the line number
-		for i in range(0, len(lines)):
-			line = lines[i]
-			if line[0] == "-":
-				continue
-			commaPositions = csvh.findPosOfCharInString(",", line)
-			nCh = csvh.getEntry(line, commaPositions, 2)
-			print(hv.name)
-			hv.pwOff_slotAndChannels(i, 0, int(nCh))
+
+	col_setVoltage_2.markdown("Compared with the target voltages of the HV crates at " + time.strftime("%H:%M:%S", time.localtime(voltageDiff.time)) + ".")
+	col_setVoltage_2.button("Compare with packages :arrows_counterclockwise:", on_click = compareVoltages, args = (voltageSet,))
+
+	nChanged = voltageDiff.nChanged()
+	if nChanged == 0:
+		col_setVoltage_2.success("All " + str(len(voltageDiff.himeChannels)) + " channel(s) of this set already have these target voltages.", icon = "✅")
+	else:
+		col_setVoltage_2.markdown(str(nChanged) + " of " + str(len(voltageDiff.himeChannels)) + " channel(s) differ from the target voltages of the HV crates.")
+
+	col_setVoltage_2.button("Send changed voltages (" + str(nChanged) + ")", on_click = setChangedVoltages, args = (voltageSet,), disabled = (nChanged == 0))
+	col_setVoltage_2.button("Send all voltages", on_click = setVoltagesFromCSV, args = (voltageSet,))
@@ -1,4 +1,11 @@
-NUMBER_OF_SLOTS = 8
-NUMBER_OF_CHANNELS = 48
+# Upper limits for the slots of a crate and the channels of a board (SY4527: 16 slots, boards with up to 48 channels).
+# They are only used as long as the actual boards are not known;
+# after login, the topology of each crate is taken from its crate map (see CrateTopology.py).
+MAX_SLOTS = 16
+MAX_CHANNELS_PER_SLOT = 48
 MAXIMUM_ALLOWED_VOLTAGE = 1550
-N_HIME_CHANNELS = 192
\ No newline at end of file
+N_HIME_CHANNELS = 192
+
+# Types of the channel parameters read by HVWrapper.c: 0 = float, 1 = integer
+# (used until the properties of the boards have been read, see ParameterProperties.py)
+PARAMETER_TYPES = {"VMon": 0, "IMon": 0, "V0Set": 0, "I0Set": 0, "RUp": 0, "RDWn": 0, "Pw": 1, "Status": 1}
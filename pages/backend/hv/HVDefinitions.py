@@ -6,4 +6,10 @@ def init():
 	define_hv("HIME_HV_02", "admin", "10.32.17.119")
 	define_hv("HIME_HV_01", "admin", "10.32.17.118")
 # ------------------------------------------------------------------------------
+
+# ------------------------ Channel mapping ------------------------
+# CSV file mapping HIME channels to HV channels (see channelMapping/README.md).
+# Changes of this file are taken over while the server is running (see MapWatcher.py).
+CHANNEL_MAP_FILE = "pages/backend/hv/channelMapping/2024-09-06_de.csv"
+# ------------------------------------------------------------------------------
 	
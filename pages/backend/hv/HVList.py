@@ -1,20 +1,17 @@
 import pages.backend.hv.HVSupply as HVSupply
 import streamlit as st
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 hvSupplyList = []
 hvSupplyNameList = []
 hvConnectionErrors = []
-# hime channel -> [HV crate, HV slot, HV channel]
-hvCratesSlotsChannels = []
-# [HV crate][HV slot][HV channel] -> hime channel
-himeChannels = []
-# hime layer -> [[HV crate, HV slot, HV channel], ...]
-himeLayers = []
-# hime channel -> FPGA, DAC chain, PaDiWa channel, Layer, module ID 
-# (The module ID runs over all modules of HIME and is different
-# from the module number of a specific layer!)
-channelDetails = []
+# HIME channels <-> HV channels, see ChannelMap.py
 channelMap = None
+# Threads to talk to several HV crates at the same time, see forEachCrate()
+executor = ThreadPoolExecutor(max_workers = 8, thread_name_prefix = "hv")
+# Set during an emergency switch-off (see KillSwitch.py); the telemetry doesn't read the HV crates meanwhile
+emergency = threading.Event()
 
 def define_hv(name: str, user: str, ip: str) -> None:
 	if len(name) == 0 or name in hvSupplyNameList:
@@ -33,4 +30,13 @@ def getHV(name: str):
 		
 def showErrors() -> None:
 	for errorMessage in hvConnectionErrors:
-		st.error(errorMessage, icon = "❗")
\ No newline at end of file
+		st.error(errorMessage, icon = "❗")
+
+# Invoke function(crate) for the given HV crates (indices of hvSupplyList) at the same time.
+# Returns {crate: return value of function}.
+# The calls for different crates run in parallel; calls for the same crate are serialized by its CWrapper.
+def forEachCrate(function, crates):
+	futures = {}
+	for crate in crates:
+		futures[crate] = executor.submit(function, crate)
+	return {crate: future.result() for crate, future in futures.items()}
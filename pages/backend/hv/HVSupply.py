@@ -1,6 +1,13 @@
 import pages.backend.hv.CWrapper as CWrapper
+import pages.backend.hv.HVConstants as HVConstants
+import pages.backend.hv.CrateSnapshot as CrateSnapshot
+import pages.backend.hv.CrateTopology as CrateTopology
+import pages.backend.hv.ParameterProperties as ParameterProperties
+import pages.backend.hv.Connection as Connection
 import pages.backend.Messages as Messages
 import ctypes
+import time
+import numpy as np
 
 
 class HVSupply:
@@ -12,12 +19,15 @@ class HVSupply:
 		self.ip_str_buf = ctypes.create_string_buffer(self.ip.encode("utf-8"))
 		self.pw = None
 		self.pw_str_buf = None
-		self.cw = CWrapper.CWrapper(ip)
+		self.cw = CWrapper.CWrapper()
+		# updated by every call of the HV wrapper, see Connection.py
+		self.connection = self.cw.connection
 		self.messages = Messages.Messages()
-		self.N_SLOTS = 9
-		self.N_CHANNELS_PER_SLOT = 24
 		self.loggedIn = False
 		self.loginInfoText = ""
+		# Boards installed in the crate (CrateTopology.CrateTopology), taken from the crate map.
+		# The crate map is read after each login and reconnect, see updateTopology(); None if unknown.
+		self.topology = None
 
 	# -------- Login / Logout / Timeout --------
 		
@@ -32,28 +42,36 @@ class HVSupply:
 			self.pw_str_buf,
 			self.ip_str_buf
 		)
-		if reply == "!!4103":
+		if reply == 4103:
 			self.isError("login", "!!Wrong password.")
 			return False
-		if reply == "!!4100":
+		if reply == 4100:
 			self.isError("login", "!!Login failed. Is the IP address \"" + self.ip + "\" correct?")
 			return False
-		if self.isError("login", reply):
+		if self.isErrorCode("login", reply):
 			return False
+		# the boards might have been exchanged since the last login
+		ParameterProperties.clear(self.name)
+		self.updateTopology()
+		self.updateParameterProperties()
 		return True
 	
 	def reconnect(self) -> bool:
-		# Before logging in again, HVSystemLogout() and forceInitCWrapper() need to be invoked.
+		# Before logging in again, HVSystemLogout() needs to be invoked.
 		# Otherwise, the new login will not work.
-		logoutReply = self.cw.logout()
-		self.cw.forceInitSystem()
-		reply = self.cw.login(
-			self.user_str_buf, 
-			self.pw_str_buf,
-			self.ip_str_buf
-		)
-		if self.isError("reconnect", reply):
+		with self.cw.lock:
+			logoutReply = self.cw.logout()
+			reply = self.cw.login(
+				self.user_str_buf, 
+				self.pw_str_buf,
+				self.ip_str_buf
+			)
+		# The crate might have been restarted in the meantime, so the old topology is not valid anymore.
+		if self.isErrorCode("reconnect", reply):
+			self.topology = None
 			return False
+		self.updateTopology()
+		self.updateParameterProperties()
 		return True
 
 	def logout(self) -> bool:
@@ -62,22 +80,27 @@ class HVSupply:
 		self.pw = None
 		self.pw_str_buf = None
 		reply = self.cw.logout()
-		self.isError("logout", reply)
+		self.isErrorCode("logout", reply)
 	
+	# Returns 0 if not logged in, 1 if the connection timed out (-> reconnect()) and 2 if it works.
+	# The state is taken from the most recent calls of the HV wrapper;
+	# the crate is only probed if it has been idle for Connection.PROBE_TIME seconds.
 	def checkConnection(self) -> int:
-		reply = self.cw.getCrateMap()
-		# no connection; most probably due to timeout
-		if reply == "!!5" or reply == "!!4098":
-			return 1
-		# device already open
-		if reply == "!!24":
-			return 2
-		# no connection 
-		if reply[0:2] == "!!":
+		state = self.connection.state()
+		if state == Connection.IDLE:
+			self.cw.probe()
+			state = self.connection.state()
+		if state == Connection.LOGGED_OUT:
 			return 0
-		# connection works
+		if state == Connection.TIMED_OUT:
+			return 1
 		return 2
 
+	# Keep the connection from timing out, if there is no other call within the next period seconds
+	def keepAlive(self, period: float) -> None:
+		if self.connection.state() != Connection.LOGGED_OUT and self.connection.needsKeepAlive(period):
+			self.cw.probe()
+
 	# -------- Error treatment --------
 			
 	def isError(self, source: str, message: str) -> bool:
@@ -100,71 +123,211 @@ class HVSupply:
 			self.messages.newError(errorMessage)
 			return True
 		return False
+
+	# Error treatment for the return codes of the HV wrapper (0 means success)
+	def isErrorCode(self, source: str, code: int) -> bool:
+		if code == 0:
+			return False
+		if code == CWrapper.ERROR_NO_HVPS:
+			return self.isError(source, "!!No connection has been set up.")
+		if code == CWrapper.ERROR_NULL_LIST:
+			return self.isError(source, "!!The HV supply returned an empty list.")
+		if code == CWrapper.ERROR_BUFFER_TOO_SMALL:
+			return self.isError(source, "!!The reply of the HV supply is too long.")
+		if code == CWrapper.ERROR_INVALID_VALUE:
+			return self.isError(source, "!!Invalid value; nothing was sent.")
+		if code == CWrapper.ERROR_ABORTED:
+			return self.isError(source, "!!Reading was aborted for an emergency switch-off.")
+		return self.isError(source, "!!" + str(code))
 	
 	# -------- Get data from the HV supply --------
 
-	def getMap(self) -> str:
-		if self.checkConnection() != 2:
-			self.reconnect()
-		reply = self.cw.getCrateMap()
-		if self.isError("getMap", reply):
-			return ""
-		return reply
-	
+	# Read the crate map and store the boards of the crate in self.topology
+	# (None if the crate map could not be read)
+	def updateTopology(self) -> bool:
+		reply, map = self.cw.getCrateMap()
+		if self.isErrorCode("updateTopology", reply):
+			self.topology = None
+			return False
+		self.topology = CrateTopology.fromCrateMap(map)
+		return True
+
+	# Read the properties of the channel parameters (see ParameterProperties.py)
+	# for each board model of the crate whose properties are not known yet.
+	# This is a single call of the HV wrapper per board model.
+	def updateParameterProperties(self) -> bool:
+		if self.topology == None:
+			return False
+		parameterNames = list(HVConstants.PARAMETER_TYPES.keys())
+		success = True
+		for slot in self.topology.populatedSlots():
+			model = self.topology.model(slot)
+			if ParameterProperties.has(self.name, model):
+				continue
+			reply, data = self.cw.getChParamProps(parameterNames, slot, 0)
+			boardProperties = {}
+			for name, [code, type, mode, minVal, maxVal, unit, exp, decimals] in data.items():
+				# not all boards have all parameters (e.g. I0Set); those are left out
+				if code == 0:
+					type, warning = ParameterProperties.checkType(name, type)
+					if warning != None:
+						self.messages.newWarning("[HVSupply.updateParameterProperties] " + str(model) + " in slot " + str(slot) + ": " + warning)
+					boardProperties[name] = ParameterProperties.ParameterProperties(name, type, mode, minVal, maxVal, unit, exp, decimals)
+			if len(boardProperties) == 0:
+				self.isErrorCode("updateParameterProperties", reply)
+				success = False
+				continue
+			ParameterProperties.store(self.name, model, boardProperties)
+		return success
+
+	# board model of a slot; None if unknown
+	def getModel(self, slot: int):
+		if self.topology == None:
+			return None
+		return self.topology.model(slot)
+
+	# types of the parameters as used by HVWrapper.c (0 = float, 1 = integer) for the board in slot
+	def getParameterTypes(self, parameterNames, slot: int):
+		model = self.getModel(slot)
+		return [ParameterProperties.wrapperType(self.name, model, name) for name in parameterNames]
+
+	# Read several parameters (e.g. ["VMon", "IMon", "V0Set", "Pw"]) of many channels at once
+	# and return them as a CrateSnapshot.CrateSnapshot.
+	# runs is a list of [slot, chStart, chStop]; by default, all channels of all populated slots are read.
+	# Returns None if the topology of the crate is not available.
+	def getSnapshot(self, parameterNames, runs = None):
+		if self.topology == None and not self.updateTopology():
+			return None
+		if runs == None:
+			runs = self.topology.slotRuns()
+		# The types of the parameters depend on the board model, so they are resolved per slot.
+		# Runs whose boards agree on all types are read with one call; usually that's all runs.
+		runsPerTypes = {}
+		for iRun in range(0, len(runs)):
+			types = tuple(self.getParameterTypes(parameterNames, runs[iRun][0]))
+			runsPerTypes.setdefault(types, []).append(iRun)
+		startTime = time.monotonic()
+		if len(runsPerTypes) <= 1:
+			types = list(runsPerTypes.keys())[0] if len(runsPerTypes) == 1 else self.getParameterTypes(parameterNames, -1)
+			reply, values, runResults = self.cw.getCrateSnapshot(parameterNames, list(types), runs)
+		else:
+			reply, values, runResults = self.getMixedSnapshot(parameterNames, runs, runsPerTypes)
+		duration = time.monotonic() - startTime
+		self.isErrorCode("getSnapshot", reply)
+		nSlots = max([self.topology.nSlots()] + [run[0] + 1 for run in runs])
+		nChannels = max([self.topology.maxChannels()] + [run[2] for run in runs])
+		return CrateSnapshot.CrateSnapshot(runs, values, runResults, nSlots, nChannels, duration)
+
+	# Read runs of boards with different parameter types: one call of the HV wrapper per combination of types.
+	# runsPerTypes: {tuple of types: [indices of the runs]}
+	# Returns [return code, {parameter name: flat array in the order of runs}, return codes of the runs] like CWrapper.getCrateSnapshot().
+	# A parameter that is an integer for some boards and a float for others is returned as floats.
+	def getMixedSnapshot(self, parameterNames, runs, runsPerTypes):
+		sizes = [max(chStop - chStart, 0) for slot, chStart, chStop in runs]
+		offsets = np.concatenate(([0], np.cumsum(sizes))).astype(int)
+		runResults = np.zeros(len(runs), dtype = np.intc)
+		values = {}
+		for k in range(0, len(parameterNames)):
+			if all([types[k] == 1 for types in runsPerTypes]):
+				values[parameterNames[k]] = np.zeros(offsets[-1], dtype = np.uint32)
+			else:
+				values[parameterNames[k]] = np.full(offsets[-1], np.nan, dtype = np.float32)
+		reply = 0
+		for types, indices in runsPerTypes.items():
+			groupReply, groupValues, groupResults = self.cw.getCrateSnapshot(parameterNames, list(types), [runs[i] for i in indices])
+			if reply == 0:
+				reply = groupReply
+			runResults[indices] = groupResults
+			groupOffset = 0
+			for j in range(0, len(indices)):
+				i = indices[j]
+				if groupResults[j] == 0:
+					for name, array in groupValues.items():
+						values[name][offsets[i]:offsets[i + 1]] = array[groupOffset:groupOffset + sizes[i]]
+				groupOffset += sizes[i]
+		return [reply, values, runResults]
+
 	def measureVoltages(self, slot: int, channelStart: int, channelStop: int = -1):
-		reply = self.cw.getChParam("VMon", slot, channelStart, channelStop)
-		if self.isError("measureVoltages", str(reply[0])):
+		reply, values = self.cw.getChParam("VMon", slot, channelStart, channelStop)
+		if self.isErrorCode("measureVoltages", reply):
 			return [None,]
-		return reply
+		return values.tolist()
 	
 	def measureCurrents(self, slot: int, channelStart: int, channelStop: int = -1):
-		reply = self.cw.getChParam("IMon", slot, channelStart, channelStop) 
-		if self.isError("measureCurrents", str(reply[0])):
+		reply, values = self.cw.getChParam("IMon", slot, channelStart, channelStop)
+		if self.isErrorCode("measureCurrents", reply):
 			return [None,]
-		return reply
+		return values.tolist()
 
 	def getTargetVoltages(self, slot: int, channelStart: int, channelStop: int = -1):
 		# if channelStop == -1, it will be set to channelStart + 1, see CWrapper.py
-		reply = self.cw.getChParam("V0Set", slot, channelStart, channelStop) 
-		if self.isError("getTargetVoltages", str(reply[0])):
+		reply, values = self.cw.getChParam("V0Set", slot, channelStart, channelStop)
+		if self.isErrorCode("getTargetVoltages", reply):
 			return [None,]
-		return reply
+		return values.tolist()
 	
 	def getRampSpeedUp(self, slot: int, channelStart: int, channelStop: int = -1):
-		reply = self.cw.getChParam("RUp", slot, channelStart, channelStop) 
-		if self.isError("getRampSpeedUp", str(reply[0])):
+		reply, values = self.cw.getChParam("RUp", slot, channelStart, channelStop)
+		if self.isErrorCode("getRampSpeedUp", reply):
 			return [None,]
-		return reply
+		return values.tolist()
 	
 	def getRampSpeedDown(self, slot: int, channelStart: int, channelStop: int = -1):
-		reply = self.cw.getChParam("RDWn", slot, channelStart, channelStop) 
-		if self.isError("getRampSpeedDown", str(reply[0])):
+		reply, values = self.cw.getChParam("RDWn", slot, channelStart, channelStop)
+		if self.isErrorCode("getRampSpeedDown", reply):
 			return [None,]
-		return reply
+		return values.tolist()
 	
-	def setVoltage_slotAndChannels(self, slot: int, chStart: int, chStop: int, voltage: float) -> str:
-		return self.cw.setChParam_multiple("V0Set", slot, chStart, chStop, voltage, 0, 0)
+	# Get several parameters (e.g. ["VMon", "IMon", "V0Set"]) of a range of channels at once.
+	# Returns {parameter name: NumPy array of values, one per channel}, or None in case of an error.
+	def getChannelParameters(self, parameterNames, slot: int, channelStart: int, channelStop: int = -1):
+		types = self.getParameterTypes(parameterNames, slot)
+		reply, values = self.cw.getChParams(parameterNames, types, slot, channelStart, channelStop)
+		if self.isErrorCode("getChannelParameters", reply):
+			return None
+		return values
 	
-	def setVoltage_channel(self, slot: int, channel: int, voltage: float) -> str:
-		return self.cw.setChParam_single("V0Set", slot, channel, voltage, 0, 0)
+	# Set a parameter for the channels chStart ... chStop - 1 of a slot.
+	# The value is checked against the cached properties of the board (see ParameterProperties.py),
+	# which also tell whether it is sent as a float or as an integer.
+	# Returns 0 or an error code.
+	def setChParameter(self, source: str, parameterName: str, slot: int, chStart: int, chStop: int, value) -> int:
+		parameterProperties = ParameterProperties.get(self.name, self.getModel(slot), parameterName)
+		if parameterProperties != None:
+			value, errorMessage = parameterProperties.validate(value)
+			if errorMessage != None:
+				self.isError(source, "!!" + errorMessage)
+				return CWrapper.ERROR_INVALID_VALUE
+		if ParameterProperties.wrapperType(self.name, self.getModel(slot), parameterName) == 0:
+			reply = self.cw.setChParam_multiple(parameterName, slot, chStart, chStop, value, 0, 0)
+		else:
+			reply = self.cw.setChParam_multiple(parameterName, slot, chStart, chStop, 0, int(value), 1)
+		self.isErrorCode(source, reply)
+		return reply
 
-	def pwOn_slotAndChannels(self, slot: int, chStart: int, chStop: int) -> str:
-		return self.cw.setChParam_multiple("Pw", slot, chStart, chStop, 0, 1, 1)
+	def setVoltage_slotAndChannels(self, slot: int, chStart: int, chStop: int, voltage: float) -> int:
+		return self.setChParameter("setVoltage_slotAndChannels", "V0Set", slot, chStart, chStop, voltage)
+	
+	def setVoltage_channel(self, slot: int, channel: int, voltage: float) -> int:
+		return self.setChParameter("setVoltage_channel", "V0Set", slot, channel, channel + 1, voltage)
+
+	def pwOn_slotAndChannels(self, slot: int, chStart: int, chStop: int) -> int:
+		return self.setChParameter("pwOn_slotAndChannels", "Pw", slot, chStart, chStop, 1)
 
-	def pwOff_slotAndChannels(self, slot: int, chStart: int, chStop: int) -> str:
-		return self.cw.setChParam_multiple("Pw", slot, chStart, chStop, 0, 0, 1)
+	def pwOff_slotAndChannels(self, slot: int, chStart: int, chStop: int) -> int:
+		return self.setChParameter("pwOff_slotAndChannels", "Pw", slot, chStart, chStop, 0)
 	
-	def pwOn_channel(self, slot: int, channel: int) -> str:
-		return self.cw.setChParam_single("Pw", slot, channel, 0, 1, 1)
+	def pwOn_channel(self, slot: int, channel: int) -> int:
+		return self.setChParameter("pwOn_channel", "Pw", slot, channel, channel + 1, 1)
 	
-	def pwOff_channel(self, slot: int, channel: int) -> str:
-		return self.cw.setChParam_single("Pw", slot, channel, 0, 0, 1)
+	def pwOff_channel(self, slot: int, channel: int) -> int:
+		return self.setChParameter("pwOff_channel", "Pw", slot, channel, channel + 1, 0)
 	
 	def getStatus_slotAndChannels(self, slot: int, chStart: int, chStop: int):
-		reply = self.cw.getChParam("Pw", slot, chStart, chStop, 1) 
-		if self.isError("getStatus_slotAndChannels", str(reply[0])):
+		reply, values = self.cw.getChParam("Pw", slot, chStart, chStop, self.getParameterTypes(["Pw",], slot)[0])
+		if self.isErrorCode("getStatus_slotAndChannels", reply):
 			return [None,]
-		return reply
+		return values.tolist()
 		#statusList = []
 		#for entry in reply:
 		#	if entry == 0:
@@ -0,0 +1,126 @@
+import time
+import numpy as np
+import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
+import pages.backend.hv.HVList as HVList
+import pages.backend.hv.Commands as Commands
+import pages.backend.hv.Connection as Connection
+import pages.backend.InfluxDB as InfluxDB
+
+# Emergency switch-off of all HV channels.
+#
+# All channels of all crates are switched off as fast as possible:
+#  - The runs to switch off are taken from the topology of each crate (CrateTopology.slotRuns()),
+#    which is computed at login, so nothing needs to be read or parsed first.
+#  - All crates are switched off at the same time, by workers that are reserved for this purpose,
+#    so they don't wait for other commands in HVList.executor.
+#  - The telemetry doesn't read the HV crates meanwhile (HVList.emergency),
+#    and a snapshot that is being read is aborted (CWrapper.abort()).
+#  - There is no connection check before; only if a crate reports a lost connection,
+#    it is reconnected and switched off again.
+# Afterwards, Pw of all channels is read back with a single snapshot per crate.
+
+executor = ThreadPoolExecutor(max_workers = 8, thread_name_prefix = "hv-kill")
+
+
+
+class KillReport(Commands.Report):
+	def __init__(self) -> None:
+		super().__init__("Emergency switch-off")
+		# time from the click until all crates have confirmed the switch-off, in seconds
+		self.latency = 0
+		# time needed to read back Pw, in seconds
+		self.verificationDuration = 0
+		# number of channels that are still on after the switch-off
+		self.nStillOn = 0
+		# number of channels whose Pw could not be read back
+		self.nUnverified = 0
+		# crates that could not be switched off, because their boards are not known
+		# (e.g. not logged in)
+		self.unknownCrates = []
+
+	def show(self, container = st) -> None:
+		text = self.description + ": " + str(len(self.results)) + " command(s) sent to " + str(len(self.crateDurations)) + " HV crate(s); latency " + str(round(self.latency * 1000)) + " ms."
+		if self.nErrors() == 0 and len(self.unknownCrates) == 0:
+			container.success(text, icon = "✅")
+		else:
+			container.error(text + " " + str(self.nErrors()) + " command(s) failed.", icon = "❗")
+			if self.nErrors() > 0:
+				container.dataframe(self.errorsToDataframe(), hide_index = True)
+		for crate in self.unknownCrates:
+			container.error("The boards of " + HVList.hvSupplyNameList[crate] + " are not known. Nothing was sent to this HV supply.", icon = "❗")
+		verificationText = "Read-back of Pw (" + str(round(self.verificationDuration * 1000)) + " ms): " + str(self.nStillOn) + " channel(s) still on"
+		if self.nUnverified > 0:
+			verificationText += ", " + str(self.nUnverified) + " channel(s) could not be read"
+		if self.nStillOn == 0 and self.nUnverified == 0:
+			container.success(verificationText + ".", icon = "✅")
+		else:
+			container.error(verificationText + ".", icon = "❗")
+
+
+
+# Switch off all channels of one crate.
+# Returns [[[crate, slot, chStart, chStop, return code], ...], duration in seconds],
+# or None if the boards of the crate are not known.
+def switchCrateOff(crate: int):
+	startTime = time.monotonic()
+	hv = HVList.hvSupplyList[crate]
+	hv.cw.abort()
+	try:
+		with hv.cw.lock:
+			hv.cw.resume()
+			# normally known since the login; reading the crate map is the last resort
+			if hv.topology == None and not hv.updateTopology():
+				return None
+			results = []
+			for slot, chStart, chStop in hv.topology.slotRuns():
+				reply = hv.pwOff_slotAndChannels(slot, chStart, chStop)
+				if reply in Connection.TIMEOUT_CODES and hv.reconnect():
+					reply = hv.pwOff_slotAndChannels(slot, chStart, chStop)
+				results.append([crate, slot, chStart, chStop, reply])
+		return [results, time.monotonic() - startTime]
+	finally:
+		hv.cw.resume()
+
+
+
+# Returns [number of channels still on, number of channels that could not be read]
+def verifyCrate(crate: int):
+	snapshot = HVList.hvSupplyList[crate].getSnapshot(["Pw",])
+	if snapshot == None:
+		return [0, 0]
+	pw = snapshot.flat["Pw"]
+	return [int(np.count_nonzero(pw[snapshot.valid])), int(np.count_nonzero(~snapshot.valid))]
+
+
+
+def switchAllChannelsOff() -> KillReport:
+	startTime = time.monotonic()
+	report = KillReport()
+	crates = range(0, len(HVList.hvSupplyList))
+	HVList.emergency.set()
+	try:
+		futures = {crate: executor.submit(switchCrateOff, crate) for crate in crates}
+		for crate, future in futures.items():
+			result = future.result()
+			if result == None:
+				report.unknownCrates.append(crate)
+				continue
+			report.results += result[0]
+			report.crateDurations[crate] = result[1]
+		report.latency = time.monotonic() - startTime
+		report.duration = report.latency
+		# ---- read back Pw ----
+		verificationStart = time.monotonic()
+		futures = {crate: executor.submit(verifyCrate, crate) for crate in report.crateDurations}
+		for crate, future in futures.items():
+			nStillOn, nUnverified = future.result()
+			report.nStillOn += nStillOn
+			report.nUnverified += nUnverified
+		report.verificationDuration = time.monotonic() - verificationStart
+	finally:
+		HVList.emergency.clear()
+	for crate in report.crateDurations:
+		InfluxDB.triggerFastRate(crate, "Emergency switch-off")
+	st.session_state.commandReport = report
+	return report
@@ -1,51 +1,44 @@
 import streamlit as st
-import pages.backend.hv.HVList as HVList
 import pages.backend.hv.ChannelParameters as ChannelParameters
+import pages.backend.hv.Commands as Commands
+import pages.backend.hv.Selection as Selection
 
 
 
-def pwOn(layer: int) -> str:
-	for hv in HVList.hvSupplyList:
-		if hv.checkConnection() != 2:
-			hv.reconnect()
-	cratesSlotsChannels = HVList.channelMap.layer_to_cratesSlotsChannels(layer)
-	reply = ""
-	for entry in cratesSlotsChannels:
-		crate = entry[0]
-		slot = entry[1]
-		chStart = entry[2]
-		chStop = entry[3]
-		reply += HVList.hvSupplyList[crate].pwOn_slotAndChannels(slot, chStart, chStop)
-	return reply
-
-
-
-def pwOff(layer: int) -> str:
-	for hv in HVList.hvSupplyList:
-		if hv.checkConnection() != 2:
-			hv.reconnect()
-	cratesSlotsChannels = HVList.channelMap.layer_to_cratesSlotsChannels(layer)
-	reply = ""
-	for entry in cratesSlotsChannels:
-		crate = entry[0]
-		slot = entry[1]
-		chStart = entry[2]
-		chStop = entry[3]
-		reply += HVList.hvSupplyList[crate].pwOff_slotAndChannels(slot, chStart, chStop)
-	return reply
-
-
-
-def setVoltage(layer: int, voltage) -> str:
-	cratesSlotsChannels = HVList.channelMap.layer_to_cratesSlotsChannels(layer)
-	reply = ""
-	for entry in cratesSlotsChannels:
-		crate = entry[0]
-		slot = entry[1]
-		chStart = entry[2]
-		chStop = entry[3]
-		reply += HVList.hvSupplyList[crate].setVoltage_slotAndChannels(slot, chStart, chStop, voltage)
-	return reply
+# Returns the number of commands that failed
+def pwOn(layer: int) -> int:
+	report = Commands.sendToSelection(
+		"Switch on layer " + str(layer),
+		Selection.Selection(layers = layer),
+		lambda hv, slot, chStart, chStop, argument: hv.pwOn_slotAndChannels(slot, chStart, chStop),
+		reason = "Layer " + str(layer) + " switched on"
+	)
+	return report.nErrors()
+
+
+
+# Returns the number of commands that failed
+def pwOff(layer: int) -> int:
+	report = Commands.sendToSelection(
+		"Switch off layer " + str(layer),
+		Selection.Selection(layers = layer),
+		lambda hv, slot, chStart, chStop, argument: hv.pwOff_slotAndChannels(slot, chStart, chStop),
+		reason = "Layer " + str(layer) + " switched off"
+	)
+	return report.nErrors()
+
+
+
+# Returns the number of commands that failed
+def setVoltage(layer: int, voltage) -> int:
+	report = Commands.sendToSelection(
+		"Set " + str(voltage) + " V for layer " + str(layer),
+		Selection.Selection(layers = layer),
+		lambda hv, slot, chStart, chStop, voltage: hv.setVoltage_slotAndChannels(slot, chStart, chStop, voltage),
+		voltage,
+		reason = "New target voltage for layer " + str(layer)
+	)
+	return report.nErrors()
 
 
 
@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+import streamlit as st
+import pages.backend.hv.HVList as HVList
+import pages.backend.hv.ChannelMap as ChannelMap
+
+# The one watcher of the channel-mapping file.
+# It is created in InitPowerSupplies.init().
+watcher = None
+
+# The file is checked every POLL_TIME seconds
+POLL_TIME = 2.
+
+
+
+# One reload of the channel map, shown on the HV page
+class Reload:
+	def __init__(self, path: str, changes) -> None:
+		self.time = time.time()
+		self.path = path
+		# [[HIME channel, before, after], ...] for all HIME channels whose mapping changed, see diff()
+		self.changes = changes
+
+
+
+# Reloads the channel map when its CSV file changes, without a restart of the server.
+#
+# The modification time and size of the file are polled by a thread of its own.
+# A change is only taken over once the file has been the same for two polls,
+# so a file that is just being written is not read.
+# The new channel map is built completely in the background and then replaces HVList.channelMap in a single assignment.
+# Code that uses the channel map either sees the old or the new one, never a mixture
+# (as long as it takes HVList.channelMap only once per command, e.g. Commands.sendToSelection()).
+# Everything derived from the channel map belongs to its instance and is built anew with it:
+# the compiled plans (ChannelMap.plan()), the layer runs and the acquisition plans of the telemetry,
+# whose encoders are rebuilt with the next readout (see InfluxDB.measureHV()).
+# The connections to the HV crates are not touched.
+#
+# If the new file can't be read or doesn't map any channel (e.g. while it is being edited),
+# the old channel map is kept and the problem is shown on the HV page.
+class MapWatcher:
+	def __init__(self, path: str) -> None:
+		self.path = path
+		self.lock = threading.Lock()
+		# (modification time, size) of the file the current channel map was read from
+		self.signature = self.fileSignature()
+		# signature seen in the previous poll, if different from self.signature
+		self.pendingSignature = None
+		# most recent Reload, or None
+		self.lastReload = None
+		# error of the most recent attempt to reload, or None
+		self.lastError = None
+		HVList.channelMap = ChannelMap.ChannelMap(path)
+		self.thread = threading.Thread(target = self.watchLoop, daemon = True)
+		self.thread.start()
+
+
+
+	# (modification time, size) of the file; None if it doesn't exist
+	def fileSignature(self):
+		try:
+			status = os.stat(self.path)
+		except OSError:
+			return None
+		return (status.st_mtime_ns, status.st_size)
+
+
+
+	def watchLoop(self) -> None:
+		while True:
+			time.sleep(POLL_TIME)
+			try:
+				self.check()
+			except Exception as error:
+				self.lastError = "Reading the channel mapping failed: " + str(error)
+
+
+
+	# Reload the channel map if the file has changed and has been stable since the previous poll.
+	# Returns True if the channel map was replaced.
+	def check(self) -> bool:
+		signature = self.fileSignature()
+		if signature == self.signature:
+			self.pendingSignature = None
+			return False
+		if signature != self.pendingSignature:
+			self.pendingSignature = signature
+			return False
+		return self.reload()
+
+
+
+	# Read the file and replace HVList.channelMap.
+	# Returns True if the channel map was replaced.
+	def reload(self) -> bool:
+		with self.lock:
+			signature = self.fileSignature()
+			newMap = ChannelMap.ChannelMap(self.path)
+			self.signature = signature
+			self.pendingSignature = None
+			# Warnings about single lines don't prevent the reload; they are shown like at the start.
+			if len(newMap.fileErrors) > 0:
+				self.lastError = "The channel mapping was not reloaded: " + " ".join(newMap.fileErrors)
+				return False
+			if np.count_nonzero(newMap.crates != -1) == 0:
+				self.lastError = "The channel mapping was not reloaded, because the file \"" + self.path + "\" doesn't map any channel."
+				return False
+			oldMap = HVList.channelMap
+			HVList.channelMap = newMap
+			self.lastError = None
+			self.lastReload = Reload(self.path, diff(oldMap, newMap))
+			return True
+
+
+
+# Mapping of a HIME channel in a channel map, e.g. "HIME_HV_02, slot 0, channel 3 (layer 0, module 1, position 0)"
+def describe(channelMap, himeCh: int) -> str:
+	crate = int(channelMap.crates[himeCh])
+	if crate == -1:
+		return "not mapped"
+	name = HVList.hvSupplyNameList[crate] if crate < len(HVList.hvSupplyNameList) else "crate " + str(crate)
+	return name + ", slot " + str(channelMap.slots[himeCh]) + ", channel " + str(channelMap.channels[himeCh]) + \
+		" (layer " + str(channelMap.layers[himeCh]) + ", module " + str(channelMap.modules[himeCh]) + ", position " + str(channelMap.positions[himeCh]) + ")"
+
+
+
+# Returns [[HIME channel, before, after], ...] for all HIME channels that are mapped differently
+def diff(oldMap, newMap):
+	if oldMap == None:
+		return []
+	names = ["crates", "slots", "channels", "layers", "modules", "positions"]
+	changed = np.zeros(len(newMap.crates), dtype = bool)
+	for name in names:
+		changed |= getattr(oldMap, name) != getattr(newMap, name)
+	return [[himeCh, describe(oldMap, himeCh), describe(newMap, himeCh)] for himeCh in np.flatnonzero(changed).tolist()]
+
+
+
+# Show the file of the channel map, the most recent reload with its changes, and reload errors
+def show(container = st) -> None:
+	if watcher == None:
+		return
+	container.markdown("Channel mapping: `" + watcher.path + "`. Changes of this file are taken over automatically.")
+	if watcher.lastError != None:
+		container.error(watcher.lastError, icon = "❗")
+	reload = watcher.lastReload
+	if reload == None:
+		return
+	text = "Channel mapping reloaded at " + time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(reload.time)) + ": " + str(len(reload.changes)) + " HIME channel(s) changed."
+	container.info(text, icon = "ℹ️")
+	if len(reload.changes) > 0:
+		container.dataframe(pd.DataFrame(reload.changes, columns = ["HIME channel", "Before", "After"]), hide_index = True)
+
+
+
+# Create the watcher and read the channel map for the first time; invoked once when the server is started
+def start(path: str) -> None:
+	global watcher
+	if watcher == None:
+		watcher = MapWatcher(path)
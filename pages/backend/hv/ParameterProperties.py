@@ -0,0 +1,125 @@
+import math
+import threading
+import pages.backend.hv.HVConstants as HVConstants
+
+# Cache of the properties of the channel parameters (type, mode, unit, min/max, resolution).
+#
+# The properties are the same for all channels of a board model,
+# so they are read once per (HV crate, board model) after the login (see HVSupply.updateParameterProperties()),
+# instead of asking the HV supply for the "Type" of a parameter before each read or write.
+# Some boards report a wrong "Type", so it is only used if it agrees with HVConstants.PARAMETER_TYPES (see checkType()).
+
+# see CAENHVWrapper.h
+PARAM_TYPE_NUMERIC = 0
+PARAM_TYPE_ONOFF = 1
+PARAM_TYPE_CHSTATUS = 2
+PARAM_TYPE_BDSTATUS = 3
+PARAM_TYPE_BINARY = 4
+PARAM_TYPE_STRING = 5
+PARAM_TYPE_ENUM = 6
+PARAM_TYPES = [PARAM_TYPE_NUMERIC, PARAM_TYPE_ONOFF, PARAM_TYPE_CHSTATUS, PARAM_TYPE_BDSTATUS, PARAM_TYPE_BINARY, PARAM_TYPE_STRING, PARAM_TYPE_ENUM]
+PARAM_MODE_RDONLY = 0
+
+UNITS = {0: "", 1: "A", 2: "V", 3: "W", 4: "°C", 5: "Hz", 6: "bar", 7: "V/s", 8: "s", 9: "rpm", 10: "counts", 11: "bit", 12: "A/s"}
+PREFIXES = {-6: "µ", -3: "m", 0: "", 3: "k", 6: "M"}
+
+# (name of the HV crate, board model, parameter name) -> ParameterProperties
+properties = {}
+# (name of the HV crate, board model) for which the properties have been read
+boards = set()
+lock = threading.Lock()
+
+
+
+class ParameterProperties:
+	def __init__(self, name: str, type: int, mode: int, minVal: float, maxVal: float, unit: int, exp: int, decimals: int) -> None:
+		self.name = name
+		self.type = type
+		self.mode = mode
+		self.minVal = minVal
+		self.maxVal = maxVal
+		self.unit = unit
+		self.exp = exp
+		# number of decimal places; -1 if unknown
+		self.decimals = decimals
+
+	def isNumeric(self) -> bool:
+		return self.type == PARAM_TYPE_NUMERIC
+
+	# type used by HVWrapper.c: 0 = float, 1 = integer
+	def wrapperType(self) -> int:
+		return 0 if self.isNumeric() else 1
+
+	# smallest step of the parameter; 0 if unknown
+	def resolution(self) -> float:
+		if not self.isNumeric() or self.decimals < 0:
+			return 0
+		return 10 ** -self.decimals
+
+	def unitString(self) -> str:
+		return PREFIXES.get(self.exp, "1e" + str(self.exp) + " ") + UNITS.get(self.unit, "")
+
+	# Check whether value can be sent to a channel.
+	# Returns the value to be sent (rounded to the resolution of numeric parameters)
+	# and an error message, which is None if the value is valid.
+	def validate(self, value):
+		if self.mode == PARAM_MODE_RDONLY:
+			return [value, self.name + " is read-only."]
+		if self.isNumeric():
+			if value == None or not math.isfinite(value):
+				return [value, self.name + " needs a number, got " + str(value) + "."]
+			if value < self.minVal or value > self.maxVal:
+				return [value, self.name + " = " + str(value) + " " + self.unitString() + " is out of range [" + str(self.minVal) + ", " + str(self.maxVal) + "]."]
+			if self.decimals >= 0:
+				value = round(value, self.decimals)
+			return [value, None]
+		if self.type == PARAM_TYPE_ONOFF and value not in [0, 1]:
+			return [value, self.name + " can only be switched on (1) or off (0), got " + str(value) + "."]
+		return [value, None]
+
+
+
+# Check the "Type" reported by a board for a parameter.
+# It is accepted if it is one of PARAM_TYPES and, for parameters in HVConstants.PARAMETER_TYPES, agrees with that table.
+# Returns [type to be used, warning]; the warning is None if the reported type was accepted.
+# Otherwise, the type is taken from the table: numeric for floats, on/off for integers.
+def checkType(name: str, type: int):
+	tableType = HVConstants.PARAMETER_TYPES.get(name)
+	if type in PARAM_TYPES and (tableType == None or tableType == (0 if type == PARAM_TYPE_NUMERIC else 1)):
+		return [type, None]
+	if tableType == None:
+		return [type, "Unknown type " + str(type) + " reported for " + name + "."]
+	fallbackType = PARAM_TYPE_NUMERIC if tableType == 0 else PARAM_TYPE_ONOFF
+	return [fallbackType, "Type " + str(type) + " reported for " + name + " doesn't match HVConstants.PARAMETER_TYPES; " + name + " is treated as " + ("a float." if tableType == 0 else "an integer.")]
+
+
+
+def get(crateName: str, model: str, name: str):
+	return properties.get((crateName, model, name))
+
+# Have the properties of this board model been read for this crate?
+def has(crateName: str, model: str) -> bool:
+	return (crateName, model) in boards
+
+# Store the properties {parameter name: ParameterProperties} of a board model
+def store(crateName: str, model: str, parameterProperties) -> None:
+	with lock:
+		for name, entry in parameterProperties.items():
+			properties[(crateName, model, name)] = entry
+		boards.add((crateName, model))
+
+# Forget the properties of all boards of a crate, e.g. after a new login
+def clear(crateName: str) -> None:
+	with lock:
+		for key in [key for key in properties if key[0] == crateName]:
+			del properties[key]
+		for board in [board for board in boards if board[0] == crateName]:
+			boards.discard(board)
+
+# Type used by HVWrapper.c (0 = float, 1 = integer);
+# falls back to HVConstants.PARAMETER_TYPES as long as the properties are not known.
+def wrapperType(crateName: str, model: str, name: str) -> int:
+	parameterProperties = get(crateName, model, name)
+	if parameterProperties == None:
+		return HVConstants.PARAMETER_TYPES[name]
+	return parameterProperties.wrapperType()
@@ -0,0 +1,140 @@
+import re
+import numpy as np
+import pages.backend.hv.HIMEConstants as HIMEConstants
+
+# A set of HIME channels, given by any combination of
+#   layers, module IDs, FPGAs, DAC chains, positions and explicit HIME channels.
+# Criteria that are None don't restrict the selection; all given criteria need to match.
+# Selection() without any criterion selects all mapped channels.
+#
+# The selection is compiled to HV runs by ChannelMap.plan(),
+# which is shared by all bulk reads and writes (layers, CSV voltages, single channels, telemetry).
+
+# position names -> position in the channel map (0 -> right/bottom, 1 -> left/top)
+POSITIONS = {"right": 0, "bottom": 0, "left": 1, "top": 1}
+# keywords of parse() -> arguments of Selection()
+KEYWORDS = {
+	"layer": "layers", "layers": "layers",
+	"module": "moduleIDs", "modules": "moduleIDs",
+	"fpga": "fpgas", "fpgas": "fpgas",
+	"dac": "dacChains", "dacs": "dacChains", "dacchain": "dacChains", "dacchains": "dacChains",
+	"position": "positions", "positions": "positions",
+	"channel": "himeChannels", "channels": "himeChannels"
+}
+# arguments of Selection() -> [name in messages, number of allowed values (0 ... number - 1)]
+LIMITS = {
+	"layers": ["layer", HIMEConstants.N_LAYERS],
+	"moduleIDs": ["module", HIMEConstants.N_LAYERS * HIMEConstants.N_MODULES_PER_LAYER],
+	"fpgas": ["FPGA", HIMEConstants.N_FPGAS],
+	"dacChains": ["DAC chain", HIMEConstants.N_DACCHAINS],
+	"positions": ["position", 2],
+	"himeChannels": ["channel", HIMEConstants.N_HIME_CHANNELS]
+}
+
+
+
+class Selection:
+	def __init__(self, layers = None, moduleIDs = None, fpgas = None, dacChains = None, positions = None, himeChannels = None) -> None:
+		self.layers = toTuple(layers)
+		# module ID = layer * HIMEConstants.N_MODULES_PER_LAYER + module number of that layer
+		self.moduleIDs = toTuple(moduleIDs)
+		self.fpgas = toTuple(fpgas)
+		self.dacChains = toTuple(dacChains)
+		# 0 -> right/bottom, 1 -> left/top
+		self.positions = toTuple(positions)
+		self.himeChannels = toTuple(himeChannels)
+
+	# hashable description of the selection, used to memoize the compiled plans
+	def key(self):
+		return (self.layers, self.moduleIDs, self.fpgas, self.dacChains, self.positions, self.himeChannels)
+
+	# boolean array over all HIME channels: True for the selected ones
+	def mask(self, channelMap):
+		mask = channelMap.crates != -1
+		if self.layers != None:
+			mask &= np.isin(channelMap.layers, self.layers)
+		if self.moduleIDs != None:
+			mask &= np.isin(channelMap.layers * HIMEConstants.N_MODULES_PER_LAYER + channelMap.modules, self.moduleIDs)
+		if self.fpgas != None:
+			mask &= np.isin(channelMap.fpgas, self.fpgas)
+		if self.dacChains != None:
+			mask &= np.isin(channelMap.dacChains, self.dacChains)
+		if self.positions != None:
+			mask &= np.isin(channelMap.positions, self.positions)
+		if self.himeChannels != None:
+			mask &= np.isin(np.arange(0, len(mask)), self.himeChannels)
+		return mask
+
+	def __str__(self) -> str:
+		parts = []
+		for name, values in [["layer", self.layers], ["module", self.moduleIDs], ["FPGA", self.fpgas], ["DAC chain", self.dacChains], ["position", self.positions], ["channel", self.himeChannels]]:
+			if values != None:
+				parts.append(name + " " + rangesToString(values))
+		if len(parts) == 0:
+			return "all channels"
+		return "; ".join(parts)
+
+
+
+# None stays None, anything else becomes a sorted tuple of ints without duplicates
+def toTuple(values):
+	if values is None:
+		return None
+	if isinstance(values, (int, np.integer)):
+		values = [values]
+	return tuple(sorted(set([int(value) for value in values])))
+
+
+
+# (0, 1, 2, 3, 7, 9, 10) -> "0-3,7,9-10"
+def rangesToString(values) -> str:
+	ranges = []
+	for value in values:
+		if len(ranges) > 0 and ranges[-1][1] == value - 1:
+			ranges[-1][1] = value
+		else:
+			ranges.append([value, value])
+	return ",".join([str(first) if first == last else str(first) + "-" + str(last) for first, last in ranges])
+
+
+
+# Parse a selection expression such as
+#   "layer 0; module 3-7; position left"
+#   "fpga 1; dac 0,2"
+#   "channels 0-15, 32, 40-47"
+# Criteria are separated by semicolons; values by commas, with ranges written as "first-last".
+# Positions can be given as left/right/top/bottom or 0/1.
+# All values and range ends are checked against LIMITS before a range is expanded.
+# Raises ValueError with an explanation if the expression can't be parsed.
+def parse(expression: str) -> Selection:
+	arguments = {}
+	for part in expression.split(";"):
+		words = part.strip().split(None, 1)
+		if len(words) == 0:
+			continue
+		keyword = words[0].lower()
+		if keyword not in KEYWORDS:
+			raise ValueError("Unknown criterion \"" + words[0] + "\". Use one of: layer, module, fpga, dac, position, channel.")
+		if len(words) < 2:
+			raise ValueError("No values given for \"" + words[0] + "\".")
+		argument = KEYWORDS[keyword]
+		name, nAllowed = LIMITS[argument]
+		allowed = " Allowed for " + name + ": 0 - " + str(nAllowed - 1) + ("" if argument != "positions" else " or left/right/top/bottom") + "."
+		values = []
+		for entry in words[1].split(","):
+			entry = entry.strip().lower()
+			if argument == "positions" and entry in POSITIONS:
+				values.append(POSITIONS[entry])
+				continue
+			match = re.fullmatch(r"(\d+)(?:\s*-\s*(\d+))?", entry)
+			if match == None:
+				raise ValueError("Invalid value \"" + entry + "\" for " + name + ": use numbers or ranges such as 3-7." + allowed)
+			first = int(match.group(1))
+			last = first if match.group(2) == None else int(match.group(2))
+			if first >= nAllowed or last >= nAllowed:
+				raise ValueError("Value \"" + entry + "\" is out of range for " + name + "." + allowed)
+			if last < first:
+				raise ValueError("Invalid range \"" + entry + "\" for " + name + ": the first value must not be larger than the last one." + allowed)
+			values += range(first, last + 1)
+		arguments[argument] = values
+	return Selection(**arguments)
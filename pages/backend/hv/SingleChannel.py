@@ -2,33 +2,41 @@ import streamlit as st
 import pages.backend.hv.HVList as HVList
 import pages.backend.hv.Layer as Layer
 import pages.backend.hv.HIMEConstants as HIMEConstants
+import pages.backend.hv.Commands as Commands
+import pages.backend.hv.Selection as Selection
 
 def changeChannelVoltage(himeCh: int, voltage: float) -> None:
 	if voltage != None:
-		crateSlotAndChannel = HVList.channelMap.himeCh_to_crateSlotAndChannel(himeCh)
-		crate = crateSlotAndChannel[0]
-		slot = crateSlotAndChannel[1]
-		channel = crateSlotAndChannel[2]
-		HVList.hvSupplyList[crate].setVoltage_channel(slot, channel, voltage)
+		Commands.sendToSelection(
+			"Set " + str(voltage) + " V for HIME channel " + str(himeCh),
+			Selection.Selection(himeChannels = himeCh),
+			lambda hv, slot, chStart, chStop, voltage: hv.setVoltage_slotAndChannels(slot, chStart, chStop, voltage),
+			voltage,
+			reason = "New target voltage for HIME channel " + str(himeCh)
+		)
 
 def pwOn_channel(himeCh: int) -> None:
-	crateSlotAndChannel = HVList.channelMap.himeCh_to_crateSlotAndChannel(himeCh)
-	crate = crateSlotAndChannel[0]
-	slot = crateSlotAndChannel[1]
-	channel = crateSlotAndChannel[2]
-	HVList.hvSupplyList[crate].pwOn_channel(slot, channel)
+	Commands.sendToSelection(
+		"Switch on HIME channel " + str(himeCh),
+		Selection.Selection(himeChannels = himeCh),
+		lambda hv, slot, chStart, chStop, argument: hv.pwOn_slotAndChannels(slot, chStart, chStop),
+		reason = "HIME channel " + str(himeCh) + " switched on"
+	)
 
 def pwOff_channel(himeCh: int) -> None:
-	crateSlotAndChannel = HVList.channelMap.himeCh_to_crateSlotAndChannel(himeCh)
-	crate = crateSlotAndChannel[0]
-	slot = crateSlotAndChannel[1]
-	channel = crateSlotAndChannel[2]
-	HVList.hvSupplyList[crate].pwOff_channel(slot, channel)
+	Commands.sendToSelection(
+		"Switch off HIME channel " + str(himeCh),
+		Selection.Selection(himeChannels = himeCh),
+		lambda hv, slot, chStart, chStop, argument: hv.pwOff_slotAndChannels(slot, chStart, chStop),
+		reason = "HIME channel " + str(himeCh) + " switched off"
+	)
 
 def show(himeCh: int, individualChannel_cols) -> None:
 	if himeCh != None:
 
-		channelDetails = HVList.channelMap.getChannelDetails(himeCh)
+		# the channel map might be replaced meanwhile (see MapWatcher.py)
+		channelMap = HVList.channelMap
+		channelDetails = channelMap.getChannelDetails(himeCh)
 
 		if channelDetails != None:
 			# -------- Row 0 --------
@@ -61,7 +69,7 @@ def show(himeCh: int, individualChannel_cols) -> None:
 					position = "Bottom"
 				else:
 					position = "Top"
-			crateSlotAndChannel = HVList.channelMap.himeCh_to_crateSlotAndChannel(himeCh)
+			crateSlotAndChannel = channelMap.himeCh_to_crateSlotAndChannel(himeCh)
 			individualChannel_cols[2].metric("Position", position)
 			# -------- Row 4 --------
 			# show HV crate, slot and channel
@@ -71,9 +79,14 @@ def show(himeCh: int, individualChannel_cols) -> None:
 			hv = HVList.hvSupplyList[crateSlotAndChannel[0]]
 			slot = crateSlotAndChannel[1]
 			ch = crateSlotAndChannel[2]
-			individualChannel_cols[0].metric("Voltage (V)", hv.measureVoltages(slot, ch)[0])
-			individualChannel_cols[1].metric("Target (V)", hv.getTargetVoltages(slot, ch)[0])
-			individualChannel_cols[2].metric("Current (\u03BCA)", hv.measureCurrents(slot, ch)[0])
+			parameters = hv.getChannelParameters(["VMon", "V0Set", "IMon"], slot, ch)
+			if parameters == None:
+				parameters = {"VMon": [None,], "V0Set": [None,], "IMon": [None,]}
+			else:
+				parameters = {name: values.tolist() for name, values in parameters.items()}
+			individualChannel_cols[0].metric("Voltage (V)", parameters["VMon"][0])
+			individualChannel_cols[1].metric("Target (V)", parameters["V0Set"][0])
+			individualChannel_cols[2].metric("Current (\u03BCA)", parameters["IMon"][0])
 			
 		else:
 			st.info("Not connected.", icon = "ℹ️")
\ No newline at end of file
@@ -1,80 +1,144 @@
+import os
+import re
+import time
+import numpy as np
 import pandas as pd
-import pages.backend.hv.CSVHelper as csvh
+import pages.backend.hv.CSVTable as CSVTable
 import pages.backend.hv.HVList as HVList
+import pages.backend.hv.HIMEConstants as HIMEConstants
+import pages.backend.hv.Selection as Selection
 
 readVoltagesFromCSV_errors = []
 readVoltagesFromCSV_warnings = []
-N_HIME_CHANNELS = 192
 
+# -------- Voltage sets --------
+# Every CSV file in VOLTAGE_DIRECTORY is a voltage set ("HIME channel, voltage" per line).
+# Most files are named by the date they were created (YYYY-MM-DD); listVoltageSets() lists them newest first.
+VOLTAGE_DIRECTORY = "pages/backend/hv/voltages"
+DEFAULT_VOLTAGE_SET = "2024-09-06_de.csv"
+# A target voltage of a crate differing by more than this (V) from the voltage set counts as changed.
+# V0Set is stored with a resolution of 0.1 V by the boards.
+VOLTAGE_TOLERANCE = 0.05
 
+# Columns of the CSV files defining voltages (see CSVTable.py)
+COLUMNS = [
+	CSVTable.Column("himeChannel", "HIME-channel number", int, 0, HIMEConstants.N_HIME_CHANNELS),
+	CSVTable.Column("voltage", "voltage value", float, 0)
+]
 
-def readVoltagesFromCSV():
+
+
+# Names of all voltage sets: the ones named by date (YYYY-MM-DD...) newest first,
+# followed by the undated ones in alphabetical order
+def listVoltageSets():
+	try:
+		names = [name for name in os.listdir(VOLTAGE_DIRECTORY) if name.endswith(".csv")]
+	except OSError:
+		return []
+	dated = sorted([name for name in names if re.match(r"\d{4}-\d{2}-\d{2}", name)], reverse = True)
+	undated = sorted([name for name in names if name not in dated])
+	return dated + undated
+
+
+
+# Returns the table of the voltage set with the columns "himeChannel" and "voltage".
+# The file is only parsed again if it has changed (see CSVTable.load()).
+def readVoltageTable(voltageSet: str = DEFAULT_VOLTAGE_SET):
 
 	readVoltagesFromCSV_errors.clear()
 	readVoltagesFromCSV_warnings.clear()
 
-	voltages = []
-	try:
-		csvFile = open("pages/backend/hv/voltages/2024-09-06_de.csv", "r")
-	except:
-		readVoltagesFromCSV_errors.append("CSV file for voltages not found!")
-		return voltages
-	
-	csvList = csvFile.readlines()
-	csvFile.close()
-
-	for line in csvList:
-		if csvh.isComment(line):
-			continue
-		commaPositions = csvh.findPosOfCharInString(",", line)
-		if commaPositions == None:
-			readVoltagesFromCSV_warnings.append("Comma not found in line \"" + line + "\"! Line is ignored.")
-			continue
-		entryCounter = 0
-		try:
-			himeChannel = int(csvh.getEntry(line, commaPositions, entryCounter))
-		except:
-			readVoltagesFromCSV_warnings.append("Conversion to integer value failed for the HIME-channel number in line \"" + str(line) + "\"! Line is ignored.")
-			continue
-		if himeChannel < 0 or himeChannel >= N_HIME_CHANNELS:
-			readVoltagesFromCSV_warnings.append("Invalid HIME-channel number in line \"" + str(line) + "\"! Line is ignored.")
-			continue
-		entryCounter += 1
-		try:
-			voltage = float(csvh.getEntry(line, commaPositions, entryCounter))
-		except:
-			readVoltagesFromCSV_warnings.append("Conversion to float value failed for the voltage in line \"" + str(line) + "\"! Line is ignored.")
-			continue
-		if voltage < 0:
-			readVoltagesFromCSV_warnings.append("Invalid voltage value in line \"" + str(line) + "\"! Line is ignored.")
-			continue
-		voltages.append([himeChannel, voltage])
+	table = CSVTable.load(os.path.join(VOLTAGE_DIRECTORY, os.path.basename(voltageSet)), COLUMNS)
+	for error in table.errors:
+		readVoltagesFromCSV_errors.append("CSV file for voltages: " + error)
+	readVoltagesFromCSV_warnings.extend(table.warnings)
+	return table
 
-	return voltages
 
 
+# Returns [[HIME channel, voltage], ...]
+def readVoltagesFromCSV(voltageSet: str = DEFAULT_VOLTAGE_SET):
+	table = readVoltageTable(voltageSet)
+	return [[himeChannel, voltage] for himeChannel, voltage in zip(table["himeChannel"].tolist(), table["voltage"].tolist())]
 
-def getVoltageDataframe():
-	# get voltages and currents from the HV supply
-	voltages = readVoltagesFromCSV()
 
-	seenChannels = []
-	for entry in voltages:
-		ch = entry[0]
-		if ch in seenChannels:
-			readVoltagesFromCSV_warnings.append("Channel " + str(ch) + " appears more than one time in the CSV file defining voltages!")
-			continue
-		if ch >= len(HVList.hvCratesSlotsChannels):
-			readVoltagesFromCSV_warnings.append("Channel " + str(ch) + " listed in the CSV file doesn't exist!")
-			continue
-		else:
-			if HVList.hvCratesSlotsChannels[ch] == [-1, -1, -1]:
-				readVoltagesFromCSV_warnings.append("Channel " + str(ch) + " listed in the CSV file doesn't exist!")
-				continue
-		seenChannels.append(ch)
+
+# Add warnings about channels listed more than once or not mapped to readVoltagesFromCSV_warnings
+def checkChannels(table) -> None:
+	channels, counts = np.unique(table["himeChannel"], return_counts = True)
+	for ch in channels[counts > 1].tolist():
+		readVoltagesFromCSV_warnings.append("Channel " + str(ch) + " appears more than one time in the CSV file defining voltages!")
+	for ch in channels[HVList.channelMap.crates[channels] == -1].tolist():
+		readVoltagesFromCSV_warnings.append("Channel " + str(ch) + " listed in the CSV file doesn't exist!")
+
+
+
+def getVoltageDataframe(voltageSet: str = DEFAULT_VOLTAGE_SET):
+	table = readVoltageTable(voltageSet)
+	checkChannels(table)
 
 	# create and return dataframe
-	df = pd.DataFrame(voltages)
-	df.columns = ["HIME channel", "Voltage (V) ⚡"]
+	return pd.DataFrame({"HIME channel": table["himeChannel"], "Voltage (V) ⚡": table["voltage"]})
+
+
+
+# HIME channels of the voltage set and their voltages, each channel once (the last line counts)
+def uniqueVoltages(table):
+	himeChannels = table["himeChannel"]
+	lastIndices = np.unique(himeChannels[::-1], return_index = True)[1]
+	indices = len(himeChannels) - 1 - lastIndices
+	return [himeChannels[indices], table["voltage"][indices]]
+
+
+
+# Read the target voltages (V0Set) of HIME channels from the crates,
+# with one snapshot per crate (only the runs containing these channels) and all crates at the same time.
+# Returns an array with one value per HIME channel; NaN if it is not mapped or could not be read.
+def readLiveTargets(himeChannels):
+	channelMap = HVList.channelMap
+	targets = np.full(len(himeChannels), np.nan)
+	runsPerCrate = {}
+	for crate, slot, chStart, chStop in channelMap.plan(Selection.Selection(himeChannels = himeChannels)):
+		runsPerCrate.setdefault(crate, []).append([slot, chStart, chStop])
+	snapshots = HVList.forEachCrate(lambda crate: HVList.hvSupplyList[crate].getSnapshot(["V0Set",], runsPerCrate[crate]), runsPerCrate.keys())
+	crates, slots, channels = channelMap.to_hv(himeChannels)
+	for crate, snapshot in snapshots.items():
+		if snapshot == None:
+			continue
+		values = snapshot.values["V0Set"]
+		inCrate = (crates == crate) & (slots < values.shape[0]) & (channels < values.shape[1])
+		targets[inCrate] = values[slots[inCrate], channels[inCrate]]
+	return targets
+
+
+
+# Comparison of a voltage set with the target voltages set in the crates.
+# The file is read once; its errors and warnings are kept with the comparison, so a page can show them without reading it again.
+class VoltageDiff:
+	def __init__(self, voltageSet: str) -> None:
+		self.voltageSet = voltageSet
+		self.time = time.time()
+		table = readVoltageTable(voltageSet)
+		checkChannels(table)
+		# SHA-256 of the file the comparison was made with
+		self.digest = table.digest
+		self.errors = list(readVoltagesFromCSV_errors)
+		self.warnings = list(readVoltagesFromCSV_warnings)
+		himeChannels, voltages = uniqueVoltages(table)
+		mapped = HVList.channelMap.crates[himeChannels] != -1
+		self.himeChannels = himeChannels[mapped]
+		self.voltages = voltages[mapped]
+		self.liveTargets = readLiveTargets(self.himeChannels)
+		# channels whose target can't be read count as changed, so they are sent to be safe
+		self.changed = ~(np.abs(self.liveTargets - self.voltages) <= VOLTAGE_TOLERANCE)
+
+	def nChanged(self) -> int:
+		return int(np.count_nonzero(self.changed))
 
-	return df
+	def toDataframe(self):
+		return pd.DataFrame({
+			"HIME channel": self.himeChannels,
+			"Voltage set (V)": self.voltages,
+			"Crate target (V)": self.liveTargets,
+			"Changed": self.changed
+		})